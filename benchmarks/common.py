@@ -0,0 +1,14 @@
+from beanie import init_beanie
+from pymongo import AsyncMongoClient
+
+from src.core.config.config import app_settings
+from src.modules import load_document_models
+
+
+async def connect():
+    """Initialize Beanie on the test database and return it."""
+    mongodb = app_settings.database.mongodb
+    database = AsyncMongoClient(mongodb.test_uri)[mongodb.test_db_name]
+    await init_beanie(
+        database=database, document_models=load_document_models())
+    return database
@@ -0,0 +1,101 @@
+"""
+Cost of finding the links of loaded documents, without any database I/O.
+
+Compares the walk that serialized every document with model_dump() to
+find its fields against the per-model link plan used by BaseService.
+
+    python -m benchmarks.link_walk [orders] [items]
+"""
+import sys
+import timeit
+import warnings
+from collections import defaultdict
+
+from beanie import Link, PydanticObjectId
+from bson import DBRef
+from pydantic import BaseModel
+
+from src.core.services.base import BaseService
+from src.modules.categories.models import Category
+from src.modules.orders.models import Order, OrderItem
+from src.modules.products.models import Product
+from src.modules.users.models import User
+
+
+def link(model, collection):
+    return Link(DBRef(collection, PydanticObjectId()), model)
+
+
+def make_orders(orders: int, items: int):
+    # model_construct skips Beanie's collection check, so no database
+    # needs to be initialized. Products are embedded like stored orders.
+    def product():
+        return Product.model_construct(
+            id=PydanticObjectId(), name="product", description="text",
+            price=9.99, stock=10, category=link(Category, "categories"),
+        )
+
+    return [
+        Order.model_construct(
+            id=PydanticObjectId(),
+            user=link(User, "users"),
+            items=[
+                OrderItem.model_construct(
+                    product=product(), quantity=1, subtotal=9.99)
+                for _ in range(items)
+            ],
+            total_price=9.99 * items,
+        )
+        for _ in range(orders)
+    ]
+
+
+def legacy_walk(document: BaseModel, found: list):
+    """The link discovery of the former _fetch_nested_links."""
+    for field_name in document.model_dump():
+        field = getattr(document, field_name)
+        if isinstance(field, Link):
+            found.append(field)
+        elif isinstance(field, list) and field:
+            if isinstance(field[0], Link):
+                found.extend(field)
+            elif hasattr(field[0], "model_fields"):
+                for item in field:
+                    legacy_walk(item, found)
+        elif hasattr(field, "model_fields"):
+            legacy_walk(field, found)
+
+
+def planned_walk(service: BaseService, documents):
+    slots = defaultdict(list)
+    for document in documents:
+        service._collect_links(document, slots)
+    return slots
+
+
+def main(orders: int = 1000, items: int = 5, repeat: int = 5):
+    # The legacy walk probes instances for model_fields, which pydantic
+    # now reports as deprecated.
+    warnings.simplefilter("ignore", DeprecationWarning)
+    documents = make_orders(orders, items)
+    service = BaseService(Order)
+
+    found = []
+    for document in documents:
+        legacy_walk(document, found)
+    planned = planned_walk(service, documents)
+    assert len(found) == sum(len(slots) for slots in planned.values())
+
+    timings = {
+        "model_dump walk": lambda: [
+            legacy_walk(document, []) for document in documents],
+        "link plan": lambda: planned_walk(service, documents),
+    }
+    print(f"{orders} orders x {items} items, {len(found)} links")
+    for name, run in timings.items():
+        best = min(timeit.repeat(run, number=1, repeat=repeat))
+        print(f"{name:>16}: {best * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,104 @@
+"""
+PayPal calls over a new HTTP client per request, as paypal_service used
+to make them, against the shared pooled client.
+
+Serves the PayPal simulator on a local port with uvicorn and reads one
+order `calls` times (a token then the order, like get_order_detail),
+one after the other and `concurrency` at a time. Reports the time taken
+and the client ports the stub saw requests from, a lower bound of the
+TCP connections since ports get reused. The stub speaks plain HTTP on
+localhost, against PayPal every new connection also pays a TLS
+handshake and a network round trip or two.
+
+    python -m benchmarks.paypal_client [calls] [concurrency]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import uvicorn
+
+from src.core.libs.paypal import paypal_service
+from src.core.libs.paypal.paypal_simulator import create_paypal_simulator
+
+
+class ConnectionCounter:
+    """ASGI wrapper counting the client sockets requests came from."""
+
+    def __init__(self, app):
+        self.app = app
+        self.peers = set()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.peers.add(tuple(scope["client"]))
+        await self.app(scope, receive, send)
+
+
+async def per_call_clients(order_id: str):
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            f"{paypal_service.API_URI}{paypal_service.routes['login']}",
+            auth=("client", "secret"),
+            data={"grant_type": "client_credentials"},
+        )
+        token = response.json()["access_token"]
+    async with httpx.AsyncClient() as client:
+        response = await client.get(
+            f"{paypal_service.API_URI}"
+            f"{paypal_service.routes['orders.detail'](order_id)}",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+async def run(counter, get_order, order_id, calls, concurrency):
+    counter.peers.clear()
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call():
+        async with slots:
+            await get_order(order_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[call() for _ in range(calls)])
+    elapsed = time.perf_counter() - started
+    return {
+        "ms": round(elapsed * 1000, 1),
+        "ms/call": round(elapsed * 1000 / calls, 3),
+        "connections": len(counter.peers),
+    }
+
+
+async def main(calls: int = 500, concurrency: int = 10):
+    counter = ConnectionCounter(create_paypal_simulator())
+    server = uvicorn.Server(uvicorn.Config(
+        counter, host="127.0.0.1", port=0, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+
+    paypal_service.API_URI = f"http://127.0.0.1:{port}"
+    paypal_service.use_transport(None)
+    try:
+        order = await paypal_service.create_order({"intent": "CAPTURE"})
+        for parallel in (1, concurrency):
+            for name, get_order in (
+                ("client per call", per_call_clients),
+                ("shared client", paypal_service.get_order_detail),
+            ):
+                result = await run(
+                    counter, get_order, order["id"], calls, parallel)
+                print(f"{name:>16} x{parallel:<3}: " + ", ".join(
+                    f"{key} {value}" for key, value in result.items()))
+    finally:
+        await paypal_service.close_client()
+        server.should_exit = True
+        await serving
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:3])))
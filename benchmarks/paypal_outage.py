@@ -0,0 +1,69 @@
+"""
+PayPal calls while the provider is slow and failing, through the
+retries and circuit breaker of paypal_service.
+
+Reads one order `calls` times, `concurrency` at a time, from the PayPal
+simulator with the given latency and error rate, and reports how the
+calls ended and how long they took. With a high error rate the circuit
+opens and most calls fail fast instead of waiting on PayPal.
+
+    python -m benchmarks.paypal_outage [calls] [concurrency] \
+        [latency] [error_rate]
+"""
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+
+import httpx
+
+from src.core.libs.paypal import paypal_service
+from src.core.libs.paypal.paypal_simulator import create_paypal_simulator
+from src.core.services.circuit_breaker import CircuitOpenError
+
+
+async def main(
+    calls: int = 500,
+    concurrency: int = 20,
+    latency: float = 0.05,
+    error_rate: float = 0.5,
+):
+    simulator = create_paypal_simulator(latency=latency, seed=1)
+    paypal_service.use_transport(httpx.ASGITransport(app=simulator))
+    order = await paypal_service.create_order({}, request_id="outage")
+    simulator.state.error_rate = error_rate
+
+    outcomes = Counter()
+    durations = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def call():
+        async with slots:
+            started = time.perf_counter()
+            try:
+                await paypal_service.get_order_detail(order["id"])
+                outcomes["ok"] += 1
+            except CircuitOpenError:
+                outcomes["failed fast"] += 1
+            except httpx.HTTPError:
+                outcomes["failed"] += 1
+            durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[call() for _ in range(calls)])
+    elapsed = time.perf_counter() - started
+    await paypal_service.close_client()
+
+    durations.sort()
+    print(f"latency {latency}s, error rate {error_rate:.0%}: "
+          f"{dict(outcomes)} in {elapsed * 1000:.0f} ms")
+    print(f"  p50 {statistics.median(durations) * 1000:.1f} ms, "
+          f"p99 {durations[int(len(durations) * 0.99)] * 1000:.1f} ms")
+    print(f"  upstream calls {sum(simulator.state.calls.values())}, "
+          f"breaker {paypal_service.breaker.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(
+        *map(int, sys.argv[1:3]), *map(float, sys.argv[3:5])))
@@ -0,0 +1,87 @@
+"""
+CPU cost of building the PayPal create and confirm bodies of an order
+with 1, 50 and 500 items: the request models of paypal_type fed with
+`order.model_dump()`, against the dicts of paypal_payload.
+
+Only initializes Beanie on the test database, nothing is written.
+
+    python -m benchmarks.paypal_payload [repeat]
+"""
+import asyncio
+import sys
+import time
+
+from beanie import PydanticObjectId
+
+from src.core.libs.paypal import paypal_payload
+from src.core.libs.paypal.paypal_builder import PayPalRequestBuilder
+from src.core.libs.paypal.paypal_type import (
+    PayPalConfirmPaymentSourceRequest, PayPalOrderRequest
+)
+from src.modules.orders.models import Order, OrderItem
+from src.modules.products.models import Product, ProductSnapshot
+from src.modules.users.models import User, UserSnapshot
+
+from .common import connect
+
+SIZES = (1, 50, 500)
+# Items built per timing, so small orders are timed over many runs.
+ITEMS_PER_TIMING = 5000
+
+
+def make_order(size: int) -> Order:
+    """A resolved order, with its snapshots, as submit_payment gets it."""
+    user = User(
+        id=PydanticObjectId(), email="bench@example.com", password="x",
+        full_name="Bench Mark")
+    items = []
+    for i in range(size):
+        product = Product(
+            id=PydanticObjectId(), name=f"Product {i}",
+            description="Benchmark product", price=9.99 + i % 7, stock=100)
+        items.append(OrderItem(
+            product=product, product_snapshot=ProductSnapshot.of(product),
+            quantity=1 + i % 3, subtotal=product.price * (1 + i % 3)))
+    return Order(
+        id=PydanticObjectId(), user=user, user_snapshot=UserSnapshot.of(user),
+        items=items, total_price=sum(item.subtotal for item in items))
+
+
+def models(order: Order):
+    order_data = order.model_dump()
+    PayPalRequestBuilder.build(order_data, PayPalOrderRequest)
+    PayPalRequestBuilder.build(order_data, PayPalConfirmPaymentSourceRequest)
+
+
+def dicts(order: Order):
+    paypal_payload.order_request(order)
+    paypal_payload.confirm_payment_source_request(order)
+
+
+def best_of(build, order: Order, repeat: int) -> float:
+    """Best time of one build, in seconds."""
+    loops = max(ITEMS_PER_TIMING // len(order.items), 1)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            build(order)
+        timings.append((time.perf_counter() - started) / loops)
+    return min(timings)
+
+
+async def main(repeat: int = 5):
+    await connect()
+    for size in SIZES:
+        order = make_order(size)
+        print(f"{size} items")
+        baseline = None
+        for name, build in (("models", models), ("dicts", dicts)):
+            seconds = best_of(build, order, repeat)
+            baseline = baseline or seconds
+            print(f"{name:>10}: {seconds * 1e6:10.1f} us"
+                  f" {baseline / seconds:6.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:2])))
@@ -0,0 +1,72 @@
+"""
+Hundreds of concurrent orders competing for the last units of one SKU.
+
+Compares the former read-check-decrement sequence with the atomic
+reserve_stock. Every order also takes one unit of a second, plentiful
+product, so failed reservations have something to compensate.
+
+Seeds the test database (MONGO_TEST_URI / MONGO_TEST_DB_NAME) and drops
+the products collection afterwards.
+
+    python -m benchmarks.stock_contention [orders] [stock]
+"""
+import asyncio
+import sys
+import time
+
+from src.modules.products.models import Product
+from src.modules.products.service import product_service
+
+from .common import connect
+
+
+async def check_then_decrement(quantities) -> bool:
+    products = await asyncio.gather(
+        *[product_service.find_one(id) for id in quantities])
+    if any(product.stock < quantities[product.id] for product in products):
+        return False
+    for id, quantity in quantities.items():
+        await product_service.increase(id, {"stock": -quantity})
+    return True
+
+
+async def run(reserve, orders: int, stock: int):
+    hot = await Product(
+        name="Hot SKU", description=None, price=1.0, stock=stock).insert()
+    plenty = await Product(
+        name="Plenty", description=None, price=1.0, stock=orders).insert()
+    quantities = {hot.id: 1, plenty.id: 1}
+
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *[reserve(dict(quantities)) for _ in range(orders)])
+    elapsed = time.perf_counter() - started
+
+    hot = await Product.get(hot.id)
+    plenty = await Product.get(plenty.id)
+    accepted = sum(results)
+    return {
+        "accepted": accepted,
+        "oversold": max(accepted - stock, 0),
+        "hot stock": hot.stock,
+        "plenty taken": orders - plenty.stock,
+        "ms": round(elapsed * 1000, 2),
+    }
+
+
+async def main(orders: int = 500, stock: int = 100):
+    database = await connect()
+    try:
+        for name, reserve in (
+            ("check then decrement", check_then_decrement),
+            ("reserve_stock", product_service.reserve_stock),
+        ):
+            result = await run(reserve, orders, stock)
+            print(f"{name:>22}: " + ", ".join(
+                f"{key} {value}" for key, value in result.items()))
+    finally:
+        await database.drop_collection(Product.get_collection_name())
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:3])))
@@ -0,0 +1,115 @@
+"""
+Throughput of the GET /products and GET /orders read path, validated
+against trusted. Each run loads one page through the service and turns
+it into a response body, the way the endpoint does.
+
+Seeds the test database (MONGO_TEST_URI / MONGO_TEST_DB_NAME) and drops
+the seeded collections afterwards.
+
+    python -m benchmarks.trusted_reads [rows] [repeat]
+"""
+import asyncio
+import sys
+import time
+from typing import List
+
+from beanie import PydanticObjectId
+from pydantic import TypeAdapter
+
+from src.core.services.trusted import trusted_response
+from src.modules.categories.models import Category
+from src.modules.orders.models import Order, OrderItem
+from src.modules.orders.schemas import OrderResponse
+from src.modules.orders.service import order_service
+from src.modules.products.models import Product
+from src.modules.products.schemas import ProductResponse
+from src.modules.products.service import product_service
+from src.modules.users.models import User
+
+from .common import connect
+
+ITEMS_PER_ORDER = 5
+
+
+async def seed(rows: int):
+    # insert_many does not set ids, and links need them.
+    categories = [
+        Category(
+            id=PydanticObjectId(), name=f"Category {i}",
+            slug=f"category-{i}",
+        )
+        for i in range(12)
+    ]
+    await Category.insert_many(categories)
+    products = [
+        Product(
+            id=PydanticObjectId(), name=f"Product {i}",
+            description="Benchmark product",
+            price=9.99, stock=100, category=categories[i % 12],
+        )
+        for i in range(rows)
+    ]
+    await Product.insert_many(products)
+    user = await User(email="bench@example.com", password="x").insert()
+    await Order.insert_many([
+        Order(
+            user=user,
+            items=[
+                OrderItem(
+                    product=products[(i + k) % rows], quantity=1,
+                    subtotal=9.99,
+                )
+                for k in range(ITEMS_PER_ORDER)
+            ],
+            total_price=9.99 * ITEMS_PER_ORDER,
+        )
+        for i in range(rows)
+    ])
+
+
+async def validated(service, schema, rows: int) -> bytes:
+    items = (await service.find_page(limit=rows)).items
+    adapter = TypeAdapter(List[schema])
+    return adapter.dump_json(
+        adapter.validate_python(items, from_attributes=True), by_alias=True)
+
+
+async def trusted(service, schema, rows: int) -> bytes:
+    items = (await service.find_page(limit=rows, trusted=True)).items
+    return trusted_response(items, schema).body
+
+
+async def best_of(run, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await run()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+async def main(rows: int = 1000, repeat: int = 5):
+    database = await connect()
+    await seed(rows)
+    try:
+        endpoints = {
+            "GET /products": (product_service, ProductResponse),
+            "GET /orders": (order_service, OrderResponse),
+        }
+        for endpoint, (service, schema) in endpoints.items():
+            assert (await validated(service, schema, rows)
+                    == await trusted(service, schema, rows))
+            print(f"{endpoint} ({rows} rows)")
+            for name, path in (("validated", validated),
+                               ("trusted", trusted)):
+                seconds = await best_of(
+                    lambda: path(service, schema, rows), repeat)
+                print(f"{name:>12}: {seconds * 1000:8.2f} ms"
+                      f" {rows / seconds:10.0f} rows/s")
+    finally:
+        for model in (Category, Product, User, Order):
+            await database.drop_collection(model.get_collection_name())
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*map(int, sys.argv[1:3])))
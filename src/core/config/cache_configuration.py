@@ -0,0 +1,26 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import Field
+
+
+class CacheSettings(BaseSettings):
+    # Off unless asked for: writes only invalidate the cache of their own
+    # process, the others serve the old document until the TTL is over.
+    enabled: bool = Field(False, validation_alias="DOCUMENT_CACHE_ENABLED")
+    max_size: int = Field(10000, validation_alias="DOCUMENT_CACHE_MAX_SIZE")
+    ttl_seconds: float = Field(
+        30.0, validation_alias="DOCUMENT_CACHE_TTL_SECONDS")
+
+    # PayPal orders read by GET /orders/{id}/provider. Orders still
+    # waiting for the payer are kept briefly, final ones much longer.
+    provider_max_size: int = Field(
+        10000, validation_alias="PROVIDER_CACHE_MAX_SIZE")
+    provider_pending_ttl_seconds: float = Field(
+        5.0, validation_alias="PROVIDER_CACHE_PENDING_TTL_SECONDS")
+    provider_final_ttl_seconds: float = Field(
+        3600.0, validation_alias="PROVIDER_CACHE_FINAL_TTL_SECONDS")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore",
+    )
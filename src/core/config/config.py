@@ -1,6 +1,8 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
+from .cache_configuration import CacheSettings
+from .idempotency_configuration import IdempotencySettings
 from .mailing_configuration import MailingSettings
 from .payment_configuration import PaymentSettings
 from .database_configuration import DatabaseSettings
@@ -12,6 +14,9 @@ class AppSettings(BaseSettings):
     database: DatabaseSettings = Field(default_factory=DatabaseSettings)
     payment: PaymentSettings = Field(default_factory=PaymentSettings)
     mailing: MailingSettings = Field(default_factory=MailingSettings)
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    idempotency: IdempotencySettings = Field(
+        default_factory=IdempotencySettings)
 
     base_uri: str = Field("http://localhost:8000", validation_alias="BASE_URI")
 
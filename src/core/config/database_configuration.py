@@ -26,6 +26,11 @@ class MongoDBSettings(BaseSettings):
         "happy_coding_test",
         validation_alias="MONGO_TEST_DB_NAME"
     )
+    # Explain the query shapes of the services at startup.
+    explain_queries: bool = Field(
+        False,
+        validation_alias="MONGO_EXPLAIN_QUERIES"
+    )
 
     model_config = SettingsConfigDict(
         env_file=".env",
@@ -0,0 +1,21 @@
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from pydantic import Field
+
+
+class IdempotencySettings(BaseSettings):
+    ttl_seconds: float = Field(
+        86400.0, validation_alias="IDEMPOTENCY_TTL_SECONDS")
+    lock_seconds: float = Field(
+        60.0, validation_alias="IDEMPOTENCY_LOCK_SECONDS")
+    wait_seconds: float = Field(
+        10.0, validation_alias="IDEMPOTENCY_WAIT_SECONDS")
+    cache_max_size: int = Field(
+        10000, validation_alias="IDEMPOTENCY_CACHE_MAX_SIZE")
+    cache_ttl_seconds: float = Field(
+        300.0, validation_alias="IDEMPOTENCY_CACHE_TTL_SECONDS")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore",
+    )
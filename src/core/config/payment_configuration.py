@@ -1,3 +1,5 @@
+from typing import Dict, Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
 
@@ -17,6 +19,108 @@ class PayPalSettings(BaseSettings):
     personal_sandbox_email: str = Field(
         ..., validation_alias="PAYPAL_PERSONAL_SANDBOX_EMAIL"
     )
+
+    # Pool of the HTTP client shared by every PayPal call.
+    max_connections: int = Field(
+        20, validation_alias="PAYPAL_HTTP_MAX_CONNECTIONS")
+    max_keepalive_connections: int = Field(
+        10, validation_alias="PAYPAL_HTTP_MAX_KEEPALIVE_CONNECTIONS")
+    keepalive_expiry_seconds: float = Field(
+        30.0, validation_alias="PAYPAL_HTTP_KEEPALIVE_EXPIRY_SECONDS")
+    connect_timeout_seconds: float = Field(
+        5.0, validation_alias="PAYPAL_HTTP_CONNECT_TIMEOUT_SECONDS")
+    timeout_seconds: float = Field(
+        15.0, validation_alias="PAYPAL_HTTP_TIMEOUT_SECONDS")
+    # Needs the httpx[http2] extra.
+    http2: bool = Field(False, validation_alias="PAYPAL_HTTP2")
+
+    # The OAuth token is dropped this long before it expires, and
+    # refreshed in the background from `refresh_ahead` before.
+    token_expiry_margin_seconds: float = Field(
+        60.0, validation_alias="PAYPAL_TOKEN_EXPIRY_MARGIN_SECONDS")
+    token_refresh_ahead_seconds: float = Field(
+        300.0, validation_alias="PAYPAL_TOKEN_REFRESH_AHEAD_SECONDS")
+
+    # Timeouts by route name (JSON), over the defaults of paypal_service.
+    operation_timeouts: Dict[str, float] = Field(
+        default_factory=dict, validation_alias="PAYPAL_OPERATION_TIMEOUTS")
+    # Attempts in all for idempotent calls, with jittered backoff.
+    retry_attempts: int = Field(3, validation_alias="PAYPAL_RETRY_ATTEMPTS")
+    retry_base_seconds: float = Field(
+        0.2, validation_alias="PAYPAL_RETRY_BASE_SECONDS")
+    retry_max_seconds: float = Field(
+        2.0, validation_alias="PAYPAL_RETRY_MAX_SECONDS")
+    # Failures in a row that open the circuit, and how long it stays so.
+    breaker_failure_threshold: int = Field(
+        5, validation_alias="PAYPAL_BREAKER_FAILURE_THRESHOLD")
+    breaker_reset_seconds: float = Field(
+        30.0, validation_alias="PAYPAL_BREAKER_RESET_SECONDS")
+
+    # Id of the webhook PayPal sends events to, their signatures are
+    # verified against it. Without it every event is rejected.
+    webhook_id: Optional[str] = Field(
+        None, validation_alias="PAYPAL_WEBHOOK_ID")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore",
+    )
+
+
+class PaymentWorkerSettings(BaseSettings):
+    concurrency: int = Field(4, validation_alias="PAYMENT_WORKER_CONCURRENCY")
+    max_attempts: int = Field(
+        5, validation_alias="PAYMENT_WORKER_MAX_ATTEMPTS")
+    lease_seconds: float = Field(
+        60.0, validation_alias="PAYMENT_WORKER_LEASE_SECONDS")
+    poll_seconds: float = Field(
+        1.0, validation_alias="PAYMENT_WORKER_POLL_SECONDS")
+    retry_base_seconds: float = Field(
+        2.0, validation_alias="PAYMENT_WORKER_RETRY_BASE_SECONDS")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore",
+    )
+
+
+class WebhookWorkerSettings(BaseSettings):
+    # Events claimed and applied together.
+    batch_size: int = Field(100, validation_alias="WEBHOOK_WORKER_BATCH_SIZE")
+    # PayPal calls (verifications, captures) a batch makes at once.
+    concurrency: int = Field(8, validation_alias="WEBHOOK_WORKER_CONCURRENCY")
+    max_attempts: int = Field(
+        5, validation_alias="WEBHOOK_WORKER_MAX_ATTEMPTS")
+    lease_seconds: float = Field(
+        60.0, validation_alias="WEBHOOK_WORKER_LEASE_SECONDS")
+    poll_seconds: float = Field(
+        1.0, validation_alias="WEBHOOK_WORKER_POLL_SECONDS")
+    retry_base_seconds: float = Field(
+        2.0, validation_alias="WEBHOOK_WORKER_RETRY_BASE_SECONDS")
+
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        case_sensitive=False,
+        extra="ignore",
+    )
+
+
+class ReconcileSettings(BaseSettings):
+    # Pending orders older than this are checked against PayPal.
+    stale_minutes: float = Field(
+        30.0, validation_alias="RECONCILE_STALE_MINUTES")
+    # Orders the payer has not approved after this long are cancelled,
+    # PayPal lets unapproved orders expire after 3 hours.
+    expire_minutes: float = Field(
+        180.0, validation_alias="RECONCILE_EXPIRE_MINUTES")
+    batch_size: int = Field(500, validation_alias="RECONCILE_BATCH_SIZE")
+    # PayPal calls in flight at once, and per second on average.
+    concurrency: int = Field(8, validation_alias="RECONCILE_CONCURRENCY")
+    rate_per_second: float = Field(
+        20.0, validation_alias="RECONCILE_RATE_PER_SECOND")
+
     model_config = SettingsConfigDict(
         env_file=".env",
         case_sensitive=False,
@@ -26,6 +130,11 @@ class PayPalSettings(BaseSettings):
 
 class PaymentSettings(BaseSettings):
     paypal: PayPalSettings = Field(default_factory=PayPalSettings)
+    worker: PaymentWorkerSettings = Field(
+        default_factory=PaymentWorkerSettings)
+    webhooks: WebhookWorkerSettings = Field(
+        default_factory=WebhookWorkerSettings)
+    reconcile: ReconcileSettings = Field(default_factory=ReconcileSettings)
 
     model_config = SettingsConfigDict(
         env_file=".env",
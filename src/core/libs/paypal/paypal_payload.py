@@ -0,0 +1,121 @@
+"""
+PayPal request bodies built straight from an order.
+
+The request models of paypal_type take the dumped order, validate
+nested models and dump them again, for every order. These functions
+write the same bodies as plain dicts from the order itself. Amounts
+are summed in integer cents, so the item total always equals the sum
+of the lines PayPal checks it against.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+from typing import Any, Dict, Tuple
+
+from .paypal_type import ApplicationContext, PayPalExperienceContext
+from ...config.config import app_settings
+
+
+CURRENCY_CODE = "USD"
+ITEM_CATEGORY = "PHYSICAL_GOODS"
+
+# The parts that are the same for every order, dumped once.
+_APPLICATION_CONTEXT = ApplicationContext(
+    return_url="", cancel_url="").model_dump()
+_EXPERIENCE_CONTEXT = PayPalExperienceContext(
+    payment_method_preference="IMMEDIATE_PAYMENT_REQUIRED",
+    user_action="PAY_NOW",
+    return_url=f"{app_settings.base_uri}/orders/capture",
+).model_dump()
+
+_CENT = Decimal(1)
+
+
+def to_cents(amount: float) -> int:
+    """
+    An amount in whole cents, rounded half up. The float goes through
+    its shortest repr, so 1.005 is 101 cents and not the 100.4999...
+    cents it holds in binary.
+    """
+    return int((Decimal(repr(amount)) * 100).quantize(_CENT, ROUND_HALF_UP))
+
+
+def format_cents(cents: int) -> str:
+    """Cents as the decimal string PayPal expects, like `12.05`."""
+    sign = "-" if cents < 0 else ""
+    units, cents = divmod(abs(cents), 100)
+    return f"{sign}{units}.{cents:02d}"
+
+
+@lru_cache(maxsize=4096)
+def _unit_amount(price: float) -> Tuple[int, str]:
+    """Cents and text of a price. Orders keep quoting the same prices."""
+    cents = to_cents(price)
+    return cents, format_cents(cents)
+
+
+def order_request(order: Any) -> Dict[str, Any]:
+    """
+    Body of the PayPal order of an order, as PayPalOrderRequest builds
+    it. Items are read from their product snapshots, or their resolved
+    products when they have none. The amount is the item total.
+    """
+    items = []
+    item_total = 0
+    for item in order.items:
+        product = item.product_snapshot or item.product
+        unit_amount, unit_value = _unit_amount(product.price)
+        items.append({
+            "name": product.name,
+            "quantity": str(item.quantity),
+            "unit_amount": {
+                "currency_code": CURRENCY_CODE,
+                "value": unit_value,
+            },
+            "description": None,
+            "sku": str(product.id),
+            "category": ITEM_CATEGORY,
+        })
+        item_total += unit_amount * item.quantity
+
+    total = format_cents(item_total)
+    return {
+        "intent": "CAPTURE",
+        "purchase_units": [{
+            "reference_id": str(order.id),
+            "amount": {
+                "currency_code": CURRENCY_CODE,
+                "value": total,
+                "breakdown": {
+                    "item_total": {
+                        "currency_code": CURRENCY_CODE,
+                        "value": total,
+                    },
+                },
+            },
+            "items": items,
+        }],
+        "application_context": dict(_APPLICATION_CONTEXT),
+    }
+
+
+def confirm_payment_source_request(order: Any) -> Dict[str, Any]:
+    """
+    Body confirming the PayPal payment source of an order, as
+    PayPalConfirmPaymentSourceRequest builds it, from the user snapshot
+    or the resolved user.
+    """
+    paypal_settings = app_settings.payment.paypal
+    user = order.user_snapshot or order.user
+    name_parts = (user.full_name or "").split()
+    return {"payment_source": {"paypal": {
+        "name": {
+            "given_name": name_parts[0] if name_parts else "",
+            "surname": name_parts[-1] if len(name_parts) > 1 else "",
+        },
+        "email_address": (
+            paypal_settings.mode == "sandbox"
+            and paypal_settings.personal_sandbox_email
+            or user.email
+        ),
+        "experience_context": dict(_EXPERIENCE_CONTEXT),
+    }}}
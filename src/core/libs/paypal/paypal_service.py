@@ -1,7 +1,16 @@
+import asyncio
+import logging
+import random
+from typing import Any, Dict, Optional
+
 import httpx
 
+from .paypal_token import TokenManager
 from ...config.config import app_settings
+from ...services.circuit_breaker import CircuitBreaker
+
 
+logger = logging.getLogger(__name__)
 
 paypal_config = app_settings.payment.paypal
 
@@ -28,9 +37,75 @@ routes = {
         lambda order_id:
             f"/v2/checkout/orders/{order_id}/confirm-payment-source"
     ),
+    "notifications.verify_webhook_signature": (
+        "/v1/notifications/verify-webhook-signature"
+    ),
 
 }
 
+# Transport used by the HTTP client, None for the network.
+# Tests route the calls to the local simulator through it.
+_transport = None
+
+# One pooled client for every call, so connections (and their TCP and
+# TLS handshakes) are reused across calls. Opened at app startup, or
+# on first use outside the app.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def use_transport(transport):
+    global _transport, _client
+    _transport = transport
+    # The next call builds a client on the new transport, and asks the
+    # server behind it for a token.
+    _client = None
+    tokens.clear()
+
+
+def create_client() -> httpx.AsyncClient:
+    http2 = paypal_config.http2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning(
+                "PAYPAL_HTTP2 needs the httpx[http2] extra, using HTTP/1.1")
+            http2 = False
+
+    return httpx.AsyncClient(
+        transport=_transport,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=paypal_config.max_connections,
+            max_keepalive_connections=paypal_config.max_keepalive_connections,
+            keepalive_expiry=paypal_config.keepalive_expiry_seconds,
+        ),
+        timeout=httpx.Timeout(
+            paypal_config.timeout_seconds,
+            connect=paypal_config.connect_timeout_seconds,
+        ),
+    )
+
+
+def client() -> httpx.AsyncClient:
+    """The shared client, opened if it is not yet."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_client()
+    return _client
+
+
+async def open_client():
+    client()
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 # Paypal cycle
 # 1. Create an order => return ref order id and save it to db
 # 2. Confirm the order => by finding ref order id of order
@@ -40,92 +115,220 @@ routes = {
 # 5. After it, we need to capture the payment
 
 
+# Seconds each operation may take, PAYPAL_OPERATION_TIMEOUTS overrides
+# them by route name.
+OPERATION_TIMEOUTS = {
+    "login": 5.0,
+    "orders.create": 10.0,
+    "orders.confirm_payment_source": 10.0,
+    "orders.capture": 15.0,
+    "orders.detail": 5.0,
+    "payments.create": 10.0,
+    "payments.list": 5.0,
+    "notifications.verify_webhook_signature": 5.0,
+    **paypal_config.operation_timeouts,
+}
+
+# Answers that say PayPal is unhealthy or overloaded rather than that
+# the request is wrong.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+breaker = CircuitBreaker(
+    "PayPal",
+    failure_threshold=paypal_config.breaker_failure_threshold,
+    reset_seconds=paypal_config.breaker_reset_seconds,
+)
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: anywhere up to the exponential delay of the attempt."""
+    delay = min(
+        paypal_config.retry_base_seconds * 2 ** attempt,
+        paypal_config.retry_max_seconds,
+    )
+    return random.uniform(0, delay)
+
+
+async def _send(
+    operation: str, method: str, route: str, idempotent: bool = False,
+    **kwargs
+) -> httpx.Response:
+    """
+    One call to the API within the timeout of its operation, through
+    the circuit breaker. Idempotent calls that time out, can not
+    connect or get a retryable status are sent again after a jittered
+    exponential backoff, up to PAYPAL_RETRY_ATTEMPTS times in all.
+    Raises CircuitOpenError without calling PayPal while the circuit
+    is open.
+    """
+    timeout = httpx.Timeout(
+        OPERATION_TIMEOUTS[operation],
+        connect=paypal_config.connect_timeout_seconds,
+    )
+    attempts = paypal_config.retry_attempts if idempotent else 1
+    for attempt in range(attempts):
+        last = attempt + 1 == attempts
+        breaker.before_call()
+        try:
+            response = await client().request(
+                method, f"{API_URI}{route}", timeout=timeout, **kwargs)
+        except httpx.TransportError:
+            breaker.record_failure()
+            if last:
+                raise
+        except BaseException:
+            breaker.release()
+            raise
+        else:
+            if response.status_code not in RETRYABLE_STATUSES:
+                breaker.record_success()
+                return response
+            breaker.record_failure()
+            if last:
+                return response
+        await asyncio.sleep(_backoff(attempt))
+
+
+async def _fetch_token() -> Dict[str, Any]:
+    response = await _send(
+        "login", "POST", routes["login"],
+        idempotent=True,
+        auth=(CLIENT_ID, PAYPAL_CLIENT_SECRET),
+        data={"grant_type": "client_credentials"},
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+tokens = TokenManager(
+    _fetch_token,
+    expiry_margin=paypal_config.token_expiry_margin_seconds,
+    refresh_ahead=paypal_config.token_refresh_ahead_seconds,
+)
+
+
 async def register_paypal_token():
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URI}{routes['login']}",
-            auth=(CLIENT_ID, PAYPAL_CLIENT_SECRET),
-            data={"grant_type": "client_credentials"},
-        )
-        response.raise_for_status()
-        return response.json()["access_token"]
-
-
-async def create_order(data):
-    token = await register_paypal_token()
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URI}{routes['orders.create']}",
-            headers={
-                "Authorization": f"Bearer {token}"
-            },
-            json=data
+    return await tokens.get()
+
+
+async def _request(
+    operation: str, method: str, route: str,
+    headers: Optional[Dict[str, str]] = None,
+    idempotent: bool = False,
+    **kwargs
+) -> httpx.Response:
+    """
+    Authorized call to the API. A 401 means the cached token was
+    revoked or expired early, the call is sent once more with a new one.
+    """
+    token = await tokens.get()
+    response = await _send(
+        operation, method, route, idempotent=idempotent,
+        headers={**(headers or {}), "Authorization": f"Bearer {token}"},
+        **kwargs
+    )
+    if response.status_code == 401:
+        token = await tokens.refresh(token)
+        response = await _send(
+            operation, method, route, idempotent=idempotent,
+            headers={**(headers or {}), "Authorization": f"Bearer {token}"},
+            **kwargs
         )
-        response.raise_for_status()
-        return response.json()
+    return response
+
+
+async def create_order(data, request_id: str = None):
+    """
+    `request_id` makes the call idempotent: PayPal returns the order
+    created by an earlier call with the same id instead of a new one,
+    so only then is it retried.
+    """
+    headers = {}
+    if request_id:
+        headers["PayPal-Request-Id"] = request_id
+    response = await _request(
+        "orders.create", "POST", routes["orders.create"],
+        headers=headers, idempotent=bool(request_id), json=data)
+    response.raise_for_status()
+    return response.json()
 
 
 async def create_payment(data):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URI}{routes['payments.create']}",
-            headers={
-                "Authorization": f"Bearer {await register_paypal_token()}"
-            },
-            json=data
-        )
-        return response.json()
+    response = await _request(
+        "payments.create", "POST", routes["payments.create"], json=data)
+    response.raise_for_status()
+    return response.json()
 
 
 async def confirm_payment_source(order_id, data):
-    token = await register_paypal_token()
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URI}{routes['orders.confirm_payment_source'](order_id)}",
-            headers={
-                "Authorization": f"Bearer {token}"
-            },
-            json=data
-        )
-        print(response.json())
-
-        return response.json()
+    response = await _request(
+        "orders.confirm_payment_source", "POST",
+        routes["orders.confirm_payment_source"](order_id), json=data)
+    response.raise_for_status()
+    return response.json()
 
 
 async def get_order_detail(order_id):
-    token = await register_paypal_token()
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{API_URI}{routes['orders.detail'](order_id)}",
-            headers={
-                "Authorization": f"Bearer {token}"
-            },
-        )
-        response.raise_for_status()
-        return response.json()
+    response = await _request(
+        "orders.detail", "GET", routes["orders.detail"](order_id),
+        idempotent=True)
+    response.raise_for_status()
+    return response.json()
 
 
 async def capture_order(order_id):
-    token = await register_paypal_token()
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{API_URI}{routes['orders.capture'](order_id)}",
-            headers={
-                "Authorization": f"Bearer {token}"
-            },
-            json={}
-        )
-        return response.json()
+    """
+    Captures are sent with a PayPal-Request-Id derived from the order,
+    so a repeated capture gets the first answer back and can be retried.
+    """
+    response = await _request(
+        "orders.capture", "POST", routes["orders.capture"](order_id),
+        headers={"PayPal-Request-Id": f"capture-{order_id}"},
+        idempotent=True, json={})
+    response.raise_for_status()
+    return response.json()
 
 
 async def list_payments(limit: int = 10):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{API_URI}{routes['payments.list']}",
-            headers={
-                "Authorization": f"Bearer {await register_paypal_token()}"
-            },
-            params={"limit": limit}
-        )
-        response.raise_for_status()
-        return response.json()
+    response = await _request(
+        "payments.list", "GET", routes["payments.list"],
+        idempotent=True, params={"limit": limit})
+    response.raise_for_status()
+    return response.json()
+
+
+# Headers PayPal signs webhook deliveries with, by the field of the
+# verification request they go in.
+WEBHOOK_SIGNATURE_HEADERS = {
+    "auth_algo": "paypal-auth-algo",
+    "cert_url": "paypal-cert-url",
+    "transmission_id": "paypal-transmission-id",
+    "transmission_sig": "paypal-transmission-sig",
+    "transmission_time": "paypal-transmission-time",
+}
+
+
+async def verify_webhook_signature(
+    headers: Dict[str, str], event: Dict[str, Any]
+) -> bool:
+    """
+    Whether PayPal signed a webhook event delivered with these headers
+    for our webhook (PAYPAL_WEBHOOK_ID). Events without the headers, or
+    received while no webhook id is set, are never valid.
+    """
+    webhook_id = paypal_config.webhook_id
+    fields = {
+        field: headers.get(header)
+        for field, header in WEBHOOK_SIGNATURE_HEADERS.items()
+    }
+    if not webhook_id or not all(fields.values()):
+        return False
+
+    response = await _request(
+        "notifications.verify_webhook_signature", "POST",
+        routes["notifications.verify_webhook_signature"],
+        idempotent=True,
+        json={**fields, "webhook_id": webhook_id, "webhook_event": event},
+    )
+    response.raise_for_status()
+    return response.json().get("verification_status") == "SUCCESS"
@@ -0,0 +1,290 @@
+"""
+Local stand-in for the PayPal REST API, served as an ASGI app.
+
+It implements the calls paypal_service makes with in-memory state, so
+tests and benchmarks can run the payment flow without the sandbox:
+
+    paypal_service.use_transport(
+        httpx.ASGITransport(app=create_paypal_simulator()))
+
+Every call can be slowed down by `latency` plus up to `jitter` seconds,
+and fail with a 503 at `error_rate`. Both live on `app.state` and can
+be changed while it runs. To load-test against it over the network,
+serve it and point PAYPAL_API_URI at it:
+
+    python -m src.core.libs.paypal.paypal_simulator \
+        --port 8081 --latency 0.2 --jitter 0.3 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import hashlib
+import random
+import secrets
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse
+
+
+def _error(status_code: int, name: str) -> JSONResponse:
+    return JSONResponse(
+        status_code=status_code, content={"name": name, "details": []})
+
+
+def webhook_signature(
+    transmission_id: str,
+    transmission_time: str,
+    webhook_id: str,
+    event: Dict[str, Any],
+) -> str:
+    """
+    Signature the simulator accepts for a webhook event. PayPal signs
+    the transmission id and time, webhook id and a checksum of the body
+    with its certificate, the simulator hashes them instead.
+    """
+    message = f"{transmission_id}|{transmission_time}|{webhook_id}|"
+    return hashlib.sha256(
+        (message + str(event.get("id"))).encode()).hexdigest()
+
+
+def webhook_headers(event: Dict[str, Any], webhook_id: str) -> Dict[str, str]:
+    """Headers of a delivery of `event` the simulator verifies."""
+    transmission_id = secrets.token_hex(8)
+    transmission_time = datetime.now(timezone.utc).isoformat()
+    return {
+        "paypal-auth-algo": "SHA256withRSA",
+        "paypal-cert-url": "https://api.paypal.com/v1/notifications/certs/1",
+        "paypal-transmission-id": transmission_id,
+        "paypal-transmission-sig": webhook_signature(
+            transmission_id, transmission_time, webhook_id, event),
+        "paypal-transmission-time": transmission_time,
+    }
+
+
+def create_paypal_simulator(
+    base_uri: str = "https://api-m.sandbox.paypal.com",
+    checkout_uri: str = "https://sandbox.paypal.com",
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    seed: Optional[int] = None,
+) -> FastAPI:
+    app = FastAPI()
+    app.state.tokens = set()
+    app.state.orders = {}
+    # PayPal-Request-Id -> order id, for idempotent creates
+    app.state.requests = {}
+    # PayPal-Request-Id -> response, for idempotent captures
+    app.state.captures = {}
+    app.state.payments = []
+    app.state.latency = latency
+    app.state.jitter = jitter
+    app.state.error_rate = error_rate
+    # Requests received and failures injected, by path.
+    app.state.calls = Counter()
+    app.state.errors = Counter()
+    chance = random.Random(seed)
+
+    @app.middleware("http")
+    async def degrade(request: Request, call_next):
+        path = request.url.path
+        app.state.calls[path] += 1
+        delay = app.state.latency + chance.uniform(0, app.state.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if chance.random() < app.state.error_rate:
+            app.state.errors[path] += 1
+            return _error(503, "SERVICE_UNAVAILABLE")
+        return await call_next(request)
+
+    def authorized(authorization: Optional[str]) -> bool:
+        scheme, _, token = (authorization or "").partition(" ")
+        return scheme == "Bearer" and token in app.state.tokens
+
+    def links(order_id: str, status: str):
+        self_link = {
+            "href": f"{base_uri}/v2/checkout/orders/{order_id}",
+            "rel": "self",
+            "method": "GET",
+        }
+        if status == "COMPLETED":
+            return [self_link]
+        return [
+            self_link,
+            {
+                "href": f"{checkout_uri}/checkoutnow?token={order_id}",
+                "rel": (
+                    "payer-action" if status == "PAYER_ACTION_REQUIRED"
+                    else "approve"
+                ),
+                "method": "GET",
+            },
+            {
+                "href": f"{base_uri}/v2/checkout/orders/{order_id}/capture",
+                "rel": "capture",
+                "method": "POST",
+            },
+        ]
+
+    def set_status(order: Dict[str, Any], status: str) -> Dict[str, Any]:
+        order["status"] = status
+        order["links"] = links(order["id"], status)
+        return order
+
+    @app.post("/v1/oauth2/token")
+    async def token():
+        access_token = secrets.token_urlsafe(24)
+        app.state.tokens.add(access_token)
+        return {
+            "access_token": access_token,
+            "token_type": "Bearer",
+            "expires_in": 32400,
+        }
+
+    @app.post("/v2/checkout/orders")
+    async def create_order(
+        request: Request,
+        authorization: Optional[str] = Header(None),
+        paypal_request_id: Optional[str] = Header(None),
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+
+        known = app.state.requests.get(paypal_request_id)
+        if known:
+            return app.state.orders[known]
+
+        body = await request.json()
+        order_id = secrets.token_hex(8).upper()
+        order = set_status({
+            "id": order_id,
+            "intent": body.get("intent", "CAPTURE"),
+            "purchase_units": body.get("purchase_units", []),
+        }, "CREATED")
+        app.state.orders[order_id] = order
+        if paypal_request_id:
+            app.state.requests[paypal_request_id] = order_id
+        return JSONResponse(status_code=201, content=order)
+
+    @app.post("/v2/checkout/orders/{order_id}/confirm-payment-source")
+    async def confirm_payment_source(
+        order_id: str,
+        request: Request,
+        authorization: Optional[str] = Header(None),
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+        order = app.state.orders.get(order_id)
+        if order is None:
+            return _error(404, "RESOURCE_NOT_FOUND")
+
+        order["payment_source"] = (await request.json()).get(
+            "payment_source", {})
+        return set_status(order, "PAYER_ACTION_REQUIRED")
+
+    @app.get("/v2/checkout/orders/{order_id}")
+    async def order_detail(
+        order_id: str, authorization: Optional[str] = Header(None)
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+        order = app.state.orders.get(order_id)
+        if order is None:
+            return _error(404, "RESOURCE_NOT_FOUND")
+        return order
+
+    @app.post("/v2/checkout/orders/{order_id}/capture")
+    async def capture(
+        order_id: str,
+        authorization: Optional[str] = Header(None),
+        paypal_request_id: Optional[str] = Header(None),
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+        known = app.state.captures.get(paypal_request_id)
+        if known:
+            return JSONResponse(status_code=201, content=known)
+        order = app.state.orders.get(order_id)
+        if order is None:
+            return _error(404, "RESOURCE_NOT_FOUND")
+        if order["status"] == "COMPLETED":
+            return _error(422, "ORDER_ALREADY_CAPTURED")
+
+        captured = dict(set_status(order, "COMPLETED"))
+        if paypal_request_id:
+            app.state.captures[paypal_request_id] = captured
+        return JSONResponse(status_code=201, content=captured)
+
+    @app.post("/v2/payments/payment")
+    async def create_payment(
+        request: Request, authorization: Optional[str] = Header(None)
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+        payment = {
+            **await request.json(),
+            "id": f"PAYID-{secrets.token_hex(8).upper()}",
+            "state": "created",
+        }
+        app.state.payments.append(payment)
+        return JSONResponse(status_code=201, content=payment)
+
+    @app.get("/v2/payments/payment")
+    async def list_payments(
+        limit: int = 10, authorization: Optional[str] = Header(None)
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+        payments = app.state.payments[-limit:]
+        return {"payments": payments, "count": len(payments)}
+
+    @app.post("/v1/notifications/verify-webhook-signature")
+    async def verify_webhook_signature(
+        request: Request, authorization: Optional[str] = Header(None)
+    ):
+        if not authorized(authorization):
+            return _error(401, "AUTHENTICATION_FAILURE")
+        body = await request.json()
+        expected = webhook_signature(
+            body.get("transmission_id", ""),
+            body.get("transmission_time", ""),
+            body.get("webhook_id", ""),
+            body.get("webhook_event") or {},
+        )
+        valid = secrets.compare_digest(
+            expected, body.get("transmission_sig", ""))
+        return {"verification_status": "SUCCESS" if valid else "FAILURE"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    base_uri = f"http://{args.host}:{args.port}"
+    uvicorn.run(
+        create_paypal_simulator(
+            base_uri=base_uri,
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            seed=args.seed,
+        ),
+        host=args.host,
+        port=args.port,
+    )
+
+
+if __name__ == "__main__":
+    main()
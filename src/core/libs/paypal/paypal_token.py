@@ -0,0 +1,112 @@
+"""
+OAuth access token of the PayPal REST API, shared by every call.
+
+PayPal tokens stay valid for hours, so one token is cached until
+shortly before it expires instead of asking for a new one per call.
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+class AccessToken(NamedTuple):
+    value: str
+    # On the manager clock.
+    expires_at: float
+
+
+class TokenManager:
+    """
+    Caches the token `fetch` returns (a PayPal /v1/oauth2/token body)
+    until `expiry_margin` seconds before its `expires_in`.
+
+    Once less than `refresh_ahead` seconds are left, calls still get the
+    cached token while a new one is fetched in the background, so no
+    request waits on the refresh. Concurrent callers that do need a new
+    token share a single fetch.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[Dict[str, Any]]],
+        expiry_margin: float = 60.0,
+        refresh_ahead: float = 300.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fetch = fetch
+        self.expiry_margin = expiry_margin
+        self.refresh_ahead = refresh_ahead
+        self._clock = clock
+        self._token: Optional[AccessToken] = None
+        self._refreshing: Optional[asyncio.Task] = None
+        self.fetches = 0
+
+    async def get(self) -> str:
+        token = self._token
+        now = self._clock()
+        if token is not None and now < token.expires_at - self.expiry_margin:
+            if now >= token.expires_at - self.refresh_ahead:
+                self._start_refresh(background=True)
+            return token.value
+        return await self._refresh()
+
+    async def refresh(self, rejected: Optional[str] = None) -> str:
+        """
+        A new token after PayPal rejected `rejected`. Callers that hold
+        the same rejected token share one fetch, and a token fetched
+        since is returned as is.
+        """
+        token = self._token
+        if (
+            self._refreshing is None
+            and token is not None
+            and rejected is not None
+            and token.value != rejected
+        ):
+            return token.value
+        if self._refreshing is None:
+            self._token = None
+        return await self._refresh()
+
+    def clear(self):
+        self._token = None
+
+    async def _refresh(self) -> str:
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self, background: bool = False) -> asyncio.Task:
+        if self._refreshing is None:
+            self._refreshing = asyncio.create_task(self._fetch())
+            self._refreshing.add_done_callback(
+                self._log_failure if background else self._retrieve)
+        return self._refreshing
+
+    async def _fetch(self) -> str:
+        try:
+            data = await self.fetch()
+            self.fetches += 1
+            self._token = AccessToken(
+                value=data["access_token"],
+                expires_at=self._clock() + float(data.get("expires_in", 0)),
+            )
+            return self._token.value
+        finally:
+            self._refreshing = None
+
+    @staticmethod
+    def _retrieve(task: asyncio.Task):
+        # Callers awaiting the task get its error, this only keeps
+        # asyncio from warning about it when they went away.
+        if not task.cancelled():
+            task.exception()
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(
+                "Background PayPal token refresh failed",
+                exc_info=task.exception())
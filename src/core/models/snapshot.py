@@ -0,0 +1,128 @@
+from functools import lru_cache
+from typing import (
+    Any, Iterator, List, NamedTuple, Tuple, Type, get_args, get_origin
+)
+
+from beanie import Document, PydanticObjectId
+from pydantic import BaseModel, ConfigDict
+
+
+class Snapshot(BaseModel):
+    """
+    A few fields of a linked document, copied next to the link when the
+    owner is written. Reads can use it instead of resolving the link,
+    and it keeps the values the linked document had at that time.
+    """
+    id: PydanticObjectId
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @classmethod
+    def of(cls, document: Document) -> "Snapshot":
+        return cls.model_validate(document, from_attributes=True)
+
+
+class SnapshotOf:
+    """
+    Marks a field as the snapshot of the link field `link`:
+
+        user: Link[User]
+        user_snapshot: Annotated[
+            Optional[UserSnapshot], SnapshotOf("user")] = None
+    """
+
+    def __init__(self, link: str):
+        self.link = link
+
+
+class SnapshotField(NamedTuple):
+    name: str
+    link: str
+    schema: Type[Snapshot]
+
+
+class SnapshotPlan(NamedTuple):
+    snapshots: Tuple[SnapshotField, ...]
+    # Fields holding embedded models (or lists of them) with snapshots.
+    embedded: Tuple[str, ...]
+
+
+@lru_cache(maxsize=None)
+def snapshot_plan(model: Type[BaseModel]) -> SnapshotPlan:
+    """Snapshot fields of a model and where its embedded ones are."""
+    snapshots = []
+    embedded = []
+    for name, field in model.model_fields.items():
+        marker = next(
+            (m for m in field.metadata if isinstance(m, SnapshotOf)), None)
+        if marker is not None:
+            snapshots.append(SnapshotField(
+                name, marker.link, _snapshot_schema(field.annotation)))
+        elif any(
+            snapshot_plan(embedded_model) != _EMPTY_PLAN
+            for embedded_model in _embedded_models(field.annotation)
+            if embedded_model is not model
+        ):
+            embedded.append(name)
+    return SnapshotPlan(tuple(snapshots), tuple(embedded))
+
+
+_EMPTY_PLAN = SnapshotPlan((), ())
+
+
+SnapshotSlot = Tuple[str, BaseModel, SnapshotField]
+
+
+def snapshot_slots(
+    document: BaseModel, prefix: str = ""
+) -> Iterator[SnapshotSlot]:
+    """
+    Every (path, owner, snapshot field) of a document, including the
+    ones of the models embedded in it. Paths are dotted Mongo paths,
+    like `items.0.product_snapshot`.
+    """
+    plan = snapshot_plan(type(document))
+    for field in plan.snapshots:
+        yield f"{prefix}{field.name}", document, field
+    for name in plan.embedded:
+        value = getattr(document, name, None)
+        if isinstance(value, list):
+            items = [(f"{prefix}{name}.{i}.", item)
+                     for i, item in enumerate(value)]
+        else:
+            items = [(f"{prefix}{name}.", value)]
+        for item_prefix, item in items:
+            if isinstance(item, BaseModel) and not isinstance(item, Document):
+                yield from snapshot_slots(item, item_prefix)
+
+
+def snapshot_paths(model: Type[BaseModel], prefix: str = "") -> List[str]:
+    """Dotted paths of every snapshot field a model may hold."""
+    plan = snapshot_plan(model)
+    paths = [f"{prefix}{field.name}" for field in plan.snapshots]
+    for name in plan.embedded:
+        annotation = model.model_fields[name].annotation
+        for embedded_model in _embedded_models(annotation):
+            paths.extend(snapshot_paths(embedded_model, f"{prefix}{name}."))
+    return paths
+
+
+def _snapshot_schema(annotation: Any) -> Type[Snapshot]:
+    if isinstance(annotation, type) and issubclass(annotation, Snapshot):
+        return annotation
+    for arg in get_args(annotation):
+        if isinstance(arg, type) and issubclass(arg, Snapshot):
+            return arg
+    raise TypeError(f"{annotation} is not a Snapshot")
+
+
+def _embedded_models(annotation: Any) -> Iterator[Type[BaseModel]]:
+    if get_origin(annotation) is not None:
+        for arg in get_args(annotation):
+            yield from _embedded_models(arg)
+    elif (
+        isinstance(annotation, type)
+        and issubclass(annotation, BaseModel)
+        and not issubclass(annotation, Document)
+    ):
+        yield annotation
@@ -1,60 +1,686 @@
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar
-from beanie import Document, PydanticObjectId, Link
+from collections import defaultdict
+from functools import partial
+from typing import (
+    Any, AsyncIterator, Dict, Generic, List, Optional, Sequence, Tuple, Type,
+    TypeVar
+)
+from beanie import Document, PydanticObjectId, Link, SortDirection
+from beanie.odm.utils.encoder import Encoder
+from beanie.odm.utils.parsing import parse_obj
+from beanie.operators import In
+from bson import DBRef
+from pydantic import BaseModel, ValidationError
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
 import asyncio
 
+from ..models.snapshot import snapshot_paths, snapshot_plan, snapshot_slots
+from .bulk import BulkResult, BulkRowError, failed_rows, not_applied
+from .cache import LRUCache
+from .explain import QueryShape
+from .identity_map import current_identity_map, use_identity_map
+from .links import link_plan
+from .pagination import DEFAULT_PAGE_SIZE, Page, decode_cursor, encode_cursor
+from .projection import projection_model
+
+
+DEFAULT_STREAM_BATCH_SIZE = 500
+
 
 T = TypeVar("T", bound=Document)
 
+# (owner, field name, list index or None, link) of an unresolved link
+LinkSlot = Tuple[BaseModel, str, Optional[int], Link]
+
+# Document caches by model. The link resolver reads them too, so linked
+# documents are served from the cache of the service that owns them.
+_document_caches: Dict[Type[Document], LRUCache] = {}
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        model.__name__: cache.stats()
+        for model, cache in _document_caches.items()
+    }
+
 
 class BaseService(Generic[T]):
-    def __init__(self, model: Type[T]):
+    def __init__(self, model: Type[T], cache: Optional[LRUCache] = None):
+        """
+        `cache` turns on a read-through cache of `find_one` by id, which
+        every write of this service invalidates.
+        """
         self.model = model
+        self.cache = cache
+        if cache is not None:
+            _document_caches[model] = cache
 
     async def create(self, data) -> T:
         data = self._serializer(data)
         item = self.model(**data)
+        await self._take_snapshots([item])
         return await item.insert()
 
-    async def find_one(self, id: PydanticObjectId) -> Optional[T]:
-        item = await self.model.get(id)
+    async def find_one(
+        self,
+        id: PydanticObjectId,
+        fields: Optional[Sequence[str]] = None,
+        fresh: bool = False,
+    ) -> Optional[T]:
+        """
+        With `fields`, only those fields are loaded (as a projection
+        model) and only the links among them are resolved. With `fresh`,
+        the document is read from the database and not from the
+        document cache, which misses the writes of other processes.
+        """
+        if fields or fresh:
+            item = await self.model.find_one(
+                {"_id": self._object_id(id)},
+                projection_model=(
+                    projection_model(self.model, fields) if fields else None
+                ),
+            )
+        else:
+            id = self._object_id(id)
+            item = (await self._fetch_by_ids(self.model, {id})).get(id)
+
         if item:
-            await self._fetch_nested_links(item)
+            await self._resolve_links([item])
         return item
 
     async def find_all(self) -> List[T]:
         result = await self.model.find_all().to_list()
-        await asyncio.gather(*[
-            self._fetch_nested_links(item) for item in result])
+        await self._resolve_links(result)
         return result
 
+    async def find_many(
+        self,
+        ids: Sequence[PydanticObjectId],
+        fetch_links: bool = True,
+    ) -> List[T]:
+        """Load the documents with the given ids in one `$in` query."""
+        if not ids:
+            return []
+
+        documents = await self._fetch_by_ids(
+            self.model, {self._object_id(id) for id in ids})
+        result = list(documents.values())
+        if fetch_links:
+            await self._resolve_links(result)
+        return result
+
+    async def find_page(
+        self,
+        after: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE,
+        sort_key: str = "_id",
+        descending: bool = False,
+        fields: Optional[Sequence[str]] = None,
+        trusted: bool = False,
+        filter: Optional[Dict[str, Any]] = None,
+        include: Optional[Sequence[str]] = None,
+    ) -> Page[T]:
+        """
+        Keyset pagination over `sort_key` (ties broken by `_id`) of the
+        documents matching `filter`.
+        Each page starts right after the cursor instead of skipping rows,
+        so a deep page costs the same as the first one. An index on the
+        filtered fields followed by `sort_key` and `_id` serves it.
+        With `fields`, only those fields are loaded and resolved.
+        With `trusted`, the page holds the raw rows with their links
+        resolved, for `trusted_response` to serialize without hydration.
+        `include` narrows trusted rows to those (dotted) paths, links
+        left out of them are not resolved.
+        Raises ValueError for a malformed cursor or an unknown field.
+        """
+        projection = None
+        if fields:
+            fields = tuple(fields)
+            if sort_key != "_id" and sort_key not in fields:
+                fields += (sort_key,)
+            projection = projection_model(self.model, fields)
+
+        direction = (
+            SortDirection.DESCENDING if descending else SortDirection.ASCENDING
+        )
+        sort = [(sort_key, direction)]
+        if sort_key != "_id":
+            sort.append(("_id", direction))
+
+        query = filter or {}
+        if after:
+            cursor = decode_cursor(after, sort_key)
+            after_cursor = self._after_cursor_query(
+                sort_key, cursor, descending)
+            query = {"$and": [query, after_cursor]} if query else after_cursor
+
+        if trusted and projection is None:
+            return await self._find_raw_page(
+                query, sort, sort_key, limit, include)
+
+        # One extra row tells whether a next page exists.
+        items = await self.model.find(
+            query, projection_model=projection
+        ).sort(sort).limit(limit + 1).to_list()
+
+        next_cursor = None
+        if len(items) > limit:
+            items = items[:limit]
+            last = items[-1]
+            next_cursor = encode_cursor(
+                sort_key, self._sort_value(last, sort_key), last.id)
+
+        await self._resolve_links(items)
+        return Page(items=items, next_cursor=next_cursor)
+
+    async def stream(
+        self,
+        batch_size: int = DEFAULT_STREAM_BATCH_SIZE,
+    ) -> AsyncIterator[T]:
+        """
+        Iterate over the whole collection in `_id` order, holding at most
+        one batch in memory. Links are resolved per batch, each with an
+        identity map of its own: the one of the request would keep every
+        linked document of the stream until the response ends.
+        """
+        batch: List[T] = []
+        query = self.model.find_all(batch_size=batch_size).sort(
+            [("_id", SortDirection.ASCENDING)])
+
+        try:
+            async for item in query:
+                batch.append(item)
+                if len(batch) >= batch_size:
+                    with use_identity_map():
+                        await self._resolve_links(batch)
+                    for document in batch:
+                        yield document
+                    batch = []
+        finally:
+            # Closing the generator early (a client gone mid-stream)
+            # would otherwise leave the server cursor open until it
+            # times out.
+            if query.cursor is not None:
+                await query.cursor.close()
+
+        if batch:
+            with use_identity_map():
+                await self._resolve_links(batch)
+            for document in batch:
+                yield document
+
     async def update(
         self,
         id: PydanticObjectId,
-        data
+        data,
+        fetch_links: bool = True,
     ) -> Optional[T]:
+        """
+        Apply `$set` and read the updated document back in one
+        `find_one_and_update` round trip. Links are resolved only when
+        `fetch_links` is set.
+        """
         data = self._serializer(data)
+        if not data:
+            item = await self.model.get(id)
+            if item and fetch_links:
+                await self._resolve_links([item])
+            return item
 
-        await self.model.find(
-            self.model.id == id).update({"$set": data})
-
-        item = await self.find_one(id)
-        if item:
-            await self._fetch_nested_links(item)
-        return item
+        await self._snapshot_updates([data])
+        return await self._find_one_and_update(
+            id, {"$set": data}, fetch_links)
 
     async def delete(self, id: PydanticObjectId) -> bool:
-        item = await self.model.get(id)
-        if not item:
-            return False
-        await item.delete()
-        return True
+        collection = self.model.get_pymongo_collection()
+        deleted = await collection.find_one_and_delete(
+            {"_id": self._object_id(id)}, projection={"_id": 1}
+        )
+        self._invalidate(id)
+        return deleted is not None
 
     async def increase(
         self,
         id: PydanticObjectId,
-        expression: Dict[Any, Any]
+        expression: Dict[Any, Any],
+        fetch_links: bool = False,
+    ) -> Optional[T]:
+        """`$inc` the given fields and return the updated document."""
+        return await self._find_one_and_update(
+            id, {"$inc": expression}, fetch_links)
+
+    async def bulk_create(
+        self,
+        items: Sequence[Any],
+        ordered: bool = False,
+    ) -> BulkResult:
+        """
+        Validate every row and insert the valid ones with `insert_many`.
+        Errors are reported per row index instead of failing the batch.
+        An `ordered` batch stops at the first invalid row.
+        """
+        documents: List[T] = []
+        positions: List[int] = []
+        errors: List[BulkRowError] = []
+        for index, data in enumerate(items):
+            try:
+                document = self.model(**self._serializer(data))
+            except (TypeError, ValidationError) as e:
+                errors.append(BulkRowError(index=index, detail=str(e)))
+                if ordered:
+                    errors.extend(not_applied(index + 1, len(items)))
+                    break
+                continue
+            document.id = PydanticObjectId()
+            documents.append(document)
+            positions.append(index)
+
+        if not documents:
+            return BulkResult(errors=errors)
+
+        await self._take_snapshots(documents)
+        encoder = Encoder(
+            to_db=True,
+            custom_encoders=self.model.get_settings().bson_encoders,
+        )
+        failed = await self._write_rows(
+            lambda collection: collection.insert_many(
+                [encoder.encode(document) for document in documents],
+                ordered=ordered,
+            ),
+            len(documents), ordered,
+        )
+        return self._bulk_result(
+            [document.id for document in documents], failed
+        ).remap(positions, errors)
+
+    async def bulk_update(
+        self,
+        rows: Sequence[Tuple[PydanticObjectId, Any]],
+        ordered: bool = False,
+    ) -> BulkResult:
+        """
+        `$set` each row's data on its document with one `bulk_write`.
+        Unknown ids and empty rows are reported per row and left out of
+        the write, an `ordered` batch stops at the first of them.
+        """
+        existing = await self._existing_ids([id for id, _ in rows])
+        encoder = Encoder(
+            custom_encoders=self.model.get_settings().bson_encoders)
+        rows = [(id, self._serializer(data)) for id, data in rows]
+        await self._snapshot_updates([data for _, data in rows])
+
+        operations: List[UpdateOne] = []
+        ids: List[PydanticObjectId] = []
+        positions: List[int] = []
+        errors: List[BulkRowError] = []
+        for index, (id, data) in enumerate(rows):
+            id = self._object_id(id)
+            if id not in existing:
+                detail = "Not found"
+            elif not data:
+                detail = "Nothing to update"
+            else:
+                operations.append(
+                    UpdateOne({"_id": id}, encoder.encode({"$set": data})))
+                ids.append(id)
+                positions.append(index)
+                continue
+            errors.append(BulkRowError(index=index, id=id, detail=detail))
+            if ordered:
+                errors.extend(not_applied(
+                    index + 1, len(rows), [id for id, _ in rows]))
+                break
+
+        if not operations:
+            return BulkResult(errors=errors)
+
+        failed = await self._write_rows(
+            lambda collection: collection.bulk_write(
+                operations, ordered=ordered),
+            len(operations), ordered,
+        )
+        self._invalidate(*ids)
+        return self._bulk_result(ids, failed).remap(positions, errors)
+
+    async def bulk_delete(
+        self,
+        ids: Sequence[PydanticObjectId],
+        ordered: bool = False,
+    ) -> BulkResult:
+        """
+        Delete the documents with one `bulk_write` of DeleteOne ops. An
+        `ordered` batch stops at the first unknown id.
+        """
+        existing = await self._existing_ids(ids)
+
+        operations: List[DeleteOne] = []
+        found: List[PydanticObjectId] = []
+        positions: List[int] = []
+        errors: List[BulkRowError] = []
+        for index, id in enumerate(ids):
+            id = self._object_id(id)
+            if id not in existing:
+                errors.append(
+                    BulkRowError(index=index, id=id, detail="Not found"))
+                if ordered:
+                    errors.extend(not_applied(index + 1, len(ids), ids))
+                    break
+                continue
+            operations.append(DeleteOne({"_id": id}))
+            found.append(id)
+            positions.append(index)
+
+        if not operations:
+            return BulkResult(errors=errors)
+
+        failed = await self._write_rows(
+            lambda collection: collection.bulk_write(
+                operations, ordered=ordered),
+            len(operations), ordered,
+        )
+        self._invalidate(*found)
+        return self._bulk_result(found, failed).remap(positions, errors)
+
+    async def backfill_snapshots(
+        self, batch_size: int = DEFAULT_STREAM_BATCH_SIZE
+    ) -> int:
+        """
+        Take the snapshots of the documents written before they existed,
+        one batch at a time in `_id` order. A batch costs one query per
+        linked model and one `bulk_write`. Returns the number of
+        documents updated.
+        """
+        paths = snapshot_paths(self.model)
+        if not paths:
+            return 0
+
+        missing = {"$or": [{path: {"$exists": False}} for path in paths]}
+        encoder = Encoder(
+            custom_encoders=self.model.get_settings().bson_encoders)
+        collection = self.model.get_pymongo_collection()
+        updated = 0
+        after = None
+        while True:
+            query = missing if after is None else {
+                "$and": [missing, {"_id": {"$gt": after}}]}
+            batch = await self.model.find(query).sort(
+                [("_id", SortDirection.ASCENDING)]
+            ).limit(batch_size).to_list()
+            if not batch:
+                return updated
+
+            slots = await self._take_snapshots(batch)
+            changes: Dict[Any, Dict[str, Any]] = defaultdict(dict)
+            for document, path, owner, field in slots:
+                changes[document.id][path] = getattr(owner, field.name)
+            await collection.bulk_write([
+                UpdateOne({"_id": id}, encoder.encode({"$set": values}))
+                for id, values in changes.items()
+            ], ordered=False)
+            self._invalidate(*changes)
+            updated += len(changes)
+            after = batch[-1].id
+
+    def query_shapes(self) -> List[QueryShape]:
+        """
+        Shapes of the queries this service sends, for `explain_shapes`.
+        Services that query by other fields add theirs.
+        """
+        id = PydanticObjectId()
+        return [
+            QueryShape("find_one", self.model, {"_id": id}),
+            QueryShape("find_many", self.model, {"_id": {"$in": [id]}}),
+            QueryShape(
+                "find_page", self.model, {"_id": {"$gt": id}}, [("_id", 1)]),
+        ]
+
+    async def _take_snapshots(self, documents: Sequence[BaseModel]):
+        """
+        Fill the snapshot fields of documents about to be written from
+        their links. Linked documents that are not loaded yet are
+        fetched with one `$in` query per model. Returns the
+        (document, path, owner, field) of every snapshot taken.
+        """
+        slots = [
+            (document, *slot)
+            for document in documents
+            for slot in snapshot_slots(document)
+        ]
+        linked = [
+            getattr(owner, field.link, None) for *_, owner, field in slots]
+        loaded = await self._load_links(linked)
+        for (*_, owner, field), value in zip(slots, linked):
+            if isinstance(value, Link):
+                value = loaded.get((value.document_class, value.ref.id))
+            setattr(
+                owner, field.name,
+                field.schema.of(value) if value is not None else None)
+        return slots
+
+    async def _snapshot_updates(self, rows: List[Dict[str, Any]]):
+        """Add to `$set` data the snapshots of the links it changes."""
+        fields = [
+            field for field in snapshot_plan(self.model).snapshots
+            if any(field.link in data for data in rows)
+        ]
+        if not fields:
+            return
+
+        loaded = await self._load_links([
+            data[field.link] for data in rows for field in fields
+            if field.link in data
+        ])
+        for data in rows:
+            for field in fields:
+                if field.link not in data:
+                    continue
+                value = data[field.link]
+                if isinstance(value, Link):
+                    value = loaded.get((value.document_class, value.ref.id))
+                data[field.name] = (
+                    field.schema.of(value) if value is not None else None)
+
+    async def _load_links(
+        self, values: Sequence[Any]
+    ) -> Dict[Tuple[Type[Document], Any], Document]:
+        """Documents of the unresolved links among `values`."""
+        missing: Dict[Type[Document], set] = defaultdict(set)
+        for value in values:
+            if isinstance(value, Link):
+                missing[value.document_class].add(value.ref.id)
+
+        fetched = await asyncio.gather(*[
+            self._fetch_by_ids(model, ids) for model, ids in missing.items()
+        ])
+        return {
+            (model, id): document
+            for model, documents in zip(missing, fetched)
+            for id, document in documents.items()
+        }
+
+    async def _write_rows(self, write, size: int, ordered: bool):
+        """Run a bulk write and return the failed rows by index."""
+        try:
+            await write(self.model.get_pymongo_collection())
+        except BulkWriteError as e:
+            return failed_rows(
+                e.details.get("writeErrors", []), size, ordered)
+        return {}
+
+    @staticmethod
+    def _bulk_result(
+        ids: List[PydanticObjectId],
+        failed: Dict[int, str],
+    ) -> BulkResult:
+        return BulkResult(
+            count=len(ids) - len(failed),
+            ids=[id for index, id in enumerate(ids) if index not in failed],
+            errors=[
+                BulkRowError(index=index, id=ids[index], detail=detail)
+                for index, detail in sorted(failed.items())
+            ],
+        )
+
+    async def _existing_ids(self, ids: Sequence[PydanticObjectId]) -> set:
+        documents = await self.model.get_pymongo_collection().find(
+            {"_id": {"$in": [self._object_id(id) for id in ids]}},
+            projection={"_id": 1},
+        ).to_list(None)
+        return {document["_id"] for document in documents}
+
+    async def _find_raw_page(
+        self,
+        query: Dict[str, Any],
+        sort: List[Tuple[str, SortDirection]],
+        sort_key: str,
+        limit: int,
+        include: Optional[Sequence[str]] = None,
+    ) -> Page[dict]:
+        """`find_page` on the raw collection, skipping Beanie entirely."""
+        projection = None
+        if include:
+            projection = dict.fromkeys((*include, sort_key), 1)
+        rows = await self.model.get_pymongo_collection().find(
+            query, projection, sort=sort, limit=limit + 1).to_list()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(
+                sort_key, last.get(sort_key), last["_id"])
+
+        await self._resolve_raw_links(rows)
+        return Page(items=rows, next_cursor=next_cursor)
+
+    async def _resolve_raw_links(self, rows: List[dict]):
+        """
+        Raw counterpart of `_resolve_links`: every DBRef reachable from
+        the rows is replaced in place by the row it points to, with one
+        `$in` query per collection and level.
+        """
+        database = self.model.get_pymongo_collection().database
+        own = self.model.get_collection_name()
+        resolved: Dict[Tuple[str, Any], dict] = {
+            (own, row["_id"]): row for row in rows
+        }
+        level = rows
+
+        while level:
+            slots: Dict[str, List[Tuple[Any, Any, DBRef]]] = (
+                defaultdict(list)
+            )
+            for row in level:
+                self._collect_refs(row, slots)
+
+            missing = {
+                collection: {
+                    ref.id for (*_, ref) in refs
+                    if (collection, ref.id) not in resolved
+                }
+                for collection, refs in slots.items()
+            }
+            missing = {name: ids for name, ids in missing.items() if ids}
+            fetched = await asyncio.gather(*[
+                database[collection].find(
+                    {"_id": {"$in": list(ids)}}).to_list()
+                for collection, ids in missing.items()])
+
+            level = []
+            for collection, found in zip(missing, fetched):
+                for row in found:
+                    resolved[(collection, row["_id"])] = row
+                    level.append(row)
+
+            for collection, refs in slots.items():
+                for container, key, ref in refs:
+                    row = resolved.get((collection, ref.id))
+                    if row is not None:
+                        container[key] = row
+
+    @classmethod
+    def _collect_refs(cls, container, slots):
+        items = (
+            container.items() if isinstance(container, dict)
+            else enumerate(container)
+        )
+        for key, value in items:
+            if isinstance(value, DBRef):
+                slots[value.collection].append((container, key, value))
+            elif isinstance(value, (dict, list)):
+                cls._collect_refs(value, slots)
+
+    async def _find_one_and_update(
+        self,
+        id: PydanticObjectId,
+        update: Dict[str, Any],
+        fetch_links: bool,
+        condition: Optional[Dict[str, Any]] = None,
     ) -> Optional[T]:
-        await self.model.find(self.model.id == id).inc(expression=expression)
+        """
+        Update one document and read it back. With a `condition`, only a
+        document that also matches it is updated, otherwise None is
+        returned.
+        """
+        encoder = Encoder(
+            custom_encoders=self.model.get_settings().bson_encoders)
+        collection = self.model.get_pymongo_collection()
+        raw = await collection.find_one_and_update(
+            {**(condition or {}), "_id": self._object_id(id)},
+            encoder.encode(update),
+            return_document=ReturnDocument.AFTER,
+        )
+        self._invalidate(id)
+        if raw is None:
+            return None
+
+        item = parse_obj(self.model, raw)
+        if fetch_links:
+            await self._resolve_links([item])
+        return item
+
+    def _invalidate(self, *ids):
+        identity_map = current_identity_map()
+        collection = self.model.get_collection_name()
+        for id in map(self._object_id, ids):
+            if self.cache is not None:
+                self.cache.invalidate(id)
+            if identity_map is not None:
+                identity_map.discard(collection, id)
+
+    @staticmethod
+    def _object_id(id) -> PydanticObjectId:
+        if isinstance(id, PydanticObjectId):
+            return id
+        return PydanticObjectId(id)
+
+    @staticmethod
+    def _after_cursor_query(
+        sort_key: str,
+        cursor: Dict[str, Any],
+        descending: bool
+    ) -> Dict[str, Any]:
+        operator = "$lt" if descending else "$gt"
+        if sort_key == "_id":
+            return {"_id": {operator: cursor["id"]}}
+
+        return {"$or": [
+            {sort_key: {operator: cursor["v"]}},
+            {sort_key: cursor["v"], "_id": {operator: cursor["id"]}},
+        ]}
+
+    @staticmethod
+    def _sort_value(document: BaseModel, sort_key: str) -> Any:
+        if sort_key == "_id":
+            return document.id
+
+        value = getattr(document, sort_key)
+        if isinstance(value, Link):
+            return value.ref.id
+        if isinstance(value, Document):
+            return value.id
+        return value
 
     def _serializer(self, data):
         """Create a new document from dict or Pydantic model."""
@@ -71,47 +697,135 @@ class BaseService(Generic[T]):
 
     async def _fetch_nested_links(self, document: Document):
         """
-        Recursively fetches all nested links in a Beanie document.
-        """
-        tasks = []
-        for (field_name, field_value) in document.model_dump().items():
-            # Use getattr to inspect the actual field types on the model
-            field = getattr(document, field_name)
-
-            # Check if the field is a Link
-            if isinstance(field, Link):
-                tasks.append(self._fetch_link(document, field_name))
-
-            elif isinstance(field, list) and field:
-                # Check if the list contains Links or other
-                # documents/models to recurse into
-                if isinstance(field[0], Link):
-                    tasks.append(self._fetch_link_list(document, field_name))
-                # If it's a list of Pydantic models (like OrderItem),
-                # recurse into each
-                elif hasattr(field[0], 'model_fields'):
-                    for item in field:
-                        tasks.append(self._fetch_nested_links(item))
-            # If the field is a single Pydantic model, recurse into it
-            elif hasattr(field, 'model_fields'):
-                tasks.append(self._fetch_nested_links(field))
-
-        if tasks:
-            await asyncio.gather(*tasks)
-
-    async def _fetch_link(self, document: Document, field_name: str):
-        link = getattr(document, field_name)
-        # The calling function ensures this is a Link,
-        # so we can fetch directly.
-        fetched_doc = await link.fetch()
-        setattr(document, field_name, fetched_doc)
-        # Recursively fetch links within the newly fetched document.
-        await self._fetch_nested_links(fetched_doc)
-
-    async def _fetch_link_list(self, document: Document, field_name: str):
-        # The calling function ensures this is a list of Links.
-        fetched_docs = await document.fetch_link(field_name)
-        # Concurrently and recursively fetch links for each document
-        # in the list.
-        await asyncio.gather(*[
-            self._fetch_nested_links(doc) for doc in fetched_docs])
+        Fetches all nested links in a Beanie document.
+        """
+        await self._resolve_links([document])
+
+    async def _resolve_links(self, documents: List[BaseModel]):
+        """
+        Resolves every link reachable from the given documents in place.
+
+        The link graph is walked one level at a time. All unresolved links
+        of a level are grouped by target model and loaded with a single
+        `$in` query per model, so a call costs one query per model and
+        level no matter how many documents it resolves.
+        """
+        resolved: Dict[Tuple[Type[Document], Any], Document] = {}
+        level = [document for document in documents if document is not None]
+
+        while level:
+            slots: Dict[Type[Document], List[LinkSlot]] = defaultdict(list)
+            for document in level:
+                self._collect_links(document, slots)
+
+            # Documents already loaded on a previous level are linked
+            # directly, which also stops cycles in the link graph.
+            missing = {
+                model: {
+                    link.ref.id for (*_, link) in model_slots
+                    if (model, link.ref.id) not in resolved
+                }
+                for model, model_slots in slots.items()
+            }
+            missing = {model: ids for model, ids in missing.items() if ids}
+            fetched = await asyncio.gather(*[
+                self._fetch_by_ids(model, ids)
+                for model, ids in missing.items()])
+
+            level = []
+            for model, documents_by_id in zip(missing, fetched):
+                for doc_id, document in documents_by_id.items():
+                    resolved[(model, doc_id)] = document
+                    level.append(document)
+
+            for model, model_slots in slots.items():
+                for owner, field_name, index, link in model_slots:
+                    document = resolved.get((model, link.ref.id))
+                    # A dangling link is kept as is, like Link.fetch does.
+                    if document is not None:
+                        self._assign_link(owner, field_name, index, document)
+
+    def _collect_links(
+        self,
+        document: BaseModel,
+        slots: Dict[Type[Document], List[LinkSlot]]
+    ):
+        """
+        Collects the unresolved links of a document, recursing into
+        embedded models and already fetched documents. Only the fields
+        of the model's link plan are visited.
+        """
+        for field_name, many in link_plan(type(document)):
+            field = getattr(document, field_name, None)
+
+            if many and isinstance(field, list):
+                for index, item in enumerate(field):
+                    if isinstance(item, Link):
+                        slots[item.document_class].append(
+                            (document, field_name, index, item))
+                    elif isinstance(item, BaseModel):
+                        self._collect_links(item, slots)
+
+            elif isinstance(field, Link):
+                slots[field.document_class].append(
+                    (document, field_name, None, field))
+
+            elif isinstance(field, BaseModel):
+                self._collect_links(field, slots)
+
+    @staticmethod
+    def _assign_link(
+        owner: BaseModel,
+        field_name: str,
+        index: Optional[int],
+        document: Document
+    ):
+        if index is None:
+            setattr(owner, field_name, document)
+        else:
+            getattr(owner, field_name)[index] = document
+
+    @staticmethod
+    async def _fetch_by_ids(
+        model: Type[Document],
+        ids: set
+    ) -> Dict[Any, Document]:
+        """
+        Load documents by id. Within a request the identity map hands out
+        the documents it already holds, so each one is loaded only once.
+        """
+        identity_map = current_identity_map()
+        if identity_map is None:
+            return await BaseService._load_by_ids(model, ids)
+        return await identity_map.load(
+            model.get_collection_name(), ids,
+            partial(BaseService._load_by_ids, model),
+        )
+
+    @staticmethod
+    async def _load_by_ids(
+        model: Type[Document],
+        ids: set
+    ) -> Dict[Any, Document]:
+        """
+        Load documents by id with one `$in` query, serving what it can
+        from the model's document cache. The cache holds unresolved
+        copies, so callers are free to resolve and mutate the result.
+        """
+        documents: Dict[Any, Document] = {}
+        cache = _document_caches.get(model)
+        if cache is not None:
+            for id in ids:
+                cached = cache.get(id)
+                if cached is not None:
+                    documents[id] = cached.model_copy(deep=True)
+            ids = ids - documents.keys()
+
+        if ids:
+            fetched = await model.find(
+                In("_id", list(ids)), with_children=True).to_list()
+            for document in fetched:
+                documents[document.id] = document
+                if cache is not None:
+                    cache.set(document.id, document.model_copy(deep=True))
+        return documents
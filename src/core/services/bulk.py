@@ -0,0 +1,93 @@
+from typing import Dict, Generic, List, Optional, Sequence, TypeVar
+
+from beanie import PydanticObjectId
+from pydantic import BaseModel, Field
+
+
+T = TypeVar("T")
+
+MAX_BULK_ROWS = 10000
+
+NOT_APPLIED = "Not applied after an earlier error"
+
+
+class BulkRowError(BaseModel):
+    index: int
+    id: Optional[PydanticObjectId] = None
+    detail: str
+
+
+class BulkResult(BaseModel):
+    count: int = 0
+    ids: List[PydanticObjectId] = Field(default_factory=list)
+    errors: List[BulkRowError] = Field(default_factory=list)
+
+    def remap(
+        self,
+        positions: Sequence[int],
+        errors: Sequence[BulkRowError] = (),
+    ) -> "BulkResult":
+        """
+        Translate row indexes of a pre-filtered batch back to the indexes
+        of the request and add the errors found while filtering it.
+        """
+        remapped = [
+            error.model_copy(update={"index": positions[error.index]})
+            for error in self.errors
+        ]
+        return BulkResult(
+            count=self.count,
+            ids=self.ids,
+            errors=sorted([*errors, *remapped], key=lambda e: e.index),
+        )
+
+
+class BulkCreateRequest(BaseModel, Generic[T]):
+    items: List[T] = Field(..., min_length=1, max_length=MAX_BULK_ROWS)
+    ordered: bool = False
+
+
+class BulkUpdateRequest(BaseModel, Generic[T]):
+    items: List[T] = Field(..., min_length=1, max_length=MAX_BULK_ROWS)
+    ordered: bool = False
+
+
+class BulkDeleteRequest(BaseModel):
+    ids: List[PydanticObjectId] = Field(
+        ..., min_length=1, max_length=MAX_BULK_ROWS)
+    ordered: bool = False
+
+
+def failed_rows(
+    write_errors: Sequence[dict],
+    size: int,
+    ordered: bool,
+) -> Dict[int, str]:
+    """
+    Map the `writeErrors` of a BulkWriteError to row indexes. An ordered
+    write stops at the first error, so the rows after it are reported too.
+    """
+    failed = {
+        error["index"]: error.get("errmsg", "Write failed")
+        for error in write_errors
+    }
+    if ordered and failed:
+        for index in range(min(failed) + 1, size):
+            failed.setdefault(index, NOT_APPLIED)
+    return failed
+
+
+def not_applied(
+    start: int,
+    size: int,
+    ids: Optional[Sequence[Optional[PydanticObjectId]]] = None,
+) -> List[BulkRowError]:
+    """
+    Errors of the rows from `start` on, which an ordered batch leaves
+    out once a row before them was rejected.
+    """
+    return [
+        BulkRowError(
+            index=index, id=ids[index] if ids else None, detail=NOT_APPLIED)
+        for index in range(start, size)
+    ]
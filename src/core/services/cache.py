@@ -0,0 +1,159 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (
+    Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+)
+
+from ..config.config import app_settings
+
+
+class LRUCache:
+    """
+    In-process LRU cache whose entries also expire after `ttl` seconds.
+    Keeps hit/miss/eviction counters so the cache can be sized.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = (
+            OrderedDict()
+        )
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self._clock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        expires_at = self._clock() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class CoalescingCache:
+    """
+    LRUCache in front of an async loader. Concurrent misses for a key
+    share a single load, and `ttl` picks how long each loaded value is
+    kept. A failed load is not cached, every waiter gets its error.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[Hashable], Awaitable[Any]],
+        ttl: Callable[[Any], float],
+        cache: Optional[LRUCache] = None,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.cache = cache if cache is not None else LRUCache()
+        self.loads = 0
+        self.coalesced = 0
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def get(self, key: Hashable) -> Any:
+        value = self.cache.get(key)
+        if value is not None:
+            return value
+
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self.loads += 1
+        try:
+            value = await self.loader(key)
+        except BaseException as e:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                # Mark it retrieved, waiters still get the error.
+                future.exception()
+            raise
+
+        # An invalidation during the load means the value may be stale,
+        # hand it to the waiters but do not keep it.
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+            self.cache.set(key, value, ttl=self.ttl(value))
+        future.set_result(value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        self.cache.invalidate(key)
+        self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "loads": self.loads,
+            "coalesced": self.coalesced,
+        }
+
+
+def document_cache() -> Optional[LRUCache]:
+    """Document cache configured from the settings, or None if disabled."""
+    cache_config = app_settings.cache
+    if not cache_config.enabled:
+        return None
+    return LRUCache(
+        max_size=cache_config.max_size, ttl=cache_config.ttl_seconds
+    )
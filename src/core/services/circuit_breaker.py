@@ -0,0 +1,88 @@
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class CircuitOpenError(Exception):
+    """Calls are refused while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a dependency that keeps failing.
+
+    After `failure_threshold` failures in a row the circuit opens and
+    calls fail fast with CircuitOpenError, instead of each waiting on
+    timeouts. After `reset_seconds` one trial call is let through
+    (half-open): its success closes the circuit, its failure opens it
+    for another `reset_seconds`.
+
+    Callers check `before_call()` and then report the outcome with
+    `record_success()` or `record_failure()`, or `release()` when the
+    call ended without telling anything about the dependency.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() < self._opened_at + self.reset_seconds:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        """Seconds until the circuit lets a trial call through."""
+        if self._opened_at is None:
+            return 0.0
+        return max(self._opened_at + self.reset_seconds - self._clock(), 0.0)
+
+    def before_call(self):
+        """Raises CircuitOpenError when the call must not be made."""
+        state = self.state
+        if state == "closed":
+            return
+        if state == "open" or self._trial:
+            self.rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        self._trial = True
+
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self._trial or self._failures >= self.failure_threshold:
+            if self._opened_at is None or self._trial:
+                self.opened += 1
+            self._opened_at = self._clock()
+        self._trial = False
+
+    def release(self):
+        self._trial = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self._failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 3),
+        }
@@ -0,0 +1,19 @@
+import asyncio
+from typing import Any, Awaitable, List, Sequence
+
+
+async def gather_limited(
+    calls: Sequence[Awaitable], limit: int
+) -> List[Any]:
+    """
+    Results of the calls in their order, or the errors they raised,
+    with at most `limit` of them running at once.
+    """
+    slots = asyncio.Semaphore(limit)
+
+    async def limited(call: Awaitable):
+        async with slots:
+            return await call
+
+    return await asyncio.gather(
+        *[limited(call) for call in calls], return_exceptions=True)
@@ -0,0 +1,40 @@
+"""
+Conditional GETs for JSON endpoints that clients poll. The ETag is a
+hash of the body, so a client that sends it back in If-None-Match gets
+an empty 304 while nothing changed.
+"""
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+
+def etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    """Whether an If-None-Match header holds the ETag (weakly compared)."""
+    if not if_none_match:
+        return False
+    candidates = {
+        candidate.strip().removeprefix("W/")
+        for candidate in if_none_match.split(",")
+    }
+    return "*" in candidates or etag in candidates
+
+
+def etag_response(content: Any, if_none_match: Optional[str]) -> Response:
+    """
+    JSON response with an ETag, or an empty 304 when the client already
+    holds this body.
+    """
+    response = JSONResponse(jsonable_encoder(content))
+    etag = body_etag(response.body)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,72 @@
+"""
+Query plans of the queries services send, to catch the ones no index
+serves.
+
+Services list the shapes of their queries with `query_shapes()`, with
+sample values in place of the real ones. `explain_shapes` asks Mongo
+for the winning plan of each and reports those that scan the whole
+collection (COLLSCAN).
+"""
+from typing import (
+    Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Type
+)
+
+from beanie import Document
+
+
+class QueryShape(NamedTuple):
+    name: str
+    model: Type[Document]
+    filter: Dict[str, Any]
+    sort: Optional[List[Tuple[str, int]]] = None
+
+
+class PlanReport(NamedTuple):
+    shape: QueryShape
+    stages: Tuple[str, ...]
+
+    @property
+    def collscan(self) -> bool:
+        return "COLLSCAN" in self.stages
+
+    def __str__(self) -> str:
+        flag = "COLLSCAN" if self.collscan else "ok"
+        collection = self.shape.model.get_collection_name()
+        return (
+            f"[{flag}] {collection} {self.shape.name}: "
+            f"{' <- '.join(self.stages)}"
+        )
+
+
+def plan_stages(explain: Dict[str, Any]) -> Tuple[str, ...]:
+    """
+    Stages of the winning plan of an explain() result, from the root
+    down. Handles the classic and slot-based engine formats and the
+    per-shard plans of a sharded cluster.
+    """
+    winning = explain.get("queryPlanner", {}).get("winningPlan", {})
+    return tuple(_stages(winning))
+
+
+def _stages(plan: Dict[str, Any]) -> Iterator[str]:
+    # The slot-based engine nests the plan under `queryPlan`.
+    plan = plan.get("queryPlan", plan)
+    if "stage" in plan:
+        yield plan["stage"]
+    for shard in plan.get("shards", ()):
+        yield from _stages(shard.get("winningPlan", {}))
+    if "inputStage" in plan:
+        yield from _stages(plan["inputStage"])
+    for stage in plan.get("inputStages", ()):
+        yield from _stages(stage)
+
+
+async def explain_shape(shape: QueryShape) -> PlanReport:
+    cursor = shape.model.get_pymongo_collection().find(
+        shape.filter, sort=shape.sort)
+    return PlanReport(shape, plan_stages(await cursor.explain()))
+
+
+async def explain_shapes(shapes: Iterable[QueryShape]) -> List[PlanReport]:
+    """Winning plans of the shapes, one explain() after the other."""
+    return [await explain_shape(shape) for shape in shapes]
@@ -0,0 +1,284 @@
+"""
+Idempotency keys for endpoints that clients retry.
+
+The first request with a key runs and its response is stored, later
+requests with the same key get that response back instead of running
+again. Responses are kept in a Mongo collection whose documents expire
+through a TTL index, with an in-process cache in front of it.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from pymongo.errors import DuplicateKeyError
+
+from .cache import LRUCache
+from .explain import QueryShape
+from ..config.config import app_settings
+
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+Handler = Callable[[], Awaitable[Response]]
+
+
+class IdempotencyKeyReused(ValueError):
+    """The key was already used for a different request."""
+
+
+class IdempotencyKeyInProgress(ValueError):
+    """The first request with the key is still running somewhere else."""
+
+
+@dataclass
+class StoredResponse:
+    fingerprint: str
+    status_code: int
+    body: str
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def from_response(
+        cls, fingerprint: str, response: Response
+    ) -> "StoredResponse":
+        headers = {
+            name: value for name, value in response.headers.items()
+            if name != "content-length"
+        }
+        return cls(
+            fingerprint=fingerprint,
+            status_code=response.status_code,
+            body=response.body.decode(),
+            headers=headers,
+        )
+
+    def to_response(self, replayed: bool = True) -> Response:
+        headers = dict(self.headers)
+        if replayed:
+            headers[REPLAYED_HEADER] = "true"
+        return Response(
+            content=self.body, status_code=self.status_code, headers=headers)
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """Hash of the parts of a request that must match for a replay."""
+    payload = json.dumps(
+        parts, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Runs a handler at most once per idempotency key.
+
+    Concurrent requests with the same key in this process wait for the
+    first one (single-flight). Across processes, a record inserted under
+    a unique index marks the key as taken; the others poll it until the
+    response is stored, for at most `wait_seconds`. A record left behind
+    by a process that died is taken over after `lock_seconds`. When the
+    handler fails the record is removed, so the request can be retried.
+    """
+
+    def __init__(
+        self,
+        model,
+        ttl_seconds: float = 86400.0,
+        lock_seconds: float = 60.0,
+        wait_seconds: float = 10.0,
+        poll_seconds: float = 0.1,
+        cache: Optional[LRUCache] = None,
+    ):
+        self.model = model
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.lock = timedelta(seconds=lock_seconds)
+        self.wait_seconds = wait_seconds
+        self.poll_seconds = poll_seconds
+        self.cache = cache
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def run(
+        self, key: str, fingerprint: str, handler: Handler
+    ) -> Response:
+        """
+        Response of the request with this key, running `handler` only
+        if no request with the key ran before.
+        Raises IdempotencyKeyReused when the key came with another
+        request and IdempotencyKeyInProgress when waiting for another
+        process timed out.
+        """
+        stored = self.cache.get(key) if self.cache is not None else None
+        if stored is not None:
+            return self._replay(stored, fingerprint)
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            first_fingerprint, future = in_flight
+            if first_fingerprint != fingerprint:
+                raise IdempotencyKeyReused(
+                    "Idempotency key was used for another request")
+            try:
+                stored = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The first request went away, run it again.
+                return await self.run(key, fingerprint, handler)
+            return stored.to_response()
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            stored, replayed = await self._execute(key, fingerprint, handler)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved, waiters still get the error.
+            future.exception()
+            raise
+        else:
+            future.set_result(stored)
+        finally:
+            self._in_flight.pop(key, None)
+
+        if self.cache is not None:
+            self.cache.set(key, stored)
+        return stored.to_response(replayed=replayed)
+
+    def query_shapes(self) -> List[QueryShape]:
+        return [QueryShape("key", self.model, {"key": "scope:key"})]
+
+    def _replay(self, stored: StoredResponse, fingerprint: str) -> Response:
+        if stored.fingerprint != fingerprint:
+            raise IdempotencyKeyReused(
+                "Idempotency key was used for another request")
+        return stored.to_response()
+
+    async def _execute(
+        self, key: str, fingerprint: str, handler: Handler
+    ) -> Tuple[StoredResponse, bool]:
+        stored = await self._acquire(key, fingerprint)
+        if stored is not None:
+            return stored, True
+
+        collection = self.model.get_pymongo_collection()
+        try:
+            response = await handler()
+        except BaseException:
+            await collection.delete_one(
+                {"key": key, "status": "in_progress"})
+            raise
+
+        stored = StoredResponse.from_response(fingerprint, response)
+        now = datetime.now(timezone.utc)
+        await collection.update_one(
+            {"key": key},
+            {"$set": {
+                "status": "completed",
+                "status_code": stored.status_code,
+                "body": stored.body,
+                "headers": stored.headers,
+                "locked_until": None,
+                "expires_at": now + self.ttl,
+                "updated_at": now,
+            }},
+        )
+        return stored, False
+
+    async def _acquire(
+        self, key: str, fingerprint: str
+    ) -> Optional[StoredResponse]:
+        """
+        Take the key, or return the response stored for it. Returns None
+        once this process owns the key and has to run the request.
+        """
+        collection = self.model.get_pymongo_collection()
+        deadline = time.monotonic() + self.wait_seconds
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await collection.insert_one({
+                    "key": key,
+                    "fingerprint": fingerprint,
+                    "status": "in_progress",
+                    "locked_until": now + self.lock,
+                    "expires_at": now + self.ttl,
+                    "created_at": now,
+                    "updated_at": now,
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+
+            record = await collection.find_one({"key": key})
+            if record is None:
+                # Expired or released in the meantime, try again.
+                continue
+            if record["fingerprint"] != fingerprint:
+                raise IdempotencyKeyReused(
+                    "Idempotency key was used for another request")
+            if record["status"] == "completed":
+                return StoredResponse(
+                    fingerprint=fingerprint,
+                    status_code=record["status_code"],
+                    body=record["body"],
+                    headers=record.get("headers") or {},
+                )
+
+            taken = await collection.find_one_and_update(
+                {
+                    "key": key,
+                    "status": "in_progress",
+                    "locked_until": {"$lt": now},
+                },
+                {"$set": {"locked_until": now + self.lock, "updated_at": now}},
+            )
+            if taken is not None:
+                return None
+
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInProgress(
+                    "A request with this idempotency key is still running")
+            await asyncio.sleep(self.poll_seconds)
+
+
+def idempotency_store(model) -> IdempotencyStore:
+    """Idempotency store over `model` configured from the settings."""
+    config = app_settings.idempotency
+    return IdempotencyStore(
+        model,
+        ttl_seconds=config.ttl_seconds,
+        lock_seconds=config.lock_seconds,
+        wait_seconds=config.wait_seconds,
+        cache=LRUCache(
+            max_size=config.cache_max_size, ttl=config.cache_ttl_seconds),
+    )
+
+
+async def idempotent(
+    store: IdempotencyStore,
+    scope: str,
+    key: Optional[str],
+    fingerprint: str,
+    handler: Handler,
+) -> Response:
+    """
+    Run an endpoint through the store when the client sent an
+    Idempotency-Key, or directly when it did not.
+    """
+    if not key:
+        return await handler()
+
+    try:
+        return await store.run(f"{scope}:{key}", fingerprint, handler)
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyKeyInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
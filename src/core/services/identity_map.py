@@ -0,0 +1,102 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import (
+    Any, Awaitable, Callable, Dict, Hashable, Iterator, Optional, Set, Tuple
+)
+
+
+Loader = Callable[[Set[Any]], Awaitable[Dict[Any, Any]]]
+
+
+class IdentityMap:
+    """
+    Documents loaded during one unit of work, keyed by collection and id,
+    so each document is fetched at most once. Entries are futures, which
+    lets a load wait for a fetch of the same id that is still in flight.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def load(
+        self, collection: str, ids: Set[Any], loader: Loader
+    ) -> Dict[Any, Any]:
+        """
+        Return the documents with the given ids, calling `loader` only
+        for the ids nobody has asked for yet. Missing documents are
+        remembered too and left out of the result.
+        """
+        waiting: Dict[Any, asyncio.Future] = {}
+        owned: Dict[Any, asyncio.Future] = {}
+        loop = asyncio.get_running_loop()
+        for id in ids:
+            future = self._entries.get((collection, id))
+            if future is None:
+                future = owned[id] = loop.create_future()
+                self._entries[(collection, id)] = future
+            else:
+                waiting[id] = future
+
+        documents: Dict[Any, Any] = {}
+        if owned:
+            try:
+                fetched = await loader(set(owned))
+            except BaseException as e:
+                for id, future in owned.items():
+                    self._entries.pop((collection, id), None)
+                    future.set_exception(e)
+                    # Mark it retrieved, waiters still get the error.
+                    future.exception()
+                raise
+
+            for id, future in owned.items():
+                future.set_result(fetched.get(id))
+            documents.update(fetched)
+
+        for id, future in waiting.items():
+            document = await future
+            if document is not None:
+                documents[id] = document
+        return documents
+
+    def discard(self, collection: str, id: Hashable):
+        self._entries.pop((collection, id), None)
+
+
+_identity_map: ContextVar[Optional[IdentityMap]] = ContextVar(
+    "identity_map", default=None
+)
+
+
+def current_identity_map() -> Optional[IdentityMap]:
+    return _identity_map.get()
+
+
+@contextmanager
+def use_identity_map() -> Iterator[IdentityMap]:
+    """Bind a fresh identity map to the current context."""
+    identity_map = IdentityMap()
+    token = _identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _identity_map.reset(token)
+
+
+class IdentityMapMiddleware:
+    """Gives every HTTP request its own identity map."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with use_identity_map():
+            await self.app(scope, receive, send)
@@ -0,0 +1,68 @@
+from functools import lru_cache
+from typing import (
+    Any, FrozenSet, NamedTuple, Tuple, Type, get_args, get_origin
+)
+
+from beanie import Link
+from pydantic import BaseModel
+
+
+class LinkField(NamedTuple):
+    name: str
+    many: bool
+
+
+LinkPlan = Tuple[LinkField, ...]
+
+_SEQUENCES = (list, tuple, set, frozenset)
+
+
+@lru_cache(maxsize=None)
+def link_plan(model: Type[BaseModel]) -> LinkPlan:
+    """
+    Fields of a model that can hold links: a Link, an embedded model with
+    links somewhere below it, or a list of either. Built once per model
+    from the annotations, so the resolver never looks at other fields.
+    """
+    seen = frozenset({model})
+    return tuple(
+        LinkField(name, _is_sequence(field.annotation))
+        for name, field in model.model_fields.items()
+        if _may_hold_links(field.annotation, seen)
+    )
+
+
+def _may_hold_links(annotation: Any, seen: FrozenSet[type]) -> bool:
+    if annotation is Any:
+        return True
+
+    origin = get_origin(annotation)
+    if origin is not None:
+        if isinstance(origin, type) and issubclass(origin, Link):
+            return True
+        return any(_may_hold_links(arg, seen) for arg in get_args(annotation))
+
+    if not isinstance(annotation, type):
+        return False
+    if issubclass(annotation, Link):
+        return True
+    if issubclass(annotation, BaseModel):
+        # A model that refers back to itself is walked at runtime anyway.
+        if annotation in seen:
+            return True
+        return any(
+            _may_hold_links(field.annotation, seen | {annotation})
+            for field in annotation.model_fields.values()
+        )
+    return False
+
+
+def _is_sequence(annotation: Any) -> bool:
+    origin = get_origin(annotation)
+    if origin in _SEQUENCES:
+        return True
+    if origin is not None and not (
+        isinstance(origin, type) and issubclass(origin, Link)
+    ):
+        return any(_is_sequence(arg) for arg in get_args(annotation))
+    return False
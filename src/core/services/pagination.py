@@ -0,0 +1,88 @@
+import base64
+import binascii
+from dataclasses import dataclass, field
+from typing import Any, Dict, Generic, List, Optional, TypeVar
+
+from bson import ObjectId, json_util
+from fastapi import HTTPException, Query, Response
+
+
+T = TypeVar("T")
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass
+class Page(Generic[T]):
+    items: List[T] = field(default_factory=list)
+    next_cursor: Optional[str] = None
+
+
+def encode_cursor(sort_key: str, value: Any, id: Any) -> str:
+    """Pack the position after the last item of a page into a token."""
+    payload = json_util.dumps({"k": sort_key, "v": value, "id": id})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str, sort_key: str) -> Dict[str, Any]:
+    """
+    Unpack a token created by `encode_cursor`.
+    Raises ValueError when the token is malformed or was issued
+    for another sort key. Its values go into a query filter, so a
+    document or an array (an operator) in their place is malformed too.
+    """
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if (
+        not isinstance(payload, dict)
+        or payload.get("k") != sort_key
+        or "v" not in payload
+        or isinstance(payload["v"], (dict, list))
+        or not isinstance(payload.get("id"), ObjectId)
+    ):
+        raise ValueError("Invalid cursor")
+
+    return payload
+
+
+class PageQuery:
+    """Query parameters shared by every paginated list endpoint."""
+
+    def __init__(
+        self,
+        after: Optional[str] = Query(
+            None, description="Cursor returned in the X-Next-Cursor header"
+        ),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.after = after
+        self.limit = limit
+
+
+async def paginate(
+    service, page_query: PageQuery, response: Response, **kwargs
+):
+    """
+    Load one page from the service and expose the next cursor
+    through the X-Next-Cursor header. Only a malformed cursor is a
+    client error; anything failing past it propagates.
+    """
+    if page_query.after:
+        try:
+            decode_cursor(page_query.after, kwargs.get("sort_key", "_id"))
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    page = await service.find_page(
+        after=page_query.after, limit=page_query.limit, **kwargs
+    )
+
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
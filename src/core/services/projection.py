@@ -0,0 +1,121 @@
+from functools import lru_cache
+from typing import Any, List, Optional, Sequence, Tuple, Type, Union
+
+from fastapi import HTTPException, Query, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, ConfigDict, Field, create_model
+
+from .pagination import NEXT_CURSOR_HEADER
+
+
+Fields = Tuple[str, ...]
+
+
+def projection_model(
+    model: Type[BaseModel], fields: Sequence[str]
+) -> Type[BaseModel]:
+    """
+    Model holding only the requested fields, built once per model and
+    field set whatever the order the fields come in. Beanie turns its
+    fields into the Mongo projection. Raises ValueError for fields the
+    model does not have.
+    """
+    return _projection_model(model, tuple(sorted(set(fields))))
+
+
+# Field sets come from the query string, so only the recent ones are kept.
+@lru_cache(maxsize=512)
+def _projection_model(
+    model: Type[BaseModel], fields: Fields
+) -> Type[BaseModel]:
+    unknown = [name for name in fields if name not in model.model_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    definitions = {}
+    for name in ("id", *fields):
+        field = model.model_fields[name]
+        definitions[name] = (
+            Optional[field.annotation], Field(None, alias=field.alias)
+        )
+
+    return create_model(
+        f"{model.__name__}Projection",
+        __config__=ConfigDict(
+            arbitrary_types_allowed=True,
+            from_attributes=True,
+            populate_by_name=True,
+        ),
+        **definitions,
+    )
+
+
+@lru_cache(maxsize=None)
+def partial_schema(schema: Type[BaseModel]) -> Type[BaseModel]:
+    """Copy of a response schema where every field may be missing."""
+    definitions = {
+        name: (Optional[field.annotation], Field(None, alias=field.alias))
+        for name, field in schema.model_fields.items()
+    }
+    return create_model(
+        f"Partial{schema.__name__}", __base__=schema, **definitions
+    )
+
+
+class SparseFields:
+    """
+    Dependency reading the `fields` query parameter, limited to the
+    fields of the given response schema.
+    """
+
+    def __init__(self, schema: Type[BaseModel]):
+        self.allowed = set(schema.model_fields)
+
+    def __call__(
+        self,
+        fields: Optional[str] = Query(
+            None, description="Comma separated list of fields to return"
+        ),
+    ) -> Optional[Fields]:
+        if not fields:
+            return None
+
+        requested = tuple(dict.fromkeys(
+            name.strip() for name in fields.split(",") if name.strip()
+        ))
+        unknown = [name for name in requested if name not in self.allowed]
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown fields: {', '.join(unknown)}"
+            )
+        return requested or None
+
+
+def sparse_response(
+    content: Union[Any, List[Any]],
+    schema: Type[BaseModel],
+    fields: Sequence[str],
+    response: Optional[Response] = None,
+) -> JSONResponse:
+    """
+    Serialize projected documents with only the requested fields,
+    keeping the pagination header of the endpoint response.
+    """
+    partial = partial_schema(schema)
+    include = {"id", *fields}
+
+    def serialize(item):
+        return partial.model_validate(item, from_attributes=True).model_dump(
+            mode="json", by_alias=True, include=include
+        )
+
+    if isinstance(content, list):
+        body = [serialize(item) for item in content]
+    else:
+        body = serialize(content)
+
+    headers = {}
+    if response is not None and NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return JSONResponse(content=body, headers=headers)
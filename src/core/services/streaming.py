@@ -0,0 +1,35 @@
+from typing import AsyncGenerator, Type
+
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def ndjson_response(
+    documents: AsyncGenerator[BaseModel, None],
+    schema: Type[BaseModel],
+    filename: str = None,
+) -> StreamingResponse:
+    """
+    Stream documents as newline-delimited JSON, serializing each one
+    through the response schema as soon as it is read from the cursor.
+    The documents are closed with the response, also when the client
+    disconnects, so their database cursor does not outlive it.
+    """
+    async def lines():
+        try:
+            async for document in documents:
+                item = schema.model_validate(document, from_attributes=True)
+                yield item.model_dump_json(by_alias=True) + "\n"
+        finally:
+            await documents.aclose()
+
+    headers = {}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    return StreamingResponse(
+        lines(), media_type=NDJSON_MEDIA_TYPE, headers=headers
+    )
@@ -0,0 +1,95 @@
+"""
+Read path for data this service wrote itself. Raw Mongo rows are
+serialized through a relaxed copy of the response schema instead of
+being hydrated into documents and validated again by `response_model`.
+Only use it where the stored data is known to match the models.
+"""
+from functools import lru_cache
+from typing import Any, List, Optional, Type, Union, get_args, get_origin
+
+from fastapi import Response
+from pydantic import (
+    AliasChoices, BaseModel, EmailStr, Field, TypeAdapter, create_model
+)
+from pydantic.fields import FieldInfo
+
+from .pagination import NEXT_CURSOR_HEADER
+
+
+# Types whose validation re-checks stored values, by their plain form.
+_RELAXED_TYPES = {EmailStr: str}
+
+
+@lru_cache(maxsize=None)
+def trusted_schema(schema: Type[BaseModel]) -> Type[BaseModel]:
+    """
+    Copy of a response schema for stored data. Types that re-check their
+    contents are relaxed to their plain form and `id` is also read from
+    `_id`, so raw rows validate in one cheap pass. It serializes exactly
+    like the original schema.
+    """
+    definitions = {
+        name: (_relax(field.annotation), _relaxed_field(name, field))
+        for name, field in schema.model_fields.items()
+    }
+    return create_model(
+        f"Trusted{schema.__name__}", __base__=schema, **definitions
+    )
+
+
+def trusted_response(
+    content: Union[Any, List[Any]],
+    schema: Type[BaseModel],
+    response: Optional[Response] = None,
+) -> Response:
+    """
+    Serialize raw rows (or documents) through the trusted copy of the
+    response schema, keeping the pagination header of the endpoint.
+    """
+    if isinstance(content, list):
+        adapter = _list_adapter(schema)
+        body = adapter.dump_json(
+            adapter.validate_python(content, from_attributes=True),
+            by_alias=True,
+        )
+    else:
+        body = trusted_schema(schema).model_validate(
+            content, from_attributes=True
+        ).model_dump_json(by_alias=True)
+
+    headers = {}
+    if response is not None and NEXT_CURSOR_HEADER in response.headers:
+        headers[NEXT_CURSOR_HEADER] = response.headers[NEXT_CURSOR_HEADER]
+    return Response(
+        content=body, media_type="application/json", headers=headers)
+
+
+@lru_cache(maxsize=None)
+def _list_adapter(schema: Type[BaseModel]) -> TypeAdapter:
+    return TypeAdapter(List[trusted_schema(schema)])
+
+
+def _relax(annotation: Any) -> Any:
+    if annotation in _RELAXED_TYPES:
+        return _RELAXED_TYPES[annotation]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return trusted_schema(annotation)
+
+    origin = get_origin(annotation)
+    args = get_args(annotation)
+    if origin is Union:
+        return Union[tuple(_relax(arg) for arg in args)]
+    if origin is list and args:
+        return List[_relax(args[0])]
+    return annotation
+
+
+def _relaxed_field(name: str, field: FieldInfo) -> FieldInfo:
+    kwargs = {"alias": field.alias}
+    if field.default_factory is not None:
+        kwargs["default_factory"] = field.default_factory
+    else:
+        kwargs["default"] = field.default
+    if name == "id":
+        kwargs["validation_alias"] = AliasChoices("id", "_id")
+    return Field(**kwargs)
@@ -1,20 +1,44 @@
 
+import math
+
 from dotenv import load_dotenv
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
 from src.core.libs.mailing.template_factory import TemplateFactory
+from src.core.libs.paypal import paypal_service
 
 from .modules import load_routers
+from .modules.explain_queries import explain_queries
+from .modules.orders.payment_worker import payment_worker
+from .modules.payments.webhook_worker import webhook_worker
+from .core.config.config import app_settings
 from .core.db import get_db
+from .core.services.base import cache_stats
+from .core.services.circuit_breaker import CircuitOpenError
+from .core.services.identity_map import IdentityMapMiddleware
 
 
 app = FastAPI()
+app.add_middleware(IdentityMapMiddleware)
 
 
 @app.on_event("startup")
 async def startup_db():
     await get_db()
+    if app_settings.database.mongodb.explain_queries:
+        await explain_queries()
     TemplateFactory.on_load_templates()
+    await paypal_service.open_client()
+    payment_worker.start()
+    webhook_worker.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_workers():
+    await payment_worker.stop()
+    await webhook_worker.stop()
+    await paypal_service.close_client()
 
 
 routers = load_routers()
@@ -26,4 +50,25 @@ for router in routers:
 async def health_check():
     return {"status": "healthy"}
 
+
+@app.exception_handler(CircuitOpenError)
+async def provider_unavailable(request: Request, error: CircuitOpenError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Payment provider unavailable: {error}"},
+        headers={
+            "Retry-After": str(math.ceil(paypal_service.breaker.retry_after()))
+        },
+    )
+
+
+@app.get("/health/paypal")
+async def paypal_health():
+    return paypal_service.breaker.stats()
+
+
+@app.get("/health/cache")
+async def cache_health():
+    return cache_stats()
+
 load_dotenv()
@@ -51,7 +51,9 @@ async def get_current_user(token: str = Depends(get_token)) -> dict:
 async def get_current_active_user(
     current_user: Annotated[User, Depends(get_current_user)],
 ) -> UserResponse:
-    exist_user = await user_service.find_one(current_user["id"])
+    # Not from the document cache: a user deactivated by another process
+    # must be turned away at once.
+    exist_user = await user_service.find_one(current_user["id"], fresh=True)
     user = UserResponse.model_validate(exist_user)
     if not user.is_active:
         raise HTTPException(
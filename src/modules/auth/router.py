@@ -244,7 +244,7 @@ async def change_password(
     request: UserChangePasswordRequest,
     current_user: Annotated[User, Depends(get_current_active_user)],
 ):
-    current_user = await user_service.find_one(current_user.id)
+    current_user = await user_service.find_one(current_user.id, fresh=True)
     if not current_user:
         raise HTTPException(status_code=404, detail="User is not found")
 
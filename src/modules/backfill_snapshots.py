@@ -0,0 +1,22 @@
+"""
+Take the link snapshots of the documents written before they existed:
+
+    python -m src.modules.backfill_snapshots
+"""
+import asyncio
+
+from .orders.service import order_service
+from .products.service import product_service
+from ..core.db import get_db
+
+
+async def main():
+    await get_db()
+    for service in (product_service, order_service):
+        count = await service.backfill_snapshots()
+        collection = service.model.get_collection_name()
+        print(f"{collection}: {count} documents")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
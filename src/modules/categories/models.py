@@ -1,7 +1,10 @@
 
 from typing import Optional
 
+from pymongo import ASCENDING, IndexModel
+
 from ...core.models.base import TimestampDocument
+from ...core.models.snapshot import Snapshot
 
 
 class Category(TimestampDocument):
@@ -11,3 +14,11 @@ class Category(TimestampDocument):
 
     class Settings:
         name = "categories"
+        indexes = [
+            IndexModel([("slug", ASCENDING)]),
+        ]
+
+
+class CategorySnapshot(Snapshot):
+    name: str
+    slug: str
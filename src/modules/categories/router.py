@@ -1,8 +1,15 @@
-from typing import List
-from fastapi import APIRouter, HTTPException, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from beanie import PydanticObjectId
-from .schemas import CategoryCreate, CategoryUpdate, CategoryResponse
+from .schemas import (
+    CategoryBulkUpdate, CategoryCreate, CategoryUpdate, CategoryResponse
+)
 from .service import category_service
+from ...core.services.bulk import (
+    BulkCreateRequest, BulkDeleteRequest, BulkResult, BulkUpdateRequest
+)
+from ...core.services.pagination import PageQuery, paginate
+from ...core.services.projection import Fields, SparseFields, sparse_response
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
@@ -13,15 +20,55 @@ async def create_category(data: CategoryCreate):
 
 
 @router.get("/", response_model=List[CategoryResponse])
-async def get_categories():
-    return await category_service.find_all()
+async def get_categories(
+    response: Response,
+    page_query: PageQuery = Depends(),
+    fields: Optional[Fields] = Depends(SparseFields(CategoryResponse)),
+):
+    categories = await paginate(
+        category_service, page_query, response, fields=fields)
+    if fields:
+        return sparse_response(
+            categories, CategoryResponse, fields, response)
+    return categories
+
+
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_create_categories(request: BulkCreateRequest[CategoryCreate]):
+    return await category_service.bulk_create(
+        request.items, ordered=request.ordered)
+
+
+@router.put("/bulk", response_model=BulkResult)
+async def bulk_update_categories(
+    request: BulkUpdateRequest[CategoryBulkUpdate]
+):
+    rows = [
+        (item.id, item.model_dump(exclude={"id"}, exclude_unset=True))
+        for item in request.items
+    ]
+    return await category_service.bulk_update(rows, ordered=request.ordered)
+
+
+@router.delete("/bulk", response_model=BulkResult)
+async def bulk_delete_categories(request: BulkDeleteRequest):
+    return await category_service.bulk_delete(
+        request.ids, ordered=request.ordered)
 
 
 @router.get("/{category_id}", response_model=CategoryResponse)
-async def get_category(category_id: PydanticObjectId):
-    category = await category_service.find_one(category_id)
+async def get_category(
+    category_id: PydanticObjectId,
+    fields: Optional[Fields] = Depends(SparseFields(CategoryResponse)),
+):
+    try:
+        category = await category_service.find_one(category_id, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
+    if fields:
+        return sparse_response(category, CategoryResponse, fields)
     return category
 
 
@@ -23,6 +23,10 @@ class CategoryUpdate(BaseModel):
     parent_id: Optional[str] = None
 
 
+class CategoryBulkUpdate(CategoryUpdate):
+    id: PydanticObjectId
+
+
 class CategoryResponse(CategoryBase):
     id: PydanticObjectId
     created_at: datetime
@@ -1,10 +1,43 @@
+from typing import Any, Optional, Sequence, Tuple
+
+from beanie import PydanticObjectId
+
 from ...core.services.base import BaseService
+from ...core.services.bulk import BulkResult
+from ...core.services.cache import document_cache
+from ..products.service import product_service
 from .models import Category
 
 
 class CategoryService(BaseService[Category]):
+    """
+    Category writes also refresh the category snapshot of the products
+    in them.
+    """
+
     def __init__(self):
-        super().__init__(Category)
+        super().__init__(Category, cache=document_cache())
+
+    async def update(
+        self,
+        id: PydanticObjectId,
+        data,
+        fetch_links: bool = True,
+    ) -> Optional[Category]:
+        category = await super().update(id, data, fetch_links)
+        if category is not None:
+            await product_service.refresh_category_snapshots([category])
+        return category
+
+    async def bulk_update(
+        self,
+        rows: Sequence[Tuple[PydanticObjectId, Any]],
+        ordered: bool = False,
+    ) -> BulkResult:
+        result = await super().bulk_update(rows, ordered)
+        await product_service.refresh_category_snapshots(
+            await self.find_many(result.ids, fetch_links=False))
+        return result
 
 
 category_service = CategoryService()
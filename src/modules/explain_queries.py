@@ -0,0 +1,68 @@
+"""
+Explain the queries every service sends and flag the ones that scan a
+whole collection:
+
+    python -m src.modules.explain_queries
+
+Exits with status 1 when a query has no index to use. With
+MONGO_EXPLAIN_QUERIES set, the app runs the same check at startup and
+logs a warning per collection scan.
+"""
+import asyncio
+import logging
+import sys
+from typing import List
+
+from .categories.service import category_service
+from .orders.payment_worker import payment_worker
+from .orders.reconcile import order_reconciler
+from .orders.service import order_idempotency, order_service
+from .payments.service import payment_service
+from .payments.webhook_worker import webhook_worker
+from .products.service import product_service
+from .reports.service import sales_service
+from .users.service import user_service
+from ..core.db import get_db
+from ..core.services.explain import PlanReport, QueryShape, explain_shapes
+
+
+logger = logging.getLogger(__name__)
+
+SERVICES = (
+    user_service,
+    category_service,
+    product_service,
+    order_service,
+    order_idempotency,
+    payment_worker,
+    order_reconciler,
+    payment_service,
+    webhook_worker,
+    sales_service,
+)
+
+
+def query_shapes() -> List[QueryShape]:
+    return [shape for service in SERVICES for shape in service.query_shapes()]
+
+
+async def explain_queries() -> List[PlanReport]:
+    """Plans of every query shape, with a warning per collection scan."""
+    reports = await explain_shapes(query_shapes())
+    for report in reports:
+        if report.collscan:
+            logger.warning("Query without an index: %s", report)
+    return reports
+
+
+async def main():
+    await get_db()
+    reports = await explain_queries()
+    for report in reports:
+        print(report)
+    if any(report.collscan for report in reports):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,21 +1,39 @@
 
-from typing import List, Optional
-from beanie import Link
-from pydantic import BaseModel, ConfigDict
+from datetime import datetime, timezone
+from typing import Annotated, Dict, List, Optional
+from beanie import Link, PydanticObjectId
+from pydantic import BaseModel, ConfigDict, Field
+from pymongo import ASCENDING, DESCENDING, IndexModel
 
-from ..users.models import User
-from ..products.models import Product
+from ..users.models import User, UserSnapshot
+from ..products.models import Product, ProductSnapshot
 from ...core.models.base import TimestampDocument
+from ...core.models.snapshot import SnapshotOf
+
+
+# Statuses of orders whose payment was captured.
+PAID_STATUSES = ("paid", "shipped", "delivered")
 
 
 class OrderItem(BaseModel):
     product: Link[Product]
+    # The product as it was ordered, kept when the product changes.
+    product_snapshot: Annotated[
+        Optional[ProductSnapshot], SnapshotOf("product")] = None
     quantity: int = 1
     subtotal: float
 
+    @property
+    def product_id(self) -> PydanticObjectId:
+        if isinstance(self.product, Link):
+            return self.product.ref.id
+        return self.product.id
+
 
 class Order(TimestampDocument):
     user: Link[User] = None
+    user_snapshot: Annotated[
+        Optional[UserSnapshot], SnapshotOf("user")] = None
     items: List[OrderItem]
     total_price: float
     status: str = "pending"  # pending, paid, shipped, delivered, cancelled
@@ -26,12 +44,118 @@ class Order(TimestampDocument):
     return_url: Optional[str] = None
     cancel_url: Optional[str] = None
     payer_id: Optional[str] = None
+    paid_at: Optional[datetime] = None
+    # What marked the order paid, if not a capture: the PayPal webhook
+    # event, or `reconcile-<ref_order_id>` for the reconciliation job.
+    paid_event_id: Optional[str] = None
+    cancelled_at: Optional[datetime] = None
+    # Set on the orders a mark_paid_many / cancel_many call changed
+    # together, to read them back.
+    paid_batch_id: Optional[PydanticObjectId] = None
+    cancel_batch_id: Optional[PydanticObjectId] = None
+    # Token of the stock reservation the order holds, see reserve_stock.
+    reservation_token: Optional[PydanticObjectId] = None
 
     class Settings:
         name = "orders"
+        indexes = [
+            # Only orders sent to PayPal have a reference, the others
+            # store null, which a sparse index would still hold.
+            IndexModel(
+                [("ref_order_id", ASCENDING)],
+                unique=True,
+                partialFilterExpression={"ref_order_id": {"$gt": ""}},
+            ),
+            # Order lists filter on a user or a status and page through
+            # (created_at, _id), newest first.
+            IndexModel([
+                ("user.$id", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+            ]),
+            IndexModel([
+                ("status", ASCENDING),
+                ("created_at", DESCENDING),
+                ("_id", DESCENDING),
+            ]),
+            IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)]),
+            IndexModel([("reservation_token", ASCENDING)]),
+        ]
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
         from_attributes=True,
         populate_by_name=True,
     )
+
+
+class PaymentJob(TimestampDocument):
+    """PayPal steps of an order submitted without waiting for them."""
+    order_id: PydanticObjectId
+    status: str = "queued"  # queued, running, done, failed
+    attempts: int = 0
+    run_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc))
+    locked_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+
+    class Settings:
+        name = "payment_jobs"
+        indexes = [
+            IndexModel([("status", ASCENDING), ("run_at", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        ]
+
+
+class ReconcileStats(BaseModel):
+    """Orders a reconciliation run went through, by outcome."""
+    scanned: int = 0
+    paid: int = 0
+    cancelled: int = 0
+    # Still waiting on the payer, or changed by someone else meanwhile.
+    unchanged: int = 0
+    # PayPal calls that failed, their orders are left for the next run.
+    failed: int = 0
+    # Never sent to PayPal and without a payment job, cancelled.
+    unsent: int = 0
+    # Stock reservations a crash left pending, settled or given back.
+    stale_reservations: int = 0
+
+
+class ReconcileCheckpoint(TimestampDocument):
+    """
+    Progress of a reconciliation run: the orders it covers and the
+    last one done, so an interrupted run resumes after it.
+    """
+    name: str
+    # Pending orders created up to this time are reconciled.
+    cutoff: datetime
+    # Orders created before this time are cancelled if still unpaid.
+    expire_before: datetime
+    after_created_at: Optional[datetime] = None
+    after_id: Optional[PydanticObjectId] = None
+    stats: ReconcileStats = Field(default_factory=ReconcileStats)
+    finished_at: Optional[datetime] = None
+
+    class Settings:
+        name = "reconcile_checkpoints"
+        indexes = [IndexModel([("name", ASCENDING)], unique=True)]
+
+
+class IdempotencyRecord(TimestampDocument):
+    """Response of an order request, stored under its Idempotency-Key."""
+    key: str
+    fingerprint: str
+    status: str = "in_progress"  # in_progress, completed
+    status_code: Optional[int] = None
+    body: Optional[str] = None
+    headers: Dict[str, str] = Field(default_factory=dict)
+    locked_until: Optional[datetime] = None
+    expires_at: datetime
+
+    class Settings:
+        name = "idempotency_keys"
+        indexes = [
+            IndexModel([("key", ASCENDING)], unique=True),
+            IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        ]
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Set
+
+from beanie import PydanticObjectId
+from beanie.odm.utils.parsing import parse_obj
+from pymongo import ReturnDocument
+
+from .models import PaymentJob
+from .service import order_service
+from ...core.config.config import app_settings
+from ...core.libs.paypal import paypal_service
+from ...core.services.circuit_breaker import CircuitOpenError
+from ...core.services.explain import QueryShape
+
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentWorker:
+    """
+    Runs the PayPal steps of orders submitted asynchronously.
+
+    Jobs are stored in Mongo and claimed with a lease, so they survive
+    restarts and a job whose worker died is picked up again once its
+    lease expires. At most `concurrency` jobs run at the same time.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 4,
+        max_attempts: int = 5,
+        lease_seconds: float = 60.0,
+        poll_seconds: float = 1.0,
+        retry_base_seconds: float = 2.0,
+    ):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self._runner: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        # Created in start(), inside the event loop that uses them.
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def enqueue(self, order_id: PydanticObjectId) -> PaymentJob:
+        job = await PaymentJob(order_id=order_id).insert()
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    def start(self):
+        if self._runner is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop claiming jobs and wait for the running ones."""
+        if self._runner is None:
+            return
+        self._runner.cancel()
+        await asyncio.gather(self._runner, return_exceptions=True)
+        self._runner = None
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def run_pending(self) -> int:
+        """Process every due job in this task, for scripts and tests."""
+        processed = 0
+        while True:
+            job = await self._claim()
+            if job is None:
+                return processed
+            await self._process(job)
+            processed += 1
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                job = await self._claim()
+            except Exception:
+                logger.exception("Could not claim a payment job")
+                job = None
+
+            if job is None:
+                self._slots.release()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(
+                        self._wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job: PaymentJob):
+        try:
+            await self._process(job)
+        except Exception:
+            logger.exception("Payment job %s crashed", job.id)
+        finally:
+            self._slots.release()
+
+    def query_shapes(self) -> List[QueryShape]:
+        now = datetime.now(timezone.utc)
+        return [QueryShape(
+            "claim",
+            PaymentJob,
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lt": now}},
+            ]},
+            [("run_at", 1)],
+        )]
+
+    async def _claim(self) -> Optional[PaymentJob]:
+        """Lease the next due job, or one whose lease has run out."""
+        now = datetime.now(timezone.utc)
+        raw = await PaymentJob.get_pymongo_collection().find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_at": {"$lte": now}},
+                {"status": "running", "locked_until": {"$lt": now}},
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "locked_until": now + self.lease,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("run_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+        return parse_obj(PaymentJob, raw) if raw else None
+
+    async def _process(self, job: PaymentJob):
+        order = await order_service.find_one(job.order_id)
+        if order is None or order.status != "pending" or order.ref_order_id:
+            await self._finish(job, "done")
+            return
+
+        try:
+            await order_service.submit_payment(order)
+        except CircuitOpenError as e:
+            # PayPal was not called, so the attempt does not count. The
+            # job waits until the circuit lets a call through again.
+            await self._retry(
+                job, error=str(e), delay=paypal_service.breaker.retry_after(),
+                count_attempt=False)
+            return
+        except Exception as e:
+            if job.attempts >= self.max_attempts:
+                logger.warning(
+                    "Payment job %s failed for good: %s", job.id, e)
+                await order_service.cancel(order)
+                await self._finish(job, "failed", error=str(e))
+            else:
+                await self._retry(job, error=str(e))
+            return
+
+        await self._finish(job, "done")
+
+    async def _retry(
+        self,
+        job: PaymentJob,
+        error: str,
+        delay: Optional[float] = None,
+        count_attempt: bool = True,
+    ):
+        if delay is None:
+            # Exponential backoff with full jitter.
+            delay = random.uniform(
+                0, self.retry_base_seconds * 2 ** (job.attempts - 1))
+        now = datetime.now(timezone.utc)
+        update = {"$set": {
+            "status": "queued",
+            "run_at": now + timedelta(seconds=delay),
+            "locked_until": None,
+            "last_error": error,
+            "updated_at": now,
+        }}
+        if not count_attempt:
+            # Claiming the job counted it.
+            update["$inc"] = {"attempts": -1}
+        await PaymentJob.get_pymongo_collection().update_one(
+            {"_id": job.id}, update)
+
+    async def _finish(
+        self, job: PaymentJob, status: str, error: Optional[str] = None
+    ):
+        await PaymentJob.get_pymongo_collection().update_one(
+            {"_id": job.id},
+            {"$set": {
+                "status": status,
+                "locked_until": None,
+                "last_error": error,
+                "updated_at": datetime.now(timezone.utc),
+            }},
+        )
+
+
+worker_config = app_settings.payment.worker
+
+payment_worker = PaymentWorker(
+    concurrency=worker_config.concurrency,
+    max_attempts=worker_config.max_attempts,
+    lease_seconds=worker_config.lease_seconds,
+    poll_seconds=worker_config.poll_seconds,
+    retry_base_seconds=worker_config.retry_base_seconds,
+)
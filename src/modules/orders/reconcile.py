@@ -0,0 +1,370 @@
+"""
+Check the orders left pending with a PayPal order against PayPal, and
+bring them up to date: orders PayPal captured (or the payer approved)
+are marked paid, expired ones are cancelled and their stock put back.
+Orders never sent to PayPal, as when the process died between saving
+an order and queueing its payment job, are cancelled too, and stock
+reservations a crash left pending are settled or given back.
+
+    python -m src.modules.orders.reconcile [--restart]
+
+Progress is kept in a checkpoint, an interrupted run resumes after the
+last batch it finished. --restart starts a new run instead.
+"""
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set
+
+import httpx
+from beanie import PydanticObjectId
+from bson import ObjectId
+
+from .models import Order, PaymentJob, ReconcileCheckpoint
+from .service import PaidOrder, order_service
+from ...core.config.config import app_settings
+from ...core.db import get_db
+from ...core.libs.paypal import paypal_service
+from ...core.services.circuit_breaker import CircuitOpenError
+from ...core.services.concurrency import gather_limited
+from ...core.services.explain import QueryShape
+from ...core.services.rate_limit import RateLimiter
+from ..products.service import product_service
+
+
+logger = logging.getLogger(__name__)
+
+
+class OrderReconciler:
+    """
+    Goes through the pending orders with a PayPal order created before
+    the run started, minus `stale_minutes`, oldest first, by batches of
+    `batch_size`.
+
+    The PayPal orders of a batch are fetched with at most `concurrency`
+    calls in flight and `rate_per_second` on average. Approved ones are
+    captured. The orders they paid and those to cancel are then
+    updated with a `bulk_write` each. Orders not approved after
+    `expire_minutes`, voided or unknown to PayPal are cancelled.
+
+    The checkpoint is saved after each batch. While the PayPal circuit
+    is open the run waits instead of skipping orders.
+
+    Last, pending orders created before the cutoff without a PayPal
+    order nor a payment job left to run are cancelled: their stock was
+    reserved, but nothing would ever submit or release them. So is
+    the stock of the reservations left pending before the cutoff by
+    requests that died before saving their order.
+    """
+
+    def __init__(
+        self,
+        name: str = "orders",
+        stale_minutes: float = 30.0,
+        expire_minutes: float = 180.0,
+        batch_size: int = 500,
+        concurrency: int = 8,
+        rate_per_second: float = 20.0,
+    ):
+        self.name = name
+        self.stale = timedelta(minutes=stale_minutes)
+        self.expire = timedelta(minutes=expire_minutes)
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+
+    async def run(self, restart: bool = False) -> ReconcileCheckpoint:
+        checkpoint = await self._checkpoint(restart)
+        limiter = RateLimiter(self.rate_per_second, burst=self.concurrency)
+        started = time.monotonic()
+        scanned = checkpoint.stats.scanned
+        while True:
+            batch = await self._next_batch(checkpoint)
+            if not batch:
+                break
+
+            await self._reconcile(batch, checkpoint, limiter)
+            checkpoint.after_created_at = batch[-1]["created_at"]
+            checkpoint.after_id = batch[-1]["_id"]
+            await checkpoint.save()
+
+            stats = checkpoint.stats
+            elapsed = max(time.monotonic() - started, 0.001)
+            logger.info(
+                "Reconciled %d orders (%.1f/s, %.1fs waiting on the rate "
+                "limit): %d paid, %d cancelled, %d unchanged, %d failed",
+                stats.scanned, (stats.scanned - scanned) / elapsed,
+                limiter.waited, stats.paid, stats.cancelled,
+                stats.unchanged, stats.failed,
+            )
+
+        await self._cancel_unsent(checkpoint)
+        checkpoint.stats.stale_reservations += (
+            await product_service.release_stale_reservations(
+                checkpoint.cutoff, self._reservations_held))
+        checkpoint.finished_at = datetime.now(timezone.utc)
+        await checkpoint.save()
+        return checkpoint
+
+    def query_shapes(self) -> List[QueryShape]:
+        now = datetime.now(timezone.utc)
+        return [
+            QueryShape(
+                "next_batch",
+                Order,
+                self._batch_filter(now, now, PydanticObjectId()),
+                [("created_at", 1), ("_id", 1)],
+            ),
+            QueryShape(
+                "next_unsent_batch",
+                Order,
+                self._batch_filter(now, now, PydanticObjectId(), sent=False),
+                [("created_at", 1), ("_id", 1)],
+            ),
+            QueryShape(
+                "reservations_held",
+                Order,
+                {"reservation_token": {"$in": [PydanticObjectId()]}},
+            ),
+            QueryShape(
+                "live_payment_jobs",
+                PaymentJob,
+                self._live_jobs_filter([PydanticObjectId()]),
+            ),
+        ]
+
+    async def _checkpoint(self, restart: bool) -> ReconcileCheckpoint:
+        """The checkpoint of the unfinished run, or of a new one."""
+        checkpoint = await ReconcileCheckpoint.find_one(
+            ReconcileCheckpoint.name == self.name)
+        if (
+            checkpoint is not None
+            and checkpoint.finished_at is None
+            and not restart
+        ):
+            logger.info(
+                "Resuming after %d orders", checkpoint.stats.scanned)
+            return checkpoint
+
+        now = datetime.now(timezone.utc)
+        fresh = ReconcileCheckpoint(
+            name=self.name,
+            cutoff=now - self.stale,
+            expire_before=now - self.expire,
+        )
+        if checkpoint is not None:
+            fresh.id = checkpoint.id
+        await fresh.save()
+        return fresh
+
+    @staticmethod
+    def _batch_filter(
+        cutoff: datetime,
+        after_created_at: Optional[datetime] = None,
+        after_id: Optional[PydanticObjectId] = None,
+        sent: bool = True,
+    ) -> Dict[str, Any]:
+        """Pending orders with a PayPal order, or without one."""
+        filter: Dict[str, Any] = {
+            "status": "pending",
+            "ref_order_id": {"$gt": ""} if sent else None,
+            "created_at": {"$lte": cutoff},
+        }
+        if after_id is not None:
+            filter["$or"] = [
+                {"created_at": {"$gt": after_created_at}},
+                {"created_at": after_created_at, "_id": {"$gt": after_id}},
+            ]
+        return filter
+
+    @staticmethod
+    def _live_jobs_filter(
+        order_ids: List[PydanticObjectId]
+    ) -> Dict[str, Any]:
+        return {
+            "order_id": {"$in": order_ids},
+            "status": {"$in": ["queued", "running"]},
+        }
+
+    async def _next_batch(
+        self, checkpoint: ReconcileCheckpoint
+    ) -> List[Dict[str, Any]]:
+        return await Order.get_pymongo_collection().find(
+            self._batch_filter(
+                checkpoint.cutoff,
+                checkpoint.after_created_at,
+                checkpoint.after_id,
+            ),
+            {"ref_order_id": 1, "created_at": 1},
+            sort=[("created_at", 1), ("_id", 1)],
+            limit=self.batch_size,
+        ).to_list()
+
+    async def _reconcile(
+        self,
+        batch: List[Dict[str, Any]],
+        checkpoint: ReconcileCheckpoint,
+        limiter: RateLimiter,
+    ):
+        results = await self._provider_orders(batch, limiter)
+
+        paid: List[PaidOrder] = []
+        cancel = []
+        failed = 0
+        expire_before = _naive(checkpoint.expire_before)
+        for row in batch:
+            ref_order_id = row["ref_order_id"]
+            result = results[row["_id"]]
+            if (
+                isinstance(result, httpx.HTTPStatusError)
+                and result.response.status_code == 404
+            ):
+                # PayPal drops the orders that expired.
+                cancel.append(row["_id"])
+            elif isinstance(result, Exception):
+                logger.warning(
+                    "Could not reconcile order %s: %s", row["_id"], result)
+                failed += 1
+            elif result.get("status") == "COMPLETED":
+                payer_id = (result.get("payer") or {}).get("payer_id")
+                paid.append(PaidOrder(
+                    ref_order_id, payer_id, f"reconcile-{ref_order_id}"))
+            elif (
+                result.get("status") == "VOIDED"
+                or _naive(row["created_at"]) < expire_before
+            ):
+                cancel.append(row["_id"])
+
+        paid_orders = await order_service.mark_paid_many(paid)
+        cancelled = await order_service.cancel_many(cancel)
+
+        stats = checkpoint.stats
+        stats.scanned += len(batch)
+        stats.paid += len(paid_orders)
+        stats.cancelled += len(cancelled)
+        stats.failed += failed
+        stats.unchanged += (
+            len(batch) - len(paid_orders) - len(cancelled) - failed)
+
+    async def _cancel_unsent(self, checkpoint: ReconcileCheckpoint):
+        """
+        Cancel the pending orders created before the cutoff that have
+        no PayPal order, skipping those a payment job will still send.
+        Nothing of this pass is checkpointed: the orders it cancels
+        leave its filter, a resumed run goes over the others again.
+        """
+        after_created_at = after_id = None
+        while True:
+            batch = await Order.get_pymongo_collection().find(
+                self._batch_filter(
+                    checkpoint.cutoff, after_created_at, after_id,
+                    sent=False),
+                {"created_at": 1},
+                sort=[("created_at", 1), ("_id", 1)],
+                limit=self.batch_size,
+            ).to_list()
+            if not batch:
+                return
+
+            ids = [row["_id"] for row in batch]
+            jobs = await PaymentJob.get_pymongo_collection().find(
+                self._live_jobs_filter(ids), {"order_id": 1}).to_list()
+            queued = {job["order_id"] for job in jobs}
+            cancelled = await order_service.cancel_many(
+                [id for id in ids if id not in queued])
+            checkpoint.stats.unsent += len(cancelled)
+            after_created_at = batch[-1]["created_at"]
+            after_id = batch[-1]["_id"]
+            if cancelled:
+                logger.info(
+                    "Cancelled %d orders never sent to PayPal",
+                    checkpoint.stats.unsent)
+
+    @staticmethod
+    async def _reservations_held(tokens: Set[ObjectId]) -> Set[ObjectId]:
+        """The reservation tokens an order was saved with."""
+        rows = await Order.get_pymongo_collection().find(
+            {"reservation_token": {"$in": list(tokens)}},
+            {"reservation_token": 1},
+        ).to_list()
+        return {row["reservation_token"] for row in rows}
+
+    async def _provider_orders(
+        self, batch: List[Dict[str, Any]], limiter: RateLimiter
+    ) -> Dict[Any, Any]:
+        """
+        The PayPal order of each order of the batch by order id, or the
+        error fetching it raised. Calls refused by the open circuit are
+        made again once it lets calls through.
+        """
+        results = {}
+        waiting = batch
+        while waiting:
+            fetched = await gather_limited([
+                self._provider_order(row["ref_order_id"], limiter)
+                for row in waiting
+            ], self.concurrency)
+            refused = []
+            for row, result in zip(waiting, fetched):
+                if isinstance(result, CircuitOpenError):
+                    refused.append(row)
+                else:
+                    results[row["_id"]] = result
+            if refused:
+                delay = paypal_service.breaker.retry_after() or 1.0
+                logger.warning(
+                    "PayPal circuit is open, waiting %.1fs", delay)
+                await asyncio.sleep(delay)
+            waiting = refused
+        return results
+
+    @staticmethod
+    async def _provider_order(
+        ref_order_id: str, limiter: RateLimiter
+    ) -> Dict[str, Any]:
+        await limiter.acquire()
+        detail = await paypal_service.get_order_detail(ref_order_id)
+        if detail.get("status") != "APPROVED":
+            return detail
+        # The payer approved it but the capture never came, as when
+        # the redirect back to the shop failed.
+        await limiter.acquire()
+        return await paypal_service.capture_order(ref_order_id)
+
+
+def _naive(moment: datetime) -> datetime:
+    """UTC time without a zone, as Mongo returns them."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+reconcile_config = app_settings.payment.reconcile
+
+order_reconciler = OrderReconciler(
+    stale_minutes=reconcile_config.stale_minutes,
+    expire_minutes=reconcile_config.expire_minutes,
+    batch_size=reconcile_config.batch_size,
+    concurrency=reconcile_config.concurrency,
+    rate_per_second=reconcile_config.rate_per_second,
+)
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Reconcile the pending orders with PayPal")
+    parser.add_argument(
+        "--restart", action="store_true",
+        help="Start a new run instead of resuming an unfinished one")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    await get_db()
+    checkpoint = await order_reconciler.run(restart=args.restart)
+    print(checkpoint.stats.model_dump())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
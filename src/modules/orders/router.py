@@ -1,55 +1,127 @@
-from fastapi import APIRouter, HTTPException, Query
-from typing import List
+import asyncio
+from datetime import datetime, timezone
+from beanie import PydanticObjectId
+from fastapi import (
+    APIRouter, Depends, Header, HTTPException, Query, Response
+)
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from typing import Dict, List, Optional, Union
 
 from src.core.libs.paypal import paypal_service
-from ...core.libs.paypal.paypal_type import (
-    PayPalConfirmPaymentSourceRequest, PayPalOrderRequest
+from ...core.services.etag import etag_response
+from ...core.services.idempotency import idempotent, request_fingerprint
+from ...core.services.pagination import PageQuery, paginate
+from ...core.services.projection import Fields, SparseFields, sparse_response
+from ...core.services.streaming import ndjson_response
+from ...core.services.trusted import trusted_response
+
+from .payment_worker import payment_worker
+from .models import Order
+from .service import (
+    order_idempotency, order_page_query, order_service, provider_orders
+)
+from ..orders.schemas import (
+    OrderCreate, OrderItemCreate, OrderResponse, OrderSummaryResponse
 )
-from ...core.libs.paypal.paypal_builder import PayPalRequestBuilder
-
-from .service import order_service
-from ..orders.schemas import OrderCreate, OrderResponse
 from ..products.service import product_service
 from ..users.service import user_service
 
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
+RESPOND_ASYNC = "respond-async"
+SUMMARY_DESCRIPTION = (
+    "Return summaries, with user and product snapshots instead of links")
+ORDER_LIST_RESPONSE = Union[List[OrderResponse], List[OrderSummaryResponse]]
+
+
+def _merge_items(items: List[OrderItemCreate]) -> Dict[PydanticObjectId, int]:
+    """Quantities by product id, in the order products first appear."""
+    quantities: Dict[PydanticObjectId, int] = {}
+    for item in items:
+        quantities[item.product_id] = (
+            quantities.get(item.product_id, 0) + item.quantity
+        )
+    return quantities
+
+
+def _order_response(order: Order, respond_async: bool) -> Response:
+    response = Response(
+        content=OrderResponse.model_validate(
+            order, from_attributes=True
+        ).model_dump_json(by_alias=True),
+        media_type="application/json",
+    )
+    if respond_async:
+        # The PayPal references are filled in by the payment worker,
+        # clients poll the order until checkout_url is set.
+        response.status_code = 202
+        response.headers["Location"] = f"{router.prefix}/{order.id}"
+        response.headers["Preference-Applied"] = RESPOND_ASYNC
+    return response
+
 
 @router.post("/", response_model=OrderResponse)
-async def create_order(order_data: OrderCreate):
+async def create_order(
+    order_data: OrderCreate,
+    prefer: Optional[str] = Header(
+        None, description="`respond-async` to not wait for PayPal"),
+    idempotency_key: Optional[str] = Header(
+        None, description="Retries with the same key get the first response"),
+):
+    respond_async = RESPOND_ASYNC in (prefer or "")
+
+    async def handler():
+        order = await _place_order(order_data, respond_async)
+        return _order_response(order, respond_async)
+
+    return await idempotent(
+        order_idempotency,
+        "orders.create",
+        idempotency_key,
+        request_fingerprint(order_data.model_dump(mode="json"), respond_async),
+        handler,
+    )
+
+
+async def _place_order(order_data: OrderCreate, respond_async: bool) -> Order:
     total = 0
     order_items = []
+    quantities = _merge_items(order_data.items)
 
-    user = await user_service.find_one(order_data.user_id)
+    # The order embeds its products as they are, without their category.
+    user, products = await asyncio.gather(
+        user_service.find_one(order_data.user_id),
+        product_service.find_many(list(quantities), fetch_links=False),
+    )
     if not user:
         raise HTTPException(
             status_code=404, detail=f"User {order_data.user_id} not found")
 
-    for item in order_data.items:
-        product_id = item.product_id
-        product = await product_service.find_one(product_id)
+    products = {product.id: product for product in products}
+    for product_id, quantity in quantities.items():
+        product = products.get(product_id)
 
         if not product:
             raise HTTPException(
                 status_code=404,
                 detail=f"Product with id {product_id} is not found")
 
-        if item.quantity > product.stock:
+        if quantity > product.stock:
             raise HTTPException(
                 status_code=404,
                 detail=(
-                    f"The quantity of item {item.product_id}"
+                    f"The quantity of item {product_id}"
                     "is out of stock"
                 )
             )
 
-        subtotal = product.price * item.quantity
+        subtotal = product.price * quantity
         total += subtotal
 
-        item = item.model_dump(exclude={"product_id"})
         order_items.append({
-            **item,
+            "quantity": quantity,
             "subtotal": subtotal,
             "product": product
         })
@@ -59,51 +131,128 @@ async def create_order(order_data: OrderCreate):
     db_order_data["total_price"] = total
     db_order_data["items"] = order_items
 
-    order = await order_service.create(db_order_data)
-
-    # create payment order to paypal
-    order_data = order.model_dump()
-
-    order_payload = PayPalRequestBuilder.build(order_data, PayPalOrderRequest)
-    confirm_payment_source_payload = PayPalRequestBuilder.build(
-        order_data,
-        PayPalConfirmPaymentSourceRequest
-    )
-
-    payment_order = await paypal_service.create_order(order_payload)
-
-    await paypal_service.confirm_payment_source(
-        order_id=payment_order["id"],
-        data=confirm_payment_source_payload
-    )
-
-    # update stock for each product
-    for item in order.items:
-        await product_service.increase(
-            item.product.id,
-            {"stock": -item.quantity}
-        )
-
-    return await order_service.update(
-        order.id, {
-            "ref_order_id": payment_order["id"],
-            "ref_payment_source": "paypal",
-            "checkout_url": payment_order["links"][1]["href"],
-        }
-    )
-
-
-@router.get("/", response_model=List[OrderResponse])
-async def get_all_orders():
-    result = await order_service.find_all()
-    return result
+    # Stock is taken atomically here, the check above only fails fast.
+    # The reservation stays pending until the order holding it is
+    # saved, so the reconciler can tell a crash in between.
+    token = PydanticObjectId()
+    if not await product_service.reserve_stock(quantities, token=token):
+        raise HTTPException(
+            status_code=409, detail="Not enough stock left for the order")
+
+    order = None
+    try:
+        order = await order_service.create(
+            {**db_order_data, "reservation_token": token})
+        await product_service.settle_reservation(quantities, token)
+        if respond_async:
+            await payment_worker.enqueue(order.id)
+            # The products were loaded without their category, the
+            # response needs the order with every link resolved.
+            return await order_service.find_one(order.id)
+        return await order_service.submit_payment(order)
+    except Exception:
+        if order is None:
+            await product_service.release_reservation(quantities, token)
+        else:
+            await product_service.release_stock(quantities)
+            await order_service.update(
+                order.id, {"status": "cancelled"}, fetch_links=False)
+        raise
+
+
+class OrderSearch:
+    """
+    Filters of the order list. `from` and `to` bound the creation time,
+    both included, times without a timezone are taken as UTC.
+    """
+
+    def __init__(
+        self,
+        status: Optional[str] = Query(None),
+        start: Optional[datetime] = Query(None, alias="from"),
+        end: Optional[datetime] = Query(None, alias="to"),
+        user_id: Optional[PydanticObjectId] = Query(None, alias="user"),
+    ):
+        start, end = _utc(start), _utc(end)
+        if start and end and start > end:
+            raise HTTPException(
+                status_code=400, detail="`from` must not be after `to`")
+        self.status = status
+        self.start = start
+        self.end = end
+        self.user_id = user_id
+
+
+def _utc(moment: Optional[datetime]) -> Optional[datetime]:
+    if moment is not None and moment.tzinfo is None:
+        return moment.replace(tzinfo=timezone.utc)
+    return moment
+
+
+def order_list_response(
+    orders: list,
+    response: Response,
+    fields: Optional[Fields],
+    summary: bool,
+) -> Response:
+    if fields:
+        return sparse_response(orders, OrderResponse, fields, response)
+    if summary:
+        return trusted_response(orders, OrderSummaryResponse, response)
+    return trusted_response(orders, OrderResponse, response)
+
+
+@router.get("/", response_model=ORDER_LIST_RESPONSE)
+async def get_all_orders(
+    response: Response,
+    page_query: PageQuery = Depends(),
+    search: OrderSearch = Depends(),
+    fields: Optional[Fields] = Depends(SparseFields(OrderResponse)),
+    summary: bool = Query(False, description=SUMMARY_DESCRIPTION),
+):
+    """
+    Orders matching the filters, newest first, with their links. With
+    `summary`, only the snapshot paths are read and no link is resolved.
+    """
+    orders = await paginate(
+        order_service, page_query, response, fields=fields,
+        **order_page_query(
+            status=search.status,
+            user_id=search.user_id,
+            start=search.start,
+            end=search.end,
+            summary=summary,
+        ))
+    return order_list_response(orders, response, fields, summary)
+
+
+@router.get("/export")
+async def export_orders():
+    return ndjson_response(
+        order_service.stream(), OrderResponse, "orders.ndjson")
 
 
 @router.get("/capture")
 async def capture_order(
     ref_order_id: str = Query(..., alias="token"),
-    payer_id: str = Query(..., alias="PayerID")
+    payer_id: str = Query(..., alias="PayerID"),
+    idempotency_key: Optional[str] = Header(
+        None, description="Retries with the same key get the first response"),
 ):
+    async def handler():
+        order = await _capture_order(ref_order_id, payer_id)
+        return JSONResponse(jsonable_encoder(order))
+
+    return await idempotent(
+        order_idempotency,
+        "orders.capture",
+        idempotency_key,
+        request_fingerprint(ref_order_id, payer_id),
+        handler,
+    )
+
+
+async def _capture_order(ref_order_id: str, payer_id: str) -> Order:
     order = await order_service.find_by_ref_order_id(ref_order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -118,14 +267,16 @@ async def capture_order(
 
     if order.ref_payment_source == "paypal":
         payment = await paypal_service.capture_order(ref_order_id)
-        return await order_service.update(
-            order_id, {
-                "status": (
-                    "paid" if payment["status"] == "COMPLETED" else "pending"
-                ),  
-                "payer_id": payer_id
-            }
-        )
+        provider_orders.invalidate(ref_order_id)
+        if payment["status"] != "COMPLETED":
+            return await order_service.update(
+                order_id, {"status": "pending", "payer_id": payer_id})
+
+        paid = await order_service.mark_paid(order_id, payer_id)
+        if paid is not None:
+            return paid
+        # Paid by an earlier capture, which already counted the sale.
+        return await order_service.update(order_id, {"payer_id": payer_id})
 
     raise HTTPException(
         status_code=500,
@@ -134,15 +285,31 @@ async def capture_order(
 
 
 @router.get("/{order_id}", response_model=OrderResponse)
-async def get_order(order_id: str):
-    order = await order_service.find_one(order_id)
+async def get_order(
+    order_id: str,
+    fields: Optional[Fields] = Depends(SparseFields(OrderResponse)),
+):
+    try:
+        order = await order_service.find_one(order_id, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    if fields:
+        return sparse_response(order, OrderResponse, fields)
     return order
 
 
 @router.get("/{order_id}/provider")
-async def get_order_detail_from_provider(order_id: str):
+async def get_order_detail_from_provider(
+    order_id: str,
+    if_none_match: Optional[str] = Header(None),
+):
+    """
+    The order with its PayPal order. PayPal is asked at most once per
+    cache lifetime of the PayPal order, and the ETag lets polling
+    clients get a 304 while nothing changed.
+    """
     order = await order_service.find_one(order_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
@@ -155,11 +322,11 @@ async def get_order_detail_from_provider(order_id: str):
         )
 
     if order.ref_payment_source == "paypal":
-        ref_order = await paypal_service.get_order_detail(ref_order_id)
-        return {
-            "ref_order": ref_order,
-            "order": order.model_dump()
-        }
+        ref_order = await order_service.get_provider_order(ref_order_id)
+        return etag_response(
+            {"ref_order": ref_order, "order": order.model_dump()},
+            if_none_match,
+        )
     raise HTTPException(
         status_code=500,
         detail=f"Payment source {order.ref_payment_source} is not supported"
@@ -168,7 +335,7 @@ async def get_order_detail_from_provider(order_id: str):
 
 @router.delete("/{order_id}")
 async def delete_order(order_id: str):
-    success = await order_service.delete_order(order_id)
+    success = await order_service.delete(order_id)
     if not success:
         raise HTTPException(status_code=404, detail="Order not found")
     return {"message": "Order deleted successfully"}
@@ -1,15 +1,18 @@
+from datetime import datetime
 from typing import List, Optional
 from beanie import PydanticObjectId
 from pydantic import BaseModel, ConfigDict, Field
 
+from ..products.models import ProductSnapshot
 from ..products.schemas import ProductResponse
 
+from ..users.models import UserSnapshot
 from ..users.schemas import UserResponse
 
 
 class OrderItemCreate(BaseModel):
     product_id: PydanticObjectId
-    quantity: int
+    quantity: int = Field(..., gt=0)
 
 
 class OrderCreate(BaseModel):
@@ -22,11 +25,13 @@ class OrderItemResponse(BaseModel):
     quantity: int
     subtotal: float
     product: Optional[ProductResponse] = None
+    product_snapshot: Optional[ProductSnapshot] = None
 
 
 class OrderResponse(BaseModel):
     id: PydanticObjectId
     user: UserResponse
+    user_snapshot: Optional[UserSnapshot] = None
     items: List[OrderItemResponse] = None
     total_price: float
     status: str
@@ -40,3 +45,23 @@ class OrderResponse(BaseModel):
         populate_by_name=True,
         from_attributes=True
     )
+
+
+class OrderItemSummaryResponse(BaseModel):
+    quantity: int
+    subtotal: float
+    product_snapshot: Optional[ProductSnapshot] = None
+
+
+class OrderSummaryResponse(BaseModel):
+    """An order as lists show it, read from its snapshots."""
+    id: PydanticObjectId
+    user_snapshot: Optional[UserSnapshot] = None
+    items: List[OrderItemSummaryResponse] = []
+    total_price: float
+    status: str
+    ref_order_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    paid_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
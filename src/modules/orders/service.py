@@ -1,5 +1,99 @@
-from .models import Order, OrderItem
+from datetime import datetime, timezone
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+from beanie import PydanticObjectId
+from beanie.odm.utils.parsing import parse_obj
+from pymongo import UpdateOne
+
+from .models import PAID_STATUSES, IdempotencyRecord, Order, OrderItem
+from ...core.libs.paypal import paypal_payload, paypal_service
+from ...core.config.config import app_settings
 from ...core.services.base import BaseService
+from ...core.services.cache import CoalescingCache, LRUCache
+from ...core.services.explain import QueryShape
+from ...core.services.idempotency import idempotency_store
+from ..products.service import product_service
+from ..reports.service import sales_service
+
+
+# Paths of an order its summary is read from. The snapshots stand in
+# for the user and products, so no link has to be resolved.
+ORDER_SUMMARY_PATHS = (
+    "user_snapshot",
+    "items.quantity",
+    "items.subtotal",
+    "items.product_snapshot",
+    "total_price",
+    "status",
+    "ref_order_id",
+    "created_at",
+    "paid_at",
+)
+
+
+def order_page_query(
+    status: Optional[str] = None,
+    user_id: Optional[PydanticObjectId] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    summary: bool = False,
+) -> Dict[str, Any]:
+    """
+    `find_page` arguments listing the matching orders newest first,
+    trusted rows holding only the summary paths with `summary`.
+    The order indexes cover each filter followed by the sort.
+    """
+    filter: Dict[str, Any] = {}
+    if user_id is not None:
+        filter["user.$id"] = user_id
+    if status is not None:
+        filter["status"] = status
+    created_at = {}
+    if start is not None:
+        created_at["$gte"] = start
+    if end is not None:
+        created_at["$lte"] = end
+    if created_at:
+        filter["created_at"] = created_at
+    return {
+        "filter": filter,
+        "sort_key": "created_at",
+        "descending": True,
+        "trusted": True,
+        "include": ORDER_SUMMARY_PATHS if summary else None,
+    }
+
+
+# Statuses of PayPal orders that never change again.
+FINAL_PROVIDER_STATUSES = ("COMPLETED", "VOIDED")
+
+
+def _provider_ttl(ref_order: Dict[str, Any]) -> float:
+    config = app_settings.cache
+    if ref_order.get("status") in FINAL_PROVIDER_STATUSES:
+        return config.provider_final_ttl_seconds
+    return config.provider_pending_ttl_seconds
+
+
+async def _load_provider_order(ref_order_id: str) -> Dict[str, Any]:
+    return await paypal_service.get_order_detail(ref_order_id)
+
+
+def item_quantities(order: Order) -> Dict[PydanticObjectId, int]:
+    """Quantities by product id of the items of an order."""
+    quantities: Dict[PydanticObjectId, int] = {}
+    for item in order.items:
+        quantities[item.product_id] = (
+            quantities.get(item.product_id, 0) + item.quantity
+        )
+    return quantities
+
+
+class PaidOrder(NamedTuple):
+    """A capture a PayPal webhook event reported."""
+    ref_order_id: str
+    payer_id: Optional[str]
+    event_id: str
 
 
 class OrderService(BaseService[Order]):
@@ -13,11 +107,221 @@ class OrderService(BaseService[Order]):
         await self._fetch_nested_links(item)
         return item
 
+    def query_shapes(self) -> List[QueryShape]:
+        now = datetime.now(timezone.utc)
+        return super().query_shapes() + [
+            QueryShape(
+                "find_by_ref_order_id", Order, {"ref_order_id": "REF"}),
+            QueryShape(
+                "by_user", Order, {"user.$id": PydanticObjectId()},
+                [("created_at", -1), ("_id", -1)]),
+            QueryShape(
+                "by_status", Order,
+                {"status": "pending", "created_at": {"$lte": now}},
+                [("created_at", -1), ("_id", -1)]),
+            QueryShape(
+                "newest", Order, {"created_at": {"$gte": now}},
+                [("created_at", -1), ("_id", -1)]),
+            QueryShape(
+                "mark_paid",
+                Order,
+                {
+                    "_id": PydanticObjectId(),
+                    "status": {"$nin": list(PAID_STATUSES)},
+                },
+            ),
+            QueryShape(
+                "paid_orders", Order,
+                {"status": {"$in": list(PAID_STATUSES)}}),
+            QueryShape(
+                "ref_order_statuses", Order,
+                {"ref_order_id": {"$in": ["REF"], "$gt": ""}}),
+            QueryShape(
+                "mark_paid_many",
+                Order,
+                {
+                    "ref_order_id": "REF",
+                    "status": {"$nin": list(PAID_STATUSES)},
+                },
+            ),
+        ]
+
+    async def get_provider_order(self, ref_order_id: str) -> Dict[str, Any]:
+        """
+        The PayPal order, from a cache that concurrent polls for the
+        same order share a single upstream call to fill.
+        """
+        return await provider_orders.get(ref_order_id)
+
+    async def submit_payment(self, order: Order) -> Optional[Order]:
+        """
+        Create and confirm the PayPal order of an order and store its
+        references. Safe to retry, PayPal dedupes the create by order id.
+        """
+        order_payload = paypal_payload.order_request(order)
+        confirm_payment_source_payload = (
+            paypal_payload.confirm_payment_source_request(order))
+
+        payment_order = await paypal_service.create_order(
+            order_payload, request_id=str(order.id))
+
+        await paypal_service.confirm_payment_source(
+            order_id=payment_order["id"],
+            data=confirm_payment_source_payload
+        )
+
+        return await self.update(
+            order.id, {
+                "ref_order_id": payment_order["id"],
+                "ref_payment_source": "paypal",
+                "checkout_url": payment_order["links"][1]["href"],
+            }
+        )
+
+    async def mark_paid(
+        self, id: PydanticObjectId, payer_id: str
+    ) -> Optional[Order]:
+        """
+        Move an order to paid and add it to the sales rollups. Only the
+        first call for an order does so, later ones return None, so a
+        repeated capture is never counted twice.
+        """
+        order = await self._find_one_and_update(
+            id,
+            {"$set": {
+                "status": "paid",
+                "payer_id": payer_id,
+                "paid_at": datetime.now(timezone.utc),
+            }},
+            fetch_links=True,
+            condition={"status": {"$nin": list(PAID_STATUSES)}},
+        )
+        if order is not None:
+            await sales_service.record_paid_order(order)
+        return order
+
+    async def ref_order_statuses(
+        self, ref_order_ids: Sequence[str]
+    ) -> Dict[str, str]:
+        """Statuses of the orders with these PayPal order ids."""
+        # Spelling out `$gt` lets the partial ref_order_id index serve
+        # the `$in`.
+        rows = await Order.get_pymongo_collection().find(
+            {"ref_order_id": {"$in": list(ref_order_ids), "$gt": ""}},
+            {"ref_order_id": 1, "status": 1},
+        ).to_list()
+        return {row["ref_order_id"]: row["status"] for row in rows}
+
+    async def mark_paid_many(
+        self, payments: Sequence[PaidOrder]
+    ) -> List[Order]:
+        """
+        `mark_paid` for a batch of webhook captures, in one `bulk_write`.
+        Each order is stamped with the event that paid it and with a
+        batch id unique to this call, which tells the orders this call
+        moved to paid (and adds to the sales rollups) from those paid
+        before or by a concurrent call. Returns the former.
+        """
+        if not payments:
+            return []
+
+        now = datetime.now(timezone.utc)
+        batch_id = PydanticObjectId()
+        collection = Order.get_pymongo_collection()
+        await collection.bulk_write([
+            UpdateOne(
+                {
+                    "ref_order_id": payment.ref_order_id,
+                    "status": {"$nin": list(PAID_STATUSES)},
+                },
+                {"$set": {
+                    "status": "paid",
+                    "paid_at": now,
+                    "paid_event_id": payment.event_id,
+                    "paid_batch_id": batch_id,
+                    "updated_at": now,
+                    **({"payer_id": payment.payer_id}
+                       if payment.payer_id else {}),
+                }},
+            )
+            for payment in payments
+        ], ordered=False)
+
+        rows = await collection.find({
+            "ref_order_id": {
+                "$in": [payment.ref_order_id for payment in payments],
+                "$gt": "",
+            },
+            "paid_batch_id": batch_id,
+        }).to_list()
+        orders = [parse_obj(Order, row) for row in rows]
+        self._invalidate(*[order.id for order in orders])
+        for payment in payments:
+            provider_orders.invalidate(payment.ref_order_id)
+        for order in orders:
+            await sales_service.record_paid_order(order)
+        return orders
+
+    async def cancel(self, order: Order):
+        """Cancel an unpaid order and put its stock back."""
+        await product_service.release_stock(item_quantities(order))
+        now = datetime.now(timezone.utc)
+        await self.update(
+            order.id, {"status": "cancelled", "cancelled_at": now},
+            fetch_links=False)
+
+    async def cancel_many(
+        self, ids: Sequence[PydanticObjectId]
+    ) -> List[Order]:
+        """
+        Cancel the orders that are still pending, with one `bulk_write`,
+        and put their stock back with one more. Orders paid or cancelled
+        meanwhile are left alone. Returns the orders this call cancelled,
+        told from the others by a batch id unique to this call.
+        """
+        if not ids:
+            return []
+
+        now = datetime.now(timezone.utc)
+        batch_id = PydanticObjectId()
+        collection = Order.get_pymongo_collection()
+        await collection.bulk_write([
+            UpdateOne(
+                {"_id": id, "status": "pending"},
+                {"$set": {
+                    "status": "cancelled",
+                    "cancelled_at": now,
+                    "cancel_batch_id": batch_id,
+                    "updated_at": now,
+                }},
+            )
+            for id in ids
+        ], ordered=False)
+
+        rows = await collection.find(
+            {"_id": {"$in": list(ids)}, "cancel_batch_id": batch_id}
+        ).to_list()
+        orders = [parse_obj(Order, row) for row in rows]
+        self._invalidate(*[order.id for order in orders])
+        quantities: Dict[PydanticObjectId, int] = {}
+        for order in orders:
+            for product_id, quantity in item_quantities(order).items():
+                quantities[product_id] = (
+                    quantities.get(product_id, 0) + quantity)
+        await product_service.release_stock(quantities)
+        return orders
+
 
 class OrderItemService(BaseService[OrderItem]):
     def __init__(self):
         super().__init__(OrderItem)
 
 
+provider_orders = CoalescingCache(
+    _load_provider_order,
+    ttl=_provider_ttl,
+    cache=LRUCache(max_size=app_settings.cache.provider_max_size),
+)
 order_item_service = OrderItemService()
 order_service = OrderService()
+order_idempotency = idempotency_store(IdempotencyRecord)
@@ -1,9 +1,10 @@
 
 from datetime import datetime, timezone
-from typing import Literal, Optional
+from typing import Any, Dict, Literal, Optional
 
-from beanie import Link
+from beanie import Link, PydanticObjectId
 from pydantic import Field
+from pymongo import ASCENDING, IndexModel
 
 from ..orders.models import Order
 from ...core.models.base import TimestampDocument
@@ -20,3 +21,36 @@ class Payment(TimestampDocument):
 
     class Settings:
         name = "payments"
+        indexes = [
+            IndexModel([("order.$id", ASCENDING)]),
+        ]
+
+
+class WebhookEvent(TimestampDocument):
+    """
+    A PayPal webhook event as it was received, queued until the webhook
+    worker has verified and applied it.
+    """
+    # PayPal's event id, redeliveries of an event share it.
+    event_id: str
+    event_type: Optional[str] = None
+    event: Dict[str, Any]
+    # The PayPal-* headers its signature is verified with.
+    headers: Dict[str, str] = Field(default_factory=dict)
+    # queued, running, done, ignored, rejected, failed
+    status: str = "queued"
+    attempts: int = 0
+    run_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc))
+    locked_until: Optional[datetime] = None
+    # Set on the events a worker claimed together.
+    lease_id: Optional[PydanticObjectId] = None
+    last_error: Optional[str] = None
+
+    class Settings:
+        name = "webhook_events"
+        indexes = [
+            IndexModel([("event_id", ASCENDING)], unique=True),
+            IndexModel([("status", ASCENDING), ("run_at", ASCENDING)]),
+            IndexModel([("status", ASCENDING), ("locked_until", ASCENDING)]),
+        ]
@@ -1,8 +1,12 @@
 
-from fastapi import APIRouter, HTTPException
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from typing import List
 from .service import payment_service
+from .webhook_worker import webhook_worker
 from .schemas import PaymentCreate, PaymentResponse, PaymentUpdate
+from ...core.services.pagination import PageQuery, paginate
 
 from ..orders.service import order_service
 router = APIRouter(prefix="/payments", tags=["Payments"])
@@ -30,9 +34,29 @@ async def create_payment(payment_data: PaymentCreate):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@router.post("/webhooks/paypal")
+async def paypal_webhook(request: Request):
+    """
+    Queue a PayPal webhook event and acknowledge it at once. The webhook
+    worker verifies its signature and applies it later, redeliveries of
+    a queued event are acknowledged without being queued again.
+    """
+    try:
+        event = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body is not JSON")
+    if not isinstance(event, dict) or not event.get("id"):
+        raise HTTPException(status_code=400, detail="Event has no id")
+
+    queued = await webhook_worker.enqueue(event, request.headers)
+    return {"id": event["id"], "status": "queued" if queued else "duplicate"}
+
+
 @router.get("/", response_model=List[PaymentResponse])
-async def list_payments():
-    payments = await payment_service.find_all()
+async def list_payments(
+    response: Response, page_query: PageQuery = Depends()
+):
+    payments = await paginate(payment_service, page_query, response)
     return [
         PaymentResponse(
             id=payment.id,
@@ -0,0 +1,337 @@
+import asyncio
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Mapping, NamedTuple, Optional, Sequence
+
+import httpx
+from beanie import PydanticObjectId
+from beanie.odm.utils.parsing import parse_obj
+from pymongo.errors import DuplicateKeyError
+
+from .models import WebhookEvent
+from ..orders.models import PAID_STATUSES
+from ..orders.service import PaidOrder, order_service
+from ...core.config.config import app_settings
+from ...core.libs.paypal import paypal_service
+from ...core.services.circuit_breaker import CircuitOpenError
+from ...core.services.concurrency import gather_limited
+from ...core.services.explain import QueryShape
+
+
+logger = logging.getLogger(__name__)
+
+# The buyer approved the PayPal order, it is ready to be captured.
+CAPTURE_EVENTS = ("CHECKOUT.ORDER.APPROVED",)
+# The payment of the PayPal order was captured.
+PAID_EVENTS = ("PAYMENT.CAPTURE.COMPLETED", "CHECKOUT.ORDER.COMPLETED")
+
+
+def event_ref_order_id(event: Dict[str, Any]) -> Optional[str]:
+    """Id of the PayPal order an event is about."""
+    resource = event.get("resource") or {}
+    if (event.get("event_type") or "").startswith("PAYMENT.CAPTURE."):
+        related = (resource.get("supplementary_data") or {}).get(
+            "related_ids") or {}
+        return related.get("order_id")
+    return resource.get("id")
+
+
+def event_payer_id(event: Dict[str, Any]) -> Optional[str]:
+    resource = event.get("resource") or {}
+    return (resource.get("payer") or {}).get("payer_id")
+
+
+class Retry(NamedTuple):
+    event: WebhookEvent
+    error: str
+    delay: Optional[float] = None
+    count_attempt: bool = True
+
+
+class WebhookWorker:
+    """
+    Applies the PayPal webhook events the webhook endpoint queued.
+
+    Events are stored in Mongo under their PayPal id, so a redelivery
+    is not queued twice and nothing is lost on restarts. The worker
+    claims them by batches of up to `batch_size` with a lease, verifies
+    their signatures and moves their orders to paid with one
+    `bulk_write` per batch. Approved orders are captured first. At most
+    `concurrency` PayPal calls of a batch run at the same time.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = 100,
+        concurrency: int = 8,
+        max_attempts: int = 5,
+        lease_seconds: float = 60.0,
+        poll_seconds: float = 1.0,
+        retry_base_seconds: float = 2.0,
+    ):
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+        self.retry_base_seconds = retry_base_seconds
+        self._runner: Optional[asyncio.Task] = None
+        # Created in start(), inside the event loop that uses them.
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+    async def enqueue(
+        self, event: Dict[str, Any], headers: Mapping[str, str]
+    ) -> bool:
+        """Queue an event, False when it was received before."""
+        try:
+            await WebhookEvent(
+                event_id=str(event["id"]),
+                event_type=event.get("event_type"),
+                event=event,
+                headers={
+                    name.lower(): value for name, value in headers.items()
+                    if name.lower().startswith("paypal-")
+                },
+            ).insert()
+        except DuplicateKeyError:
+            return False
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return True
+
+    def start(self):
+        if self._runner is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = asyncio.Event()
+        self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop claiming events once the running batch is applied."""
+        if self._runner is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        await asyncio.gather(self._runner, return_exceptions=True)
+        self._runner = None
+
+    async def run_pending(self) -> int:
+        """Apply every due event in this task, for scripts and tests."""
+        processed = 0
+        while True:
+            events = await self._claim()
+            if not events:
+                return processed
+            await self._process(events)
+            processed += len(events)
+
+    async def _run(self):
+        while not self._stopping.is_set():
+            try:
+                events = await self._claim()
+                if events:
+                    await self._process(events)
+                    continue
+            except Exception:
+                logger.exception("Could not apply webhook events")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def query_shapes(self) -> List[QueryShape]:
+        return [
+            QueryShape(
+                "claim",
+                WebhookEvent,
+                self._due(datetime.now(timezone.utc)),
+                [("run_at", 1)],
+            ),
+            QueryShape(
+                "claimed",
+                WebhookEvent,
+                {
+                    "_id": {"$in": [PydanticObjectId()]},
+                    "lease_id": PydanticObjectId(),
+                },
+            ),
+        ]
+
+    @staticmethod
+    def _due(now: datetime) -> Dict[str, Any]:
+        return {"$or": [
+            {"status": "queued", "run_at": {"$lte": now}},
+            {"status": "running", "locked_until": {"$lt": now}},
+        ]}
+
+    async def _claim(self) -> List[WebhookEvent]:
+        """
+        Lease the next batch of due events, and of events whose lease
+        has run out. The claimed ones are read back by their lease id,
+        events another worker took in between are left out.
+        """
+        now = datetime.now(timezone.utc)
+        due = self._due(now)
+        collection = WebhookEvent.get_pymongo_collection()
+        rows = await collection.find(
+            due, {"_id": 1}, sort=[("run_at", 1)], limit=self.batch_size
+        ).to_list()
+        if not rows:
+            return []
+
+        ids = [row["_id"] for row in rows]
+        lease_id = PydanticObjectId()
+        await collection.update_many(
+            {**due, "_id": {"$in": ids}},
+            {
+                "$set": {
+                    "status": "running",
+                    "locked_until": now + self.lease,
+                    "lease_id": lease_id,
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+        )
+        claimed = await collection.find(
+            {"_id": {"$in": ids}, "lease_id": lease_id}).to_list()
+        return [parse_obj(WebhookEvent, row) for row in claimed]
+
+    async def _process(self, events: Sequence[WebhookEvent]):
+        finished: Dict[str, List[WebhookEvent]] = defaultdict(list)
+        retries: List[Retry] = []
+
+        def fail(event: WebhookEvent, error: BaseException):
+            if isinstance(error, CircuitOpenError):
+                # PayPal was not called, so the attempt does not count.
+                retries.append(Retry(
+                    event, str(error),
+                    delay=paypal_service.breaker.retry_after(),
+                    count_attempt=False))
+            elif event.attempts >= self.max_attempts:
+                logger.warning(
+                    "Webhook event %s failed for good: %s",
+                    event.event_id, error)
+                finished["failed"].append(event)
+            else:
+                retries.append(Retry(event, str(error)))
+
+        verified = await gather_limited([
+            paypal_service.verify_webhook_signature(event.headers, event.event)
+            for event in events
+        ], self.concurrency)
+        applicable: List[WebhookEvent] = []
+        for event, valid in zip(events, verified):
+            if isinstance(valid, Exception):
+                fail(event, valid)
+            elif not valid:
+                logger.warning(
+                    "Rejected webhook event %s with an invalid signature",
+                    event.event_id)
+                finished["rejected"].append(event)
+            elif event.event_type in CAPTURE_EVENTS + PAID_EVENTS:
+                applicable.append(event)
+            else:
+                finished["ignored"].append(event)
+
+        statuses = await order_service.ref_order_statuses({
+            event_ref_order_id(event.event) for event in applicable
+        } - {None})
+
+        to_capture: List[WebhookEvent] = []
+        paid: Dict[str, PaidOrder] = {}
+        for event in applicable:
+            ref_order_id = event_ref_order_id(event.event)
+            status = statuses.get(ref_order_id)
+            if status is None:
+                # Not an order of ours.
+                finished["ignored"].append(event)
+            elif status in PAID_STATUSES or ref_order_id in paid:
+                finished["done"].append(event)
+            elif event.event_type in CAPTURE_EVENTS:
+                to_capture.append(event)
+            else:
+                paid[ref_order_id] = PaidOrder(
+                    ref_order_id, event_payer_id(event.event), event.event_id)
+                finished["done"].append(event)
+
+        captures = await gather_limited([
+            paypal_service.capture_order(event_ref_order_id(event.event))
+            for event in to_capture
+        ], self.concurrency)
+        for event, capture in zip(to_capture, captures):
+            ref_order_id = event_ref_order_id(event.event)
+            if (
+                isinstance(capture, httpx.HTTPStatusError)
+                and capture.response.status_code == 422
+            ):
+                # Captured already, by the buyer's redirect. The capture
+                # events of PayPal report it.
+                finished["done"].append(event)
+            elif isinstance(capture, Exception):
+                fail(event, capture)
+            else:
+                if (
+                    capture.get("status") == "COMPLETED"
+                    and ref_order_id not in paid
+                ):
+                    paid[ref_order_id] = PaidOrder(
+                        ref_order_id, event_payer_id(event.event),
+                        event.event_id)
+                finished["done"].append(event)
+
+        await order_service.mark_paid_many(list(paid.values()))
+
+        for status, done in finished.items():
+            await self._finish(done, status)
+        for retry in retries:
+            await self._retry(retry)
+
+    async def _retry(self, retry: Retry):
+        delay = retry.delay
+        if delay is None:
+            # Exponential backoff with full jitter.
+            delay = random.uniform(
+                0, self.retry_base_seconds * 2 ** (retry.event.attempts - 1))
+        now = datetime.now(timezone.utc)
+        update = {"$set": {
+            "status": "queued",
+            "run_at": now + timedelta(seconds=delay),
+            "locked_until": None,
+            "last_error": retry.error,
+            "updated_at": now,
+        }}
+        if not retry.count_attempt:
+            # Claiming the event counted it.
+            update["$inc"] = {"attempts": -1}
+        await WebhookEvent.get_pymongo_collection().update_one(
+            {"_id": retry.event.id}, update)
+
+    async def _finish(self, events: Sequence[WebhookEvent], status: str):
+        if not events:
+            return
+        await WebhookEvent.get_pymongo_collection().update_many(
+            {"_id": {"$in": [event.id for event in events]}},
+            {"$set": {
+                "status": status,
+                "locked_until": None,
+                "updated_at": datetime.now(timezone.utc),
+            }},
+        )
+
+
+worker_config = app_settings.payment.webhooks
+
+webhook_worker = WebhookWorker(
+    batch_size=worker_config.batch_size,
+    concurrency=worker_config.concurrency,
+    max_attempts=worker_config.max_attempts,
+    lease_seconds=worker_config.lease_seconds,
+    poll_seconds=worker_config.poll_seconds,
+    retry_base_seconds=worker_config.retry_base_seconds,
+)
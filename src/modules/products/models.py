@@ -1,10 +1,12 @@
 
-from typing import Optional
+from typing import Annotated, Optional
 from beanie import Link
 from pydantic import ConfigDict
+from pymongo import ASCENDING, IndexModel
 
 from ...core.models.base import TimestampDocument
-from ..categories.models import Category
+from ...core.models.snapshot import Snapshot, SnapshotOf
+from ..categories.models import Category, CategorySnapshot
 
 
 class Product(TimestampDocument):
@@ -13,14 +15,31 @@ class Product(TimestampDocument):
     price: float
     stock: int = 0
     category: Optional[Link[Category]] = None
+    category_snapshot: Annotated[
+        Optional[CategorySnapshot], SnapshotOf("category")] = None
     is_active: bool = True
 
     class Settings:
         name = "products"
         populate_links = True
+        indexes = [
+            IndexModel([("category.$id", ASCENDING)]),
+            # Only products with a reservation in flight are indexed.
+            IndexModel(
+                [("pending_reservations.token", ASCENDING)],
+                partialFilterExpression={
+                    "pending_reservations.token": {"$exists": True},
+                },
+            ),
+        ]
 
     model_config = ConfigDict(
         arbitrary_types_allowed=True,
         from_attributes=True,
         populate_by_name=True,
     )
+
+
+class ProductSnapshot(Snapshot):
+    name: str
+    price: float
@@ -1,14 +1,39 @@
-from fastapi import APIRouter, HTTPException
+from typing import Dict, List, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from beanie import Link, PydanticObjectId
 
-from .schemas import ProductCreate, ProductResponse, ProductUpdate
-
-
+from .schemas import (
+    ProductBulkUpdate, ProductCreate, ProductResponse, ProductSummaryResponse,
+    ProductUpdate
+)
+from ...core.services.bulk import (
+    BulkCreateRequest, BulkDeleteRequest, BulkResult, BulkRowError,
+    BulkUpdateRequest, not_applied
+)
+from ...core.services.pagination import PageQuery, paginate
+from ...core.services.projection import Fields, SparseFields, sparse_response
+from ...core.services.streaming import ndjson_response
+from ...core.services.trusted import trusted_response
+
+
+from ..categories.models import Category
 from ..categories.service import category_service
-from .service import product_service
+from .service import PRODUCT_SUMMARY_PATHS, product_service
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+SUMMARY_DESCRIPTION = (
+    "Return summaries, with the category snapshot instead of the category")
+
+
+async def _load_categories(
+    category_ids: List[Optional[PydanticObjectId]]
+) -> Dict[PydanticObjectId, Category]:
+    """Load the categories referenced by a batch in one query."""
+    categories = await category_service.find_many(
+        list({id for id in category_ids if id}), fetch_links=False)
+    return {category.id: category for category in categories}
+
 
 @router.post("/", response_model=ProductResponse)
 async def create_product(data: ProductCreate):
@@ -21,16 +46,111 @@ async def create_product(data: ProductCreate):
     return await product_service.create({**data, "category": category})
 
 
-@router.get("/", response_model=list[ProductResponse])
-async def get_products():
-    return await product_service.find_all()
+@router.get(
+    "/",
+    response_model=Union[
+        List[ProductResponse], List[ProductSummaryResponse]],
+)
+async def get_products(
+    response: Response,
+    page_query: PageQuery = Depends(),
+    fields: Optional[Fields] = Depends(SparseFields(ProductResponse)),
+    summary: bool = Query(False, description=SUMMARY_DESCRIPTION),
+):
+    """
+    Products in `_id` order, with their category. With `summary`, the
+    category is read from its snapshot and no link is resolved.
+    """
+    products = await paginate(
+        product_service, page_query, response, fields=fields, trusted=True,
+        include=PRODUCT_SUMMARY_PATHS if summary else None)
+    if fields:
+        return sparse_response(products, ProductResponse, fields, response)
+    if summary:
+        return trusted_response(products, ProductSummaryResponse, response)
+    return trusted_response(products, ProductResponse, response)
+
+
+@router.get("/export")
+async def export_products():
+    return ndjson_response(
+        product_service.stream(), ProductResponse, "products.ndjson")
+
+
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_create_products(request: BulkCreateRequest[ProductCreate]):
+    categories = await _load_categories(
+        [item.category_id for item in request.items])
+
+    rows, positions, errors = [], [], []
+    for index, item in enumerate(request.items):
+        category = categories.get(item.category_id)
+        if item.category_id and not category:
+            errors.append(
+                BulkRowError(index=index, detail="Category not found"))
+            if request.ordered:
+                errors.extend(not_applied(index + 1, len(request.items)))
+                break
+            continue
+        rows.append({
+            **item.model_dump(exclude={"category_id"}),
+            "category": category,
+        })
+        positions.append(index)
+
+    result = await product_service.bulk_create(rows, ordered=request.ordered)
+    return result.remap(positions, errors)
+
+
+@router.put("/bulk", response_model=BulkResult)
+async def bulk_update_products(
+    request: BulkUpdateRequest[ProductBulkUpdate]
+):
+    categories = await _load_categories(
+        [item.category_id for item in request.items])
+
+    rows, positions, errors = [], [], []
+    for index, item in enumerate(request.items):
+        data = item.model_dump(
+            exclude={"id", "category_id"}, exclude_unset=True)
+        if item.category_id:
+            category = categories.get(item.category_id)
+            if not category:
+                errors.append(BulkRowError(
+                    index=index, id=item.id, detail="Category not found"))
+                if request.ordered:
+                    errors.extend(not_applied(
+                        index + 1, len(request.items),
+                        [item.id for item in request.items]))
+                    break
+                continue
+            data["category"] = Link(category.to_ref(), Category)
+        rows.append((item.id, data))
+        positions.append(index)
+
+    result = await product_service.bulk_update(rows, ordered=request.ordered)
+    return result.remap(positions, errors)
+
+
+@router.delete("/bulk", response_model=BulkResult)
+async def bulk_delete_products(request: BulkDeleteRequest):
+    return await product_service.bulk_delete(
+        request.ids, ordered=request.ordered)
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: PydanticObjectId):
-    product = await product_service.find_one(product_id)
+async def get_product(
+    product_id: PydanticObjectId,
+    fields: Optional[Fields] = Depends(SparseFields(ProductResponse)),
+):
+    try:
+        product = await product_service.find_one(product_id, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    if fields:
+        return sparse_response(product, ProductResponse, fields)
     return product
 
 
@@ -43,7 +163,10 @@ async def update_product(product_id: PydanticObjectId, data: ProductUpdate):
             raise HTTPException(status_code=404, detail="Category not found")
 
     data = data.model_dump(exclude={"category_id"}, exclude_unset=True)
-    payload = {**data, "category": Link(category)} if category else {**data}
+    payload = (
+        {**data, "category": Link(category.to_ref(), type(category))}
+        if category else {**data}
+    )
     product = await product_service.update(
         product_id, payload)
     if not product:
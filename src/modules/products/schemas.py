@@ -4,6 +4,7 @@ from typing import Optional
 from pydantic import BaseModel, ConfigDict, Field
 from beanie import PydanticObjectId
 
+from ..categories.models import CategorySnapshot
 from ..categories.schemas import CategoryResponse
 
 
@@ -54,14 +55,32 @@ class ProductUpdate(BaseModel):
     is_active: Optional[bool] = None
 
 
+class ProductBulkUpdate(ProductUpdate):
+    id: PydanticObjectId
+
+
 class ProductResponse(ProductBase):
     id: PydanticObjectId = Field(alias="_id")
     created_at: datetime
     updated_at: datetime
     category: Optional[CategoryResponse] = None
+    category_snapshot: Optional[CategorySnapshot] = None
 
     model_config = ConfigDict(
         from_attributes=True,
         arbitrary_types_allowed=True,
         populate_by_name=True,
     )
+
+
+class ProductSummaryResponse(ProductBase):
+    """A product as lists show it, its category read from the snapshot."""
+    id: PydanticObjectId = Field(alias="_id")
+    created_at: datetime
+    updated_at: datetime
+    category_snapshot: Optional[CategorySnapshot] = None
+
+    model_config = ConfigDict(
+        from_attributes=True,
+        populate_by_name=True,
+    )
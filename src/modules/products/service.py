@@ -1,10 +1,216 @@
+from datetime import datetime, timezone
+from typing import (
+    Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Set
+)
+
+from beanie import PydanticObjectId
+from bson import ObjectId
+from beanie.odm.utils.encoder import Encoder
+from pymongo import UpdateMany, UpdateOne
+
 from .models import Product
+from ..categories.models import Category, CategorySnapshot
 from ...core.services.base import BaseService
+from ...core.services.cache import document_cache
+from ...core.services.explain import QueryShape
+
+# The reservations that touched a product and are not settled, as
+# {"token": ObjectId, "quantity": int}.
+RESERVATIONS_FIELD = "pending_reservations"
+RESERVATION_TOKEN = f"{RESERVATIONS_FIELD}.token"
+
+# Paths of a product its summary is read from. The snapshot stands in
+# for the category, so no link has to be resolved.
+PRODUCT_SUMMARY_PATHS = (
+    "name",
+    "description",
+    "price",
+    "stock",
+    "is_active",
+    "category_snapshot",
+    "created_at",
+    "updated_at",
+)
 
 
 class ProductService(BaseService[Product]):
     def __init__(self):
-        super().__init__(Product)
+        super().__init__(Product, cache=document_cache())
+
+    def query_shapes(self) -> List[QueryShape]:
+        return super().query_shapes() + [
+            QueryShape(
+                "reserve_stock", Product,
+                {"_id": PydanticObjectId(), "stock": {"$gte": 1}}),
+            QueryShape(
+                "stale_reservations", Product,
+                self._stale_filter(datetime.now(timezone.utc))),
+        ]
+
+    async def refresh_category_snapshots(
+        self, categories: Sequence[Category]
+    ):
+        """
+        Copy the categories into the snapshots of their products, with
+        one `bulk_write`. Product summaries show the snapshot, not the
+        category.
+        """
+        if not categories:
+            return
+
+        encoder = Encoder(
+            custom_encoders=Product.get_settings().bson_encoders)
+        await Product.get_pymongo_collection().bulk_write([
+            UpdateMany(
+                {"category.$id": category.id},
+                {"$set": {"category_snapshot": encoder.encode(
+                    CategorySnapshot.of(category))}},
+            )
+            for category in categories
+        ], ordered=False)
+        # The products changed are not known one by one.
+        if self.cache is not None:
+            self.cache.clear()
+
+    async def reserve_stock(
+        self,
+        quantities: Dict[PydanticObjectId, int],
+        token: Optional[ObjectId] = None,
+    ) -> bool:
+        """
+        Take the quantities out of stock, all of them or none.
+
+        Each product is decremented by a conditional update that only
+        matches while enough stock is left, all sent in one bulk_write.
+        The updates also tag the products with a reservation token. If
+        any product lacked stock, only the tagged products get their
+        quantity back, so concurrent reservations are never undone.
+        This works without transactions, which need a replica set.
+
+        With a `token`, the reservation stays pending under it until
+        the caller has recorded it and calls `settle_reservation`.
+        Tokens a crash left behind are handled by
+        `release_stale_reservations`.
+        Raises ValueError for quantities that are not positive.
+        """
+        if any(quantity <= 0 for quantity in quantities.values()):
+            raise ValueError("Quantities must be positive")
+        if not quantities:
+            return True
+
+        settle = token is None
+        token = token or ObjectId()
+        result = await Product.get_pymongo_collection().bulk_write([
+            UpdateOne(
+                {"_id": id, "stock": {"$gte": quantity}},
+                {
+                    "$inc": {"stock": -quantity},
+                    "$push": {RESERVATIONS_FIELD: {
+                        "token": token, "quantity": quantity,
+                    }},
+                },
+            )
+            for id, quantity in quantities.items()
+        ], ordered=False)
+        reserved = result.modified_count == len(quantities)
+
+        if reserved and settle:
+            await self.settle_reservation(quantities, token)
+        elif not reserved and result.modified_count:
+            await self.release_reservation(quantities, token)
+        self._invalidate(*quantities)
+        return reserved
+
+    async def settle_reservation(
+        self, product_ids: Iterable[PydanticObjectId], token: ObjectId
+    ):
+        """Drop a reservation token, its stock stays taken."""
+        await Product.get_pymongo_collection().update_many(
+            {"_id": {"$in": list(product_ids)}},
+            {"$pull": {RESERVATIONS_FIELD: {"token": token}}},
+        )
+
+    async def release_reservation(
+        self, quantities: Dict[PydanticObjectId, int], token: ObjectId
+    ):
+        """
+        Put back the stock of a pending reservation. Only products still
+        holding its token are updated, so it is put back at most once.
+        """
+        await Product.get_pymongo_collection().bulk_write([
+            UpdateOne(
+                {"_id": id, RESERVATION_TOKEN: token},
+                {
+                    "$inc": {"stock": quantity},
+                    "$pull": {RESERVATIONS_FIELD: {"token": token}},
+                },
+            )
+            for id, quantity in quantities.items()
+        ], ordered=False)
+        self._invalidate(*quantities)
+
+    async def release_stock(self, quantities: Dict[PydanticObjectId, int]):
+        """Put reserved quantities back into stock with one bulk_write."""
+        if not quantities:
+            return
+
+        await Product.get_pymongo_collection().bulk_write([
+            UpdateOne({"_id": id}, {"$inc": {"stock": quantity}})
+            for id, quantity in quantities.items()
+        ], ordered=False)
+        self._invalidate(*quantities)
+
+    async def release_stale_reservations(
+        self,
+        before: datetime,
+        held: Optional[
+            Callable[[Set[ObjectId]], Awaitable[Set[ObjectId]]]] = None,
+    ) -> int:
+        """
+        Settle the reservations taken before `before` and still pending,
+        which a process that died before settling them left behind.
+
+        `held` gets their tokens and returns those an order was saved
+        with: the order holds their stock, so they are only settled.
+        The stock of the others is put back. Each token is handled by
+        an update matching it, so its stock is only put back once.
+        Returns the number of reservations settled or released.
+        """
+        collection = Product.get_pymongo_collection()
+        rows = await collection.find(
+            self._stale_filter(before), {RESERVATIONS_FIELD: 1}).to_list()
+        cutoff = ObjectId.from_datetime(before)
+        stale = [
+            (row["_id"], reservation)
+            for row in rows
+            for reservation in row[RESERVATIONS_FIELD]
+            if reservation["token"] < cutoff
+        ]
+        if not stale:
+            return 0
+
+        tokens = {reservation["token"] for _, reservation in stale}
+        kept = await held(tokens) if held is not None else set()
+        operations = []
+        for id, reservation in stale:
+            token = reservation["token"]
+            update: Dict[str, Any] = {
+                "$pull": {RESERVATIONS_FIELD: {"token": token}}}
+            if token not in kept:
+                update["$inc"] = {"stock": reservation["quantity"]}
+            operations.append(
+                UpdateOne({"_id": id, RESERVATION_TOKEN: token}, update))
+
+        result = await collection.bulk_write(operations, ordered=False)
+        self._invalidate(*[row["_id"] for row in rows])
+        return result.modified_count
+
+    @staticmethod
+    def _stale_filter(before: datetime) -> Dict[str, Any]:
+        # Tokens are ObjectIds, which start with their creation time.
+        return {RESERVATION_TOKEN: {
+            "$exists": True, "$lt": ObjectId.from_datetime(before),
+        }}
 
 
 product_service = ProductService()
@@ -0,0 +1,49 @@
+from datetime import datetime
+from typing import Optional
+
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+from pymongo import ASCENDING, IndexModel
+
+from ...core.models.base import TimestampDocument
+
+
+class SalesTotals(BaseModel):
+    revenue: float = 0.0
+    units: int = 0
+    orders: int = 0
+
+
+class DailySales(TimestampDocument, SalesTotals):
+    """Paid orders of one day (UTC)."""
+    day: datetime
+
+    class Settings:
+        name = "sales_daily"
+        indexes = [IndexModel([("day", ASCENDING)], unique=True)]
+
+
+class ProductSales(TimestampDocument, SalesTotals):
+    """Sales of one product on one day."""
+    day: datetime
+    product_id: PydanticObjectId
+
+    class Settings:
+        name = "sales_by_product"
+        indexes = [
+            IndexModel(
+                [("day", ASCENDING), ("product_id", ASCENDING)], unique=True)
+        ]
+
+
+class CategorySales(TimestampDocument, SalesTotals):
+    """Sales of the products of one category on one day."""
+    day: datetime
+    category_id: Optional[PydanticObjectId] = None  # None: uncategorized
+
+    class Settings:
+        name = "sales_by_category"
+        indexes = [
+            IndexModel(
+                [("day", ASCENDING), ("category_id", ASCENDING)], unique=True)
+        ]
@@ -0,0 +1,20 @@
+"""
+Recompute the sales rollups from the orders:
+
+    python -m src.modules.reports.rebuild
+"""
+import asyncio
+
+from .service import sales_service
+from ...core.db import get_db
+
+
+async def main():
+    await get_db()
+    counts = await sales_service.rebuild()
+    for collection, count in counts.items():
+        print(f"{collection}: {count} buckets")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
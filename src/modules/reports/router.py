@@ -0,0 +1,47 @@
+from datetime import date
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from .schemas import (
+    CategorySalesResponse, DailySalesResponse, ProductSalesResponse
+)
+from .service import sales_service
+
+router = APIRouter(prefix="/reports/sales", tags=["Reports"])
+
+
+class SalesPeriod:
+    """Days a report covers, both ends included. Open ended if missing."""
+
+    def __init__(
+        self,
+        start: Optional[date] = Query(None, alias="from"),
+        end: Optional[date] = Query(None, alias="to"),
+    ):
+        if start and end and start > end:
+            raise HTTPException(
+                status_code=400, detail="`from` must not be after `to`")
+        self.start = start
+        self.end = end
+
+
+@router.get("/daily", response_model=List[DailySalesResponse])
+async def get_daily_sales(period: SalesPeriod = Depends()):
+    return await sales_service.daily(period.start, period.end)
+
+
+@router.get("/products", response_model=List[ProductSalesResponse])
+async def get_product_sales(
+    period: SalesPeriod = Depends(),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    return await sales_service.by_product(period.start, period.end, limit)
+
+
+@router.get("/categories", response_model=List[CategorySalesResponse])
+async def get_category_sales(
+    period: SalesPeriod = Depends(),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    return await sales_service.by_category(period.start, period.end, limit)
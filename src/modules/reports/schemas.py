@@ -0,0 +1,23 @@
+from datetime import date
+from typing import Optional
+
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+
+class SalesTotalsResponse(BaseModel):
+    revenue: float
+    units: int
+    orders: int
+
+
+class DailySalesResponse(SalesTotalsResponse):
+    day: date
+
+
+class ProductSalesResponse(SalesTotalsResponse):
+    product_id: PydanticObjectId
+
+
+class CategorySalesResponse(SalesTotalsResponse):
+    category_id: Optional[PydanticObjectId] = None
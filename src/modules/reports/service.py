@@ -0,0 +1,348 @@
+import asyncio
+from datetime import date, datetime, time, timezone
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from beanie import Document, PydanticObjectId
+from pymongo import ReplaceOne, UpdateOne
+
+from .models import CategorySales, DailySales, ProductSales, SalesTotals
+from ..orders.models import PAID_STATUSES, Order
+from ..products.models import Product
+from ...core.services.explain import QueryShape
+
+REBUILD_BATCH_SIZE = 1000
+
+Bucket = Tuple[Dict[str, Any], SalesTotals]
+
+
+def sales_day(moment: datetime) -> datetime:
+    """Midnight (UTC) of the day a moment falls on, as Mongo stores it."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return datetime(moment.year, moment.month, moment.day)
+
+
+def _ref_id(expression: Any) -> Dict[str, Any]:
+    """
+    Aggregation expression for the id of a DBRef. Its `$id` field can
+    not be used as a field path, so it is read from `$objectToArray`.
+    """
+    pairs = {"$objectToArray": {"$ifNull": [expression, {}]}}
+    return {"$let": {
+        "vars": {"ref": {"$arrayElemAt": [pairs, 1]}},
+        "in": "$$ref.v",
+    }}
+
+
+# Paid orders with the day they were paid on. Orders paid before
+# paid_at existed fall back to their last update.
+_PAID_ORDERS = [
+    {"$match": {"status": {"$in": list(PAID_STATUSES)}}},
+    {"$project": {
+        "total_price": 1,
+        "items": 1,
+        "day": {"$let": {
+            "vars": {"at": {"$ifNull": ["$paid_at", "$updated_at"]}},
+            "in": {"$dateFromParts": {
+                "year": {"$year": "$$at"},
+                "month": {"$month": "$$at"},
+                "day": {"$dayOfMonth": "$$at"},
+            }},
+        }},
+    }},
+]
+
+# One row per order and product, an order may list a product twice.
+# Items hold the product as it was ordered, or a DBRef to it.
+_ORDER_LINES = _PAID_ORDERS + [
+    {"$unwind": "$items"},
+    {"$project": {
+        "day": 1,
+        "product_id": {"$ifNull": [
+            "$items.product._id", _ref_id("$items.product")]},
+        "subtotal": "$items.subtotal",
+        "quantity": "$items.quantity",
+    }},
+    {"$group": {
+        "_id": {"order": "$_id", "product_id": "$product_id"},
+        "day": {"$first": "$day"},
+        "revenue": {"$sum": "$subtotal"},
+        "units": {"$sum": "$quantity"},
+    }},
+]
+
+
+def _per_day(key: str) -> List[Dict[str, Any]]:
+    return [{"$group": {
+        "_id": {"day": "$day", key: f"$_id.{key}"},
+        "revenue": {"$sum": "$revenue"},
+        "units": {"$sum": "$units"},
+        "orders": {"$sum": 1},
+    }}]
+
+
+class SalesService:
+    """
+    Revenue, units sold and order counts of paid orders, kept in rollup
+    collections by day, by product and day and by category and day.
+
+    Captures add to the buckets with `$inc` upserts as orders are paid,
+    `rebuild` recomputes them from the orders. Reports only ever read
+    the buckets.
+    """
+
+    async def record_paid_order(self, order: Order):
+        """Add a newly paid order to the rollups."""
+        day = sales_day(order.paid_at or datetime.now(timezone.utc))
+
+        products: Dict[PydanticObjectId, SalesTotals] = {}
+        for item in order.items:
+            totals = products.setdefault(item.product_id, SalesTotals())
+            totals.revenue += item.subtotal
+            totals.units += item.quantity
+
+        categories: Dict[Optional[PydanticObjectId], SalesTotals] = {}
+        category_ids = await self._category_ids(list(products))
+        for product_id, line in products.items():
+            totals = categories.setdefault(
+                category_ids.get(product_id), SalesTotals())
+            totals.revenue += line.revenue
+            totals.units += line.units
+
+        for totals in (*products.values(), *categories.values()):
+            totals.orders = 1
+        order_totals = SalesTotals(
+            revenue=order.total_price,
+            units=sum(line.units for line in products.values()),
+            orders=1,
+        )
+
+        await asyncio.gather(
+            self._increment(DailySales, [({"day": day}, order_totals)]),
+            self._increment(ProductSales, [
+                ({"day": day, "product_id": id}, totals)
+                for id, totals in products.items()
+            ]),
+            self._increment(CategorySales, [
+                ({"day": day, "category_id": id}, totals)
+                for id, totals in categories.items()
+            ]),
+        )
+
+    async def rebuild(self) -> Dict[str, int]:
+        """
+        Recompute every bucket from the orders with `$group`
+        aggregations and drop the buckets no order falls in anymore.
+        Returns the number of buckets written per rollup.
+
+        Orders paid while it runs may be counted twice or missed, run
+        it when captures are quiet.
+        """
+        started = datetime.now(timezone.utc)
+        products = Product.get_collection_name()
+        pipelines = [
+            _PAID_ORDERS + [{"$group": {
+                "_id": {"day": "$day"},
+                "revenue": {"$sum": "$total_price"},
+                "units": {"$sum": {"$sum": "$items.quantity"}},
+                "orders": {"$sum": 1},
+            }}],
+            _ORDER_LINES + _per_day("product_id"),
+            _ORDER_LINES + [
+                {"$lookup": {
+                    "from": products,
+                    "localField": "_id.product_id",
+                    "foreignField": "_id",
+                    "as": "product",
+                }},
+                {"$project": {
+                    "day": 1,
+                    "revenue": 1,
+                    "units": 1,
+                    "category_id": _ref_id(
+                        {"$arrayElemAt": ["$product.category", 0]}),
+                }},
+                {"$group": {
+                    "_id": {
+                        "order": "$_id.order",
+                        "category_id": "$category_id",
+                    },
+                    "day": {"$first": "$day"},
+                    "revenue": {"$sum": "$revenue"},
+                    "units": {"$sum": "$units"},
+                }},
+            ] + _per_day("category_id"),
+        ]
+        collection = Order.get_pymongo_collection()
+        rollups = await asyncio.gather(*[
+            self._aggregate(collection, pipeline) for pipeline in pipelines
+        ])
+
+        counts = {}
+        rollup_keys = [
+            (DailySales, ("day",)),
+            (ProductSales, ("day", "product_id")),
+            (CategorySales, ("day", "category_id")),
+        ]
+        for (model, keys), rows in zip(rollup_keys, rollups):
+            await self._replace(model, keys, rows, started)
+            counts[model.get_collection_name()] = len(rows)
+        return counts
+
+    def query_shapes(self) -> List[QueryShape]:
+        day = sales_day(datetime.now(timezone.utc))
+        period = {"day": {"$gte": day, "$lte": day}}
+        return [
+            QueryShape("daily", DailySales, period, [("day", 1)]),
+            QueryShape("by_product", ProductSales, period),
+            QueryShape("by_category", CategorySales, period),
+            QueryShape(
+                "record_paid_order", ProductSales,
+                {"day": day, "product_id": PydanticObjectId()}),
+            QueryShape(
+                "record_paid_order", CategorySales,
+                {"day": day, "category_id": PydanticObjectId()}),
+            QueryShape(
+                "category_ids", Product,
+                {"_id": {"$in": [PydanticObjectId()]}}),
+        ]
+
+    async def daily(
+        self, start: Optional[date] = None, end: Optional[date] = None
+    ) -> List[Dict[str, Any]]:
+        rows = await DailySales.get_pymongo_collection().find(
+            self._period(start, end),
+            {"_id": 0, "day": 1, "revenue": 1, "units": 1, "orders": 1},
+            sort=[("day", 1)],
+        ).to_list()
+        return [self._rounded(row) for row in rows]
+
+    async def by_product(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Best selling products of the period, by revenue."""
+        return await self._ranking(
+            ProductSales, "product_id", start, end, limit)
+
+    async def by_category(
+        self,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Best selling categories of the period, by revenue."""
+        return await self._ranking(
+            CategorySales, "category_id", start, end, limit)
+
+    async def _ranking(
+        self,
+        model: Type[Document],
+        key: str,
+        start: Optional[date],
+        end: Optional[date],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        rows = await self._aggregate(model.get_pymongo_collection(), [
+            {"$match": self._period(start, end)},
+            {"$group": {
+                "_id": f"${key}",
+                "revenue": {"$sum": "$revenue"},
+                "units": {"$sum": "$units"},
+                "orders": {"$sum": "$orders"},
+            }},
+            {"$sort": {"revenue": -1, "_id": 1}},
+            {"$limit": limit},
+        ])
+        return [
+            self._rounded({key: row.pop("_id"), **row}) for row in rows
+        ]
+
+    async def _category_ids(
+        self, product_ids: List[PydanticObjectId]
+    ) -> Dict[PydanticObjectId, Optional[PydanticObjectId]]:
+        rows = await Product.get_pymongo_collection().find(
+            {"_id": {"$in": product_ids}}, {"category": 1}
+        ).to_list()
+        return {
+            row["_id"]: row["category"].id if row.get("category") else None
+            for row in rows
+        }
+
+    @staticmethod
+    async def _increment(model: Type[Document], buckets: List[Bucket]):
+        if not buckets:
+            return
+
+        now = datetime.now(timezone.utc)
+        await model.get_pymongo_collection().bulk_write([
+            UpdateOne(
+                key,
+                {
+                    "$inc": totals.model_dump(),
+                    "$set": {"updated_at": now},
+                    "$setOnInsert": {"created_at": now},
+                },
+                upsert=True,
+            )
+            for key, totals in buckets
+        ], ordered=False)
+
+    @staticmethod
+    async def _replace(
+        model: Type[Document],
+        keys: Tuple[str, ...],
+        rows: List[Dict[str, Any]],
+        started: datetime,
+    ):
+        """
+        Write the rebuilt buckets, then delete the ones neither the
+        rebuild nor a capture touched since it started.
+        """
+        collection = model.get_pymongo_collection()
+        now = datetime.now(timezone.utc)
+        for offset in range(0, len(rows), REBUILD_BATCH_SIZE):
+            operations = []
+            for row in rows[offset:offset + REBUILD_BATCH_SIZE]:
+                # Aggregations leave out keys that are null.
+                key = {name: row["_id"].get(name) for name in keys}
+                operations.append(ReplaceOne(
+                    key,
+                    {
+                        **key,
+                        "revenue": row["revenue"],
+                        "units": row["units"],
+                        "orders": row["orders"],
+                        "created_at": now,
+                        "updated_at": now,
+                    },
+                    upsert=True,
+                ))
+            await collection.bulk_write(operations, ordered=False)
+        await collection.delete_many({"updated_at": {"$lt": started}})
+
+    @staticmethod
+    async def _aggregate(collection, pipeline) -> List[Dict[str, Any]]:
+        cursor = await collection.aggregate(pipeline)
+        return await cursor.to_list()
+
+    @staticmethod
+    def _period(
+        start: Optional[date], end: Optional[date]
+    ) -> Dict[str, Any]:
+        day = {}
+        if start is not None:
+            day["$gte"] = datetime.combine(start, time.min)
+        if end is not None:
+            day["$lte"] = datetime.combine(end, time.min)
+        return {"day": day} if day else {}
+
+    @staticmethod
+    def _rounded(row: Dict[str, Any]) -> Dict[str, Any]:
+        row["revenue"] = round(row["revenue"], 2)
+        return row
+
+
+sales_service = SalesService()
@@ -4,6 +4,7 @@ from pydantic import EmailStr
 from typing import Optional
 from beanie import Indexed
 from ...core.models.base import TimestampDocument
+from ...core.models.snapshot import Snapshot
 
 
 class User(TimestampDocument):
@@ -16,3 +17,8 @@ class User(TimestampDocument):
 
     class Settings:
         name = "users"
+
+
+class UserSnapshot(Snapshot):
+    email: str
+    full_name: Optional[str] = None
@@ -1,12 +1,26 @@
 
-from typing import List
+import asyncio
+from typing import List, Optional
 from beanie import PydanticObjectId
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 
 from ...core.auth.security_service import SecurityService
+from ...core.services.pagination import PageQuery, paginate
+from ...core.services.projection import Fields, SparseFields, sparse_response
+from ...core.services.streaming import ndjson_response
+from ...core.services.trusted import trusted_response
 
-from .schemas import UserCreate, UserResponse, UserUpdate
+from .schemas import UserBulkUpdate, UserCreate, UserResponse, UserUpdate
 from .service import user_service
+from ..orders.router import (
+    ORDER_LIST_RESPONSE, SUMMARY_DESCRIPTION, order_list_response
+)
+from ..orders.schemas import OrderResponse
+from ..orders.service import order_page_query, order_service
+from ...core.services.bulk import (
+    BulkCreateRequest, BulkDeleteRequest, BulkResult, BulkUpdateRequest
+)
 
 router = APIRouter(prefix="/users", tags=["Users"])
 
@@ -23,24 +37,89 @@ async def create_user(user_data: UserCreate):
 
 
 @router.get("/", response_model=List[UserResponse])
-async def list_users():
-    return await user_service.find_all()
+async def list_users(
+    response: Response,
+    page_query: PageQuery = Depends(),
+    fields: Optional[Fields] = Depends(SparseFields(UserResponse)),
+):
+    users = await paginate(
+        user_service, page_query, response, fields=fields, trusted=True)
+    if fields:
+        return sparse_response(users, UserResponse, fields, response)
+    return trusted_response(users, UserResponse, response)
+
+
+@router.get("/export")
+async def export_users():
+    return ndjson_response(user_service.stream(), UserResponse, "users.ndjson")
+
+
+@router.post("/bulk", response_model=BulkResult)
+async def bulk_create_users(request: BulkCreateRequest[UserCreate]):
+    # Hashing is CPU bound, so run it on the thread pool
+    # instead of blocking the event loop for the whole batch.
+    hashed_passwords = await asyncio.gather(*[
+        run_in_threadpool(SecurityService.hash_password, item.password)
+        for item in request.items
+    ])
+    rows = [
+        item.model_copy(update={"password": password}).model_dump(
+            exclude_none=True)
+        for item, password in zip(request.items, hashed_passwords)
+    ]
+    return await user_service.bulk_create(rows, ordered=request.ordered)
+
+
+@router.put("/bulk", response_model=BulkResult)
+async def bulk_update_users(request: BulkUpdateRequest[UserBulkUpdate]):
+    rows = [
+        (item.id, item.model_dump(exclude={"id"}, exclude_unset=True))
+        for item in request.items
+    ]
+    return await user_service.bulk_update(rows, ordered=request.ordered)
+
+
+@router.delete("/bulk", response_model=BulkResult)
+async def bulk_delete_users(request: BulkDeleteRequest):
+    return await user_service.bulk_delete(
+        request.ids, ordered=request.ordered)
 
 
 @router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: PydanticObjectId):
-    user = await user_service.find_one(user_id)
+async def get_user(
+    user_id: PydanticObjectId,
+    fields: Optional[Fields] = Depends(SparseFields(UserResponse)),
+):
+    try:
+        user = await user_service.find_one(user_id, fields=fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if fields:
+        return sparse_response(user, UserResponse, fields)
     return user
 
 
+@router.get("/{user_id}/orders", response_model=ORDER_LIST_RESPONSE)
+async def get_user_orders(
+    user_id: PydanticObjectId,
+    response: Response,
+    page_query: PageQuery = Depends(),
+    status: Optional[str] = Query(None),
+    fields: Optional[Fields] = Depends(SparseFields(OrderResponse)),
+    summary: bool = Query(False, description=SUMMARY_DESCRIPTION),
+):
+    """Order history of a user, newest first."""
+    orders = await paginate(
+        order_service, page_query, response, fields=fields,
+        **order_page_query(
+            status=status, user_id=user_id, summary=summary))
+    return order_list_response(orders, response, fields, summary)
+
+
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(user_id: PydanticObjectId, update_data: UserUpdate):
-    user = await user_service.find_one(user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
     update_dict = update_data.model_dump(exclude_unset=True)
     user = await user_service.update(user_id, update_dict)
     if not user:
@@ -17,6 +17,10 @@ class UserUpdate(BaseModel):
     email_verified: Optional[bool] = None
 
 
+class UserBulkUpdate(UserUpdate):
+    id: PydanticObjectId
+
+
 class UserChangePassword(BaseModel):
     password: str
 
@@ -1,10 +1,19 @@
+from typing import List
+
 from .models import User
 from ...core.services.base import BaseService
+from ...core.services.cache import document_cache
+from ...core.services.explain import QueryShape
 
 
 class UserService(BaseService[User]):
     def __init__(self):
-        super().__init__(User)
+        super().__init__(User, cache=document_cache())
+
+    def query_shapes(self) -> List[QueryShape]:
+        return super().query_shapes() + [
+            QueryShape("find_by_email", User, {"email": "user@example.com"}),
+        ]
 
     async def find_by_email(self, email: str):
         return await User.find_one(User.email == email)
@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import pytest
+from beanie import PydanticObjectId
+
+from src.core.libs.paypal import paypal_payload
+from src.core.libs.paypal.paypal_builder import PayPalRequestBuilder
+from src.core.libs.paypal.paypal_type import (
+    PayPalConfirmPaymentSourceRequest, PayPalOrderRequest
+)
+
+
+def product(name, price):
+    return SimpleNamespace(id=PydanticObjectId(), name=name, price=price)
+
+
+def order(lines, full_name="Ann Marie Lee"):
+    items = [
+        SimpleNamespace(
+            product=item_product, product_snapshot=None, quantity=quantity,
+            subtotal=item_product.price * quantity)
+        for item_product, quantity in lines
+    ]
+    return SimpleNamespace(
+        id=PydanticObjectId(),
+        user=SimpleNamespace(email="ann@example.com", full_name=full_name),
+        user_snapshot=None,
+        items=items,
+        total_price=sum(item.subtotal for item in items),
+    )
+
+
+def dumped(order):
+    """The order as `order.model_dump()` hands it to the old builder."""
+    return {
+        "id": order.id,
+        "total_price": order.total_price,
+        "user": vars(order.user),
+        "items": [
+            {"product": vars(item.product), "quantity": item.quantity}
+            for item in order.items
+        ],
+    }
+
+
+def test_builds_the_same_bodies_as_the_request_models():
+    paid_order = order([
+        (product("Phone", 199.99), 2),
+        (product("Case", 5), 1),
+    ])
+
+    assert paypal_payload.order_request(paid_order) == (
+        PayPalRequestBuilder.build(dumped(paid_order), PayPalOrderRequest))
+    assert paypal_payload.confirm_payment_source_request(paid_order) == (
+        PayPalRequestBuilder.build(
+            dumped(paid_order), PayPalConfirmPaymentSourceRequest))
+
+
+def test_item_total_matches_the_lines():
+    body = paypal_payload.order_request(order([(product("Bolt", 1.005), 3)]))
+
+    unit = body["purchase_units"][0]
+    assert unit["items"][0]["unit_amount"]["value"] == "1.01"
+    assert unit["amount"]["value"] == "3.03"
+    assert unit["amount"]["breakdown"]["item_total"]["value"] == "3.03"
+
+
+def test_reads_snapshots_first():
+    snapshot_order = order([(product("Renamed", 12.5), 1)])
+    snapshot = product("As ordered", 10)
+    snapshot_order.items[0].product_snapshot = snapshot
+
+    item = paypal_payload.order_request(
+        snapshot_order)["purchase_units"][0]["items"][0]
+
+    assert item["name"] == "As ordered"
+    assert item["unit_amount"]["value"] == "10.00"
+    assert item["sku"] == str(snapshot.id)
+
+
+@pytest.mark.parametrize("amount, cents, text", [
+    (0, 0, "0.00"),
+    (0.1, 10, "0.10"),
+    (19.999, 2000, "20.00"),
+    (2.675, 268, "2.68"),
+    (-4.5, -450, "-4.50"),
+])
+def test_cents(amount, cents, text):
+    assert paypal_payload.to_cents(amount) == cents
+    assert paypal_payload.format_cents(cents) == text
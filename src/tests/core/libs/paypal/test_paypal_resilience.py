@@ -0,0 +1,86 @@
+import httpx
+import pytest
+
+from src.core.libs.paypal import paypal_service
+from src.core.libs.paypal.paypal_simulator import create_paypal_simulator
+from src.core.services.circuit_breaker import CircuitBreaker, CircuitOpenError
+
+
+class Upstream:
+    """PayPal answering the order reads with the given statuses."""
+
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+        self.reads = 0
+
+    def __call__(self, request):
+        if request.url.path == "/v1/oauth2/token":
+            return httpx.Response(
+                200, json={"access_token": "token", "expires_in": 3600})
+        self.reads += 1
+        status = self.statuses.pop(0) if self.statuses else 200
+        return httpx.Response(status, json={"id": "ORDER", "status": "OK"})
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    monkeypatch.setattr(
+        paypal_service.paypal_config, "retry_base_seconds", 0.0)
+    monkeypatch.setattr(
+        paypal_service, "breaker",
+        CircuitBreaker("PayPal", failure_threshold=3, reset_seconds=30))
+
+    def use(*statuses):
+        upstream = Upstream(*statuses)
+        paypal_service.use_transport(httpx.MockTransport(upstream))
+        return upstream
+
+    yield use
+    paypal_service.use_transport(None)
+
+
+async def test_idempotent_calls_are_retried(upstream):
+    server = upstream(503, 502)
+
+    detail = await paypal_service.get_order_detail("ORDER")
+
+    assert detail["status"] == "OK"
+    assert server.reads == 3
+    assert paypal_service.breaker.state == "closed"
+
+
+async def test_other_calls_are_sent_once(upstream):
+    server = upstream(503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await paypal_service.confirm_payment_source("ORDER", {})
+
+    assert server.reads == 1
+
+
+async def test_circuit_opens_and_fails_fast(upstream):
+    server = upstream(*[503] * 3)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await paypal_service.get_order_detail("ORDER")
+    with pytest.raises(CircuitOpenError):
+        await paypal_service.get_order_detail("ORDER")
+
+    assert server.reads == 3
+    assert paypal_service.breaker.state == "open"
+
+
+async def test_simulator_injects_errors():
+    app = create_paypal_simulator(error_rate=1.0, seed=1)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://paypal"
+    ) as client:
+        response = await client.post("/v1/oauth2/token")
+        assert response.status_code == 503
+
+        app.state.error_rate = 0.0
+        response = await client.post("/v1/oauth2/token")
+        assert response.status_code == 200
+
+    assert app.state.calls["/v1/oauth2/token"] == 2
+    assert app.state.errors["/v1/oauth2/token"] == 1
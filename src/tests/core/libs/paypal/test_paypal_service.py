@@ -0,0 +1,36 @@
+import httpx
+
+from src.core.libs.paypal import paypal_service
+from src.core.libs.paypal.paypal_simulator import create_paypal_simulator
+
+
+async def test_calls_share_one_client():
+    paypal_service.use_transport(
+        httpx.ASGITransport(app=create_paypal_simulator()))
+    try:
+        await paypal_service.open_client()
+        client = paypal_service.client()
+
+        order = await paypal_service.create_order({})
+        await paypal_service.get_order_detail(order["id"])
+
+        assert paypal_service.client() is client
+        assert not client.is_closed
+    finally:
+        await paypal_service.close_client()
+        paypal_service.use_transport(None)
+
+    assert client.is_closed
+    assert paypal_service.client() is not client
+    await paypal_service.close_client()
+
+
+def test_use_transport_replaces_the_client():
+    client = paypal_service.client()
+
+    paypal_service.use_transport(
+        httpx.ASGITransport(app=create_paypal_simulator()))
+    try:
+        assert paypal_service.client() is not client
+    finally:
+        paypal_service.use_transport(None)
@@ -0,0 +1,55 @@
+import httpx
+import pytest
+
+from src.core.libs.paypal import paypal_service
+from src.core.libs.paypal.paypal_simulator import (
+    create_paypal_simulator, webhook_headers
+)
+
+
+@pytest.fixture
+def simulator():
+    app = create_paypal_simulator()
+    paypal_service.use_transport(httpx.ASGITransport(app=app))
+    yield app
+    paypal_service.use_transport(None)
+
+
+async def test_checkout_flow(simulator):
+    order = await paypal_service.create_order(
+        {"intent": "CAPTURE", "purchase_units": []})
+    assert order["status"] == "CREATED"
+
+    confirmed = await paypal_service.confirm_payment_source(
+        order["id"], {"payment_source": {"paypal": {}}})
+    assert confirmed["status"] == "PAYER_ACTION_REQUIRED"
+    assert confirmed["links"][1]["rel"] == "payer-action"
+
+    captured = await paypal_service.capture_order(order["id"])
+    detail = await paypal_service.get_order_detail(order["id"])
+    assert captured["status"] == detail["status"] == "COMPLETED"
+
+
+async def test_create_is_idempotent_by_request_id(simulator):
+    first = await paypal_service.create_order({}, request_id="order-1")
+    second = await paypal_service.create_order({}, request_id="order-1")
+    other = await paypal_service.create_order({}, request_id="order-2")
+
+    assert first["id"] == second["id"]
+    assert other["id"] != first["id"]
+
+
+async def test_unknown_order(simulator):
+    with pytest.raises(httpx.HTTPStatusError):
+        await paypal_service.get_order_detail("MISSING")
+
+
+async def test_verifies_webhook_signatures(simulator, monkeypatch):
+    monkeypatch.setattr(paypal_service.paypal_config, "webhook_id", "WH-ID")
+    event = {"id": "WH-1", "event_type": "CHECKOUT.ORDER.APPROVED"}
+
+    assert await paypal_service.verify_webhook_signature(
+        webhook_headers(event, "WH-ID"), event)
+    assert not await paypal_service.verify_webhook_signature(
+        webhook_headers(event, "OTHER-WEBHOOK"), event)
+    assert not await paypal_service.verify_webhook_signature({}, event)
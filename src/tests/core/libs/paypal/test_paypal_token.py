@@ -0,0 +1,125 @@
+import asyncio
+
+import httpx
+import pytest
+
+from src.core.libs.paypal import paypal_service
+from src.core.libs.paypal.paypal_simulator import create_paypal_simulator
+from src.core.libs.paypal.paypal_token import TokenManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenServer:
+    def __init__(self, expires_in=3600):
+        self.expires_in = expires_in
+        self.calls = 0
+        self.fail = False
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise httpx.ConnectError("down")
+        return {
+            "access_token": f"t{self.calls}", "expires_in": self.expires_in}
+
+
+def make_manager(server, clock):
+    return TokenManager(
+        server, expiry_margin=60, refresh_ahead=300, clock=clock)
+
+
+async def test_caches_the_token_until_shortly_before_expiry():
+    clock = FakeClock()
+    server = TokenServer()
+    tokens = make_manager(server, clock)
+
+    assert await tokens.get() == "t1"
+    clock.now = 3000
+    assert await tokens.get() == "t1"
+    clock.now = 3541
+    assert await tokens.get() == "t2"
+    assert server.calls == 2
+
+
+async def test_concurrent_callers_share_one_fetch():
+    server = TokenServer()
+    tokens = make_manager(server, FakeClock())
+
+    values = await asyncio.gather(*[tokens.get() for _ in range(10)])
+
+    assert values == ["t1"] * 10
+    assert server.calls == 1
+
+
+async def test_refreshes_ahead_of_expiry_in_the_background():
+    clock = FakeClock()
+    server = TokenServer()
+    tokens = make_manager(server, clock)
+    await tokens.get()
+
+    clock.now = 3400
+    assert await tokens.get() == "t1"
+    await asyncio.sleep(0.02)
+
+    assert server.calls == 2
+    assert await tokens.get() == "t2"
+
+
+async def test_background_failure_keeps_the_cached_token():
+    clock = FakeClock()
+    server = TokenServer()
+    tokens = make_manager(server, clock)
+    await tokens.get()
+
+    server.fail = True
+    clock.now = 3400
+    assert await tokens.get() == "t1"
+    await asyncio.sleep(0.02)
+    assert await tokens.get() == "t1"
+
+    clock.now = 3600
+    with pytest.raises(httpx.ConnectError):
+        await tokens.get()
+
+
+async def test_rejected_token_is_refreshed_once():
+    server = TokenServer()
+    tokens = make_manager(server, FakeClock())
+    rejected = await tokens.get()
+
+    values = await asyncio.gather(
+        *[tokens.refresh(rejected) for _ in range(5)])
+    again = await tokens.refresh(rejected)
+
+    assert values == ["t2"] * 5
+    assert again == "t2"
+    assert server.calls == 2
+
+
+async def test_calls_retry_once_with_a_new_token_on_401():
+    app = create_paypal_simulator()
+    paypal_service.use_transport(httpx.ASGITransport(app=app))
+    try:
+        order = await paypal_service.create_order({})
+        fetches = paypal_service.tokens.fetches
+
+        await paypal_service.get_order_detail(order["id"])
+        assert paypal_service.tokens.fetches == fetches
+
+        # PayPal revoked the cached token.
+        app.state.tokens.clear()
+        detail = await paypal_service.get_order_detail(order["id"])
+
+        assert detail["id"] == order["id"]
+        assert paypal_service.tokens.fetches == fetches + 1
+    finally:
+        await paypal_service.close_client()
+        paypal_service.use_transport(None)
@@ -0,0 +1,66 @@
+from beanie import PydanticObjectId
+
+from src.core.models.snapshot import (
+    SnapshotField, snapshot_paths, snapshot_plan, snapshot_slots
+)
+from src.core.services.base import BaseService
+from src.modules.categories.models import CategorySnapshot
+from src.modules.orders.models import Order, OrderItem
+from src.modules.products.models import Product, ProductSnapshot
+from src.modules.users.models import User, UserSnapshot
+
+
+def make_order():
+    user = User.model_construct(
+        id=PydanticObjectId(), email="user@example.com", full_name="Jane")
+    product = Product.model_construct(
+        id=PydanticObjectId(), name="Phone", price=9.99, category=None)
+    items = [
+        OrderItem.model_construct(product=product, quantity=1, subtotal=9.99)
+        for _ in range(2)
+    ]
+    return Order.model_construct(
+        id=PydanticObjectId(), user=user, items=items, total_price=19.98)
+
+
+def test_plan_lists_snapshots_and_embedded_models():
+    assert snapshot_plan(Order).snapshots == (
+        SnapshotField("user_snapshot", "user", UserSnapshot),
+    )
+    assert snapshot_plan(Order).embedded == ("items",)
+    assert snapshot_plan(OrderItem).snapshots == (
+        SnapshotField("product_snapshot", "product", ProductSnapshot),
+    )
+    assert snapshot_plan(Product).snapshots == (
+        SnapshotField("category_snapshot", "category", CategorySnapshot),
+    )
+    assert snapshot_plan(User) == ((), ())
+
+
+def test_paths_reach_embedded_snapshots():
+    assert snapshot_paths(Order) == [
+        "user_snapshot", "items.product_snapshot"]
+    assert snapshot_paths(User) == []
+
+
+def test_slots_carry_the_path_of_each_snapshot():
+    order = make_order()
+
+    paths = [path for path, _, _ in snapshot_slots(order)]
+
+    assert paths == [
+        "user_snapshot",
+        "items.0.product_snapshot",
+        "items.1.product_snapshot",
+    ]
+
+
+async def test_takes_snapshots_of_loaded_links():
+    order = make_order()
+
+    await BaseService(Order)._take_snapshots([order])
+
+    assert order.user_snapshot == UserSnapshot(
+        id=order.user.id, email="user@example.com", full_name="Jane")
+    assert order.items[0].product_snapshot == ProductSnapshot(
+        id=order.items[0].product.id, name="Phone", price=9.99)
@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+from typing import ClassVar, Optional
+
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+from src.core.services.base import BaseService
+from src.core.services.bulk import NOT_APPLIED
+
+
+class Cursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def to_list(self, length=None):
+        return self.rows
+
+
+class Collection:
+    def __init__(self, ids):
+        self.ids = set(ids)
+        self.writes = []
+
+    def find(self, filter, projection=None):
+        wanted = filter["_id"]["$in"]
+        return Cursor([{"_id": id} for id in wanted if id in self.ids])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes.append(operations)
+
+
+class Item(BaseModel):
+    name: str = ""
+
+    collection: ClassVar[Optional[Collection]] = None
+
+    @classmethod
+    def get_pymongo_collection(cls):
+        return cls.collection
+
+    @classmethod
+    def get_collection_name(cls):
+        return "items"
+
+    @classmethod
+    def get_settings(cls):
+        return SimpleNamespace(bson_encoders={})
+
+
+def service_with(ids):
+    Item.collection = Collection(ids)
+    return BaseService(Item), Item.collection
+
+
+async def test_ordered_delete_stops_at_unknown_id():
+    known = [PydanticObjectId() for _ in range(3)]
+    missing = PydanticObjectId()
+    service, collection = service_with(known)
+
+    result = await service.bulk_delete(
+        [known[0], missing, known[1], known[2]], ordered=True)
+
+    assert result.count == 1
+    assert result.ids == [known[0]]
+    assert [(e.index, e.id, e.detail) for e in result.errors] == [
+        (1, missing, "Not found"),
+        (2, known[1], NOT_APPLIED),
+        (3, known[2], NOT_APPLIED),
+    ]
+    assert [op._filter for op in collection.writes[0]] == [
+        {"_id": known[0]}]
+
+
+async def test_unordered_delete_skips_unknown_id():
+    known = [PydanticObjectId() for _ in range(2)]
+    missing = PydanticObjectId()
+    service, collection = service_with(known)
+
+    result = await service.bulk_delete([known[0], missing, known[1]])
+
+    assert result.ids == known
+    assert [(e.index, e.detail) for e in result.errors] == [
+        (1, "Not found")]
+    assert len(collection.writes[0]) == 2
+
+
+async def test_ordered_update_stops_at_empty_row():
+    ids = [PydanticObjectId() for _ in range(3)]
+    service, collection = service_with(ids)
+
+    result = await service.bulk_update([
+        (ids[0], {"name": "a"}),
+        (ids[1], {}),
+        (ids[2], {"name": "c"}),
+    ], ordered=True)
+
+    assert result.ids == [ids[0]]
+    assert [(e.index, e.id, e.detail) for e in result.errors] == [
+        (1, ids[1], "Nothing to update"),
+        (2, ids[2], NOT_APPLIED),
+    ]
+    assert len(collection.writes[0]) == 1
+
+
+async def test_ordered_update_with_first_row_unknown_writes_nothing():
+    ids = [PydanticObjectId() for _ in range(2)]
+    service, collection = service_with(ids[1:])
+
+    result = await service.bulk_update([
+        (ids[0], {"name": "a"}),
+        (ids[1], {"name": "b"}),
+    ], ordered=True)
+
+    assert result.count == 0
+    assert [e.detail for e in result.errors] == ["Not found", NOT_APPLIED]
+    assert collection.writes == []
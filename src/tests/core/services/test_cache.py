@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+from beanie import PydanticObjectId
+from pydantic import BaseModel
+
+from src.core.config.cache_configuration import CacheSettings
+from src.core.services.base import BaseService
+from src.core.services.cache import CoalescingCache, LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_counts_hits_and_misses():
+    cache = LRUCache(max_size=2, ttl=10)
+
+    cache.set("a", 1)
+
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    cache = LRUCache(max_size=2, ttl=10)
+
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.evictions == 1
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = LRUCache(max_size=2, ttl=10, clock=clock)
+
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+    clock.now = 15
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.expirations == 1
+    assert len(cache) == 1
+
+
+def test_invalidate_removes_entry():
+    cache = LRUCache()
+
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+
+    assert cache.get("a") is None
+
+
+class Loader:
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self, key):
+        self.calls += 1
+        await self.release.wait()
+        return {"key": key, "call": self.calls}
+
+
+async def test_concurrent_misses_share_one_load():
+    loader = Loader()
+    cache = CoalescingCache(loader, ttl=lambda value: 10)
+
+    gets = [asyncio.create_task(cache.get("a")) for _ in range(5)]
+    await asyncio.sleep(0)
+    loader.release.set()
+    values = await asyncio.gather(*gets)
+
+    assert loader.calls == 1
+    assert values == [{"key": "a", "call": 1}] * 5
+    assert await cache.get("a") == {"key": "a", "call": 1}
+    assert cache.stats()["coalesced"] == 4
+
+
+async def test_ttl_depends_on_the_value():
+    clock = FakeClock()
+    loader = Loader()
+    loader.release.set()
+    cache = CoalescingCache(
+        loader,
+        ttl=lambda value: 60 if value["key"] == "final" else 5,
+        cache=LRUCache(clock=clock),
+    )
+
+    await cache.get("pending")
+    await cache.get("final")
+    clock.now = 10
+
+    assert (await cache.get("pending"))["call"] == 3
+    assert (await cache.get("final"))["call"] == 2
+
+
+async def test_failed_loads_are_not_cached():
+    calls = []
+
+    async def failing(key):
+        calls.append(key)
+        raise RuntimeError("upstream down")
+
+    cache = CoalescingCache(failing, ttl=lambda value: 10)
+
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            await cache.get("a")
+    assert calls == ["a", "a"]
+
+
+async def test_invalidate_during_a_load_drops_its_value():
+    loader = Loader()
+    cache = CoalescingCache(loader, ttl=lambda value: 10)
+
+    get = asyncio.create_task(cache.get("a"))
+    await asyncio.sleep(0)
+    cache.invalidate("a")
+    loader.release.set()
+
+    assert (await get)["call"] == 1
+    assert (await cache.get("a"))["call"] == 2
+
+
+def test_document_cache_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("DOCUMENT_CACHE_ENABLED", raising=False)
+
+    assert CacheSettings(_env_file=None).enabled is False
+
+
+class Account(BaseModel):
+    id: PydanticObjectId
+    is_active: bool = True
+
+    @classmethod
+    async def find_one(cls, filter, projection_model=None):
+        return cls(id=filter["_id"], is_active=False)
+
+
+async def test_fresh_find_one_skips_the_document_cache():
+    cache = LRUCache()
+    service = BaseService(Account, cache=cache)
+    account = Account(id=PydanticObjectId())
+    cache.set(account.id, account)
+
+    assert (await service.find_one(account.id)).is_active is True
+    assert (await service.find_one(account.id, fresh=True)).is_active is False
@@ -0,0 +1,20 @@
+from src.core.services.etag import body_etag, etag_matches, etag_response
+
+
+def test_etag_matches_lists_weak_tags_and_wildcards():
+    etag = body_etag(b"{}")
+
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag, f'"other", W/{etag}')
+    assert etag_matches(etag, "*")
+    assert not etag_matches(etag, '"other"')
+    assert not etag_matches(etag, None)
+
+
+def test_etag_response_is_empty_when_the_client_has_the_body():
+    first = etag_response({"status": "APPROVED"}, None)
+    etag = first.headers["etag"]
+
+    assert first.status_code == 200
+    assert etag_response({"status": "APPROVED"}, etag).status_code == 304
+    assert etag_response({"status": "COMPLETED"}, etag).status_code == 200
@@ -0,0 +1,73 @@
+from src.core.services.explain import (
+    PlanReport, QueryShape, explain_shape, plan_stages
+)
+
+
+class Cursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    async def explain(self):
+        return self.plan
+
+
+class Collection:
+    def __init__(self, plan):
+        self.plan = plan
+        self.queries = []
+
+    def find(self, filter, sort=None):
+        self.queries.append((filter, sort))
+        return Cursor(self.plan)
+
+
+class Model:
+    def __init__(self, plan):
+        self.collection = Collection(plan)
+
+    def get_pymongo_collection(self):
+        return self.collection
+
+    def get_collection_name(self):
+        return "orders"
+
+
+def test_classic_plan():
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "FETCH",
+        "inputStage": {"stage": "IXSCAN", "indexName": "status_1"},
+    }}}
+
+    assert plan_stages(explain) == ("FETCH", "IXSCAN")
+
+
+def test_slot_based_and_or_plans():
+    explain = {"queryPlanner": {"winningPlan": {"queryPlan": {
+        "stage": "SORT",
+        "inputStage": {"stage": "OR", "inputStages": [
+            {"stage": "IXSCAN"}, {"stage": "COLLSCAN"},
+        ]},
+    }}}}
+
+    assert plan_stages(explain) == ("SORT", "OR", "IXSCAN", "COLLSCAN")
+
+
+def test_sharded_plan():
+    explain = {"queryPlanner": {"winningPlan": {
+        "stage": "SHARD_MERGE",
+        "shards": [{"winningPlan": {"stage": "COLLSCAN"}}],
+    }}}
+
+    assert plan_stages(explain) == ("SHARD_MERGE", "COLLSCAN")
+
+
+async def test_flags_collection_scans():
+    model = Model({"queryPlanner": {"winningPlan": {"stage": "COLLSCAN"}}})
+    shape = QueryShape("by_status", model, {"status": "paid"}, [("_id", 1)])
+
+    report = await explain_shape(shape)
+
+    assert model.collection.queries == [({"status": "paid"}, [("_id", 1)])]
+    assert report.collscan
+    assert str(report) == "[COLLSCAN] orders by_status: COLLSCAN"
+    assert not PlanReport(shape, ("FETCH", "IXSCAN")).collscan
@@ -0,0 +1,183 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.responses import JSONResponse
+from pymongo.errors import DuplicateKeyError
+
+from src.core.services.cache import LRUCache
+from src.core.services.idempotency import (
+    REPLAYED_HEADER, IdempotencyKeyInProgress, IdempotencyKeyReused,
+    IdempotencyStore, request_fingerprint
+)
+
+
+class Collection:
+    """Just enough of a collection with a unique index on `key`."""
+
+    def __init__(self):
+        self.records = {}
+
+    async def insert_one(self, record):
+        if record["key"] in self.records:
+            raise DuplicateKeyError("duplicate key")
+        self.records[record["key"]] = dict(record)
+
+    async def find_one(self, filter):
+        record = self.records.get(filter["key"])
+        return dict(record) if record else None
+
+    async def find_one_and_update(self, filter, update):
+        record = self.records.get(filter["key"])
+        if (
+            record is None or record["status"] != filter["status"]
+            or record["locked_until"] >= filter["locked_until"]["$lt"]
+        ):
+            return None
+        record.update(update["$set"])
+        return dict(record)
+
+    async def update_one(self, filter, update):
+        self.records[filter["key"]].update(update["$set"])
+
+    async def delete_one(self, filter):
+        self.records.pop(filter["key"], None)
+
+
+class Model:
+    def __init__(self):
+        self.collection = Collection()
+
+    def get_pymongo_collection(self):
+        return self.collection
+
+
+class Handler:
+    def __init__(self, status_code=201):
+        self.status_code = status_code
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return JSONResponse(
+            {"call": self.calls}, status_code=self.status_code,
+            headers={"Location": "/orders/1"})
+
+
+def make_store(model=None, **kwargs):
+    return IdempotencyStore(
+        model or Model(), poll_seconds=0.01, cache=LRUCache(), **kwargs)
+
+
+async def test_replays_the_first_response():
+    store = make_store()
+    handler = Handler()
+
+    first = await store.run("k", "f", handler)
+    second = await store.run("k", "f", handler)
+
+    assert handler.calls == 1
+    assert first.status_code == second.status_code == 201
+    assert first.body == second.body
+    assert second.headers["location"] == "/orders/1"
+    assert REPLAYED_HEADER not in first.headers
+    assert second.headers[REPLAYED_HEADER] == "true"
+
+
+async def test_concurrent_duplicates_wait_for_the_first():
+    store = make_store()
+    handler = Handler()
+
+    responses = await asyncio.gather(*[
+        store.run("k", "f", handler) for _ in range(5)
+    ])
+
+    assert handler.calls == 1
+    assert {response.body for response in responses} == {b'{"call":1}'}
+
+
+async def test_replays_from_mongo_without_the_cache():
+    model = Model()
+    handler = Handler()
+    await make_store(model).run("k", "f", handler)
+
+    response = await make_store(model).run("k", "f", handler)
+
+    assert handler.calls == 1
+    assert response.headers[REPLAYED_HEADER] == "true"
+
+
+async def test_other_process_waits_for_the_running_request():
+    model = Model()
+    handler = Handler()
+
+    responses = await asyncio.gather(
+        make_store(model).run("k", "f", handler),
+        make_store(model).run("k", "f", handler),
+    )
+
+    assert handler.calls == 1
+    assert responses[0].body == responses[1].body
+
+
+async def test_gives_up_waiting_for_a_running_request():
+    model = Model()
+    now = datetime.now(timezone.utc)
+    await model.collection.insert_one({
+        "key": "k", "fingerprint": "f", "status": "in_progress",
+        "locked_until": now + timedelta(minutes=1),
+    })
+
+    with pytest.raises(IdempotencyKeyInProgress):
+        await make_store(model, wait_seconds=0.05).run("k", "f", Handler())
+
+
+async def test_takes_over_an_abandoned_request():
+    model = Model()
+    now = datetime.now(timezone.utc)
+    await model.collection.insert_one({
+        "key": "k", "fingerprint": "f", "status": "in_progress",
+        "locked_until": now - timedelta(seconds=1),
+    })
+    handler = Handler()
+
+    response = await make_store(model).run("k", "f", handler)
+
+    assert handler.calls == 1
+    assert response.status_code == 201
+    assert model.collection.records["k"]["status"] == "completed"
+
+
+async def test_rejects_a_key_reused_for_another_request():
+    store = make_store()
+    await store.run("k", "f", Handler())
+
+    with pytest.raises(IdempotencyKeyReused):
+        await store.run("k", "other", Handler())
+
+    with pytest.raises(IdempotencyKeyReused):
+        await make_store(store.model).run("k", "other", Handler())
+
+
+async def test_failed_request_releases_the_key():
+    store = make_store()
+
+    async def failing():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await store.run("k", "f", failing)
+
+    handler = Handler()
+    response = await store.run("k", "f", handler)
+    assert handler.calls == 1
+    assert REPLAYED_HEADER not in response.headers
+
+
+def test_fingerprint_ignores_key_order():
+    assert (
+        request_fingerprint({"a": 1, "b": 2})
+        == request_fingerprint({"b": 2, "a": 1})
+    )
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
@@ -0,0 +1,136 @@
+import asyncio
+
+import pytest
+
+from src.core.services.base import BaseService
+from src.core.services.identity_map import (
+    IdentityMap, current_identity_map, use_identity_map
+)
+
+
+class Loader:
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+
+    async def __call__(self, ids):
+        self.calls.append(ids)
+        await asyncio.sleep(0)
+        return {id: self.documents[id] for id in ids if id in self.documents}
+
+
+async def test_loads_each_id_once():
+    loader = Loader({1: "a", 2: "b"})
+    identity_map = IdentityMap()
+
+    first = await identity_map.load("items", {1, 3}, loader)
+    second = await identity_map.load("items", {1, 2, 3}, loader)
+
+    assert first == {1: "a"}
+    assert second == {1: "a", 2: "b"}
+    assert loader.calls == [{1, 3}, {2}]
+
+
+async def test_coalesces_concurrent_loads():
+    loader = Loader({1: "a"})
+    identity_map = IdentityMap()
+
+    results = await asyncio.gather(*[
+        identity_map.load("items", {1}, loader) for _ in range(5)
+    ])
+
+    assert results == [{1: "a"}] * 5
+    assert loader.calls == [{1}]
+
+
+async def test_failed_load_is_not_remembered():
+    async def failing(ids):
+        raise RuntimeError("down")
+
+    identity_map = IdentityMap()
+
+    with pytest.raises(RuntimeError):
+        await identity_map.load("items", {1}, failing)
+
+    assert await identity_map.load("items", {1}, Loader({1: "a"})) == {1: "a"}
+
+
+async def test_discard_forces_reload():
+    loader = Loader({1: "a"})
+    identity_map = IdentityMap()
+
+    await identity_map.load("items", {1}, loader)
+    identity_map.discard("items", 1)
+    await identity_map.load("items", {1}, loader)
+
+    assert loader.calls == [{1}, {1}]
+
+
+def test_use_identity_map_binds_context():
+    assert current_identity_map() is None
+    with use_identity_map() as identity_map:
+        assert current_identity_map() is identity_map
+    assert current_identity_map() is None
+
+
+class Cursor:
+    closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+class StreamedModel:
+    """Stands in for a document model whose rows each link one id."""
+    rows = list(range(10))
+    last = None
+
+    def __init__(self):
+        self.cursor = None
+
+    @classmethod
+    def find_all(cls, batch_size):
+        cls.last = cls()
+        return cls.last
+
+    def sort(self, order):
+        return self
+
+    async def __aiter__(self):
+        self.cursor = Cursor()
+        for row in self.rows:
+            yield row
+
+
+async def test_stream_bounds_identity_map_per_batch():
+    service = BaseService(StreamedModel)
+    loader = Loader({row: f"linked {row}" for row in StreamedModel.rows})
+    batch_maps = []
+
+    async def resolve_links(batch):
+        identity_map = current_identity_map()
+        await identity_map.load("linked", set(batch), loader)
+        batch_maps.append((identity_map, len(identity_map)))
+
+    service._resolve_links = resolve_links
+    with use_identity_map() as request_map:
+        rows = [row async for row in service.stream(batch_size=4)]
+
+    assert rows == StreamedModel.rows
+    assert len(request_map) == 0
+    assert [size for _, size in batch_maps] == [4, 4, 2]
+    assert len({id(identity_map) for identity_map, _ in batch_maps}) == 3
+
+
+async def test_stream_closed_early_closes_its_cursor():
+    service = BaseService(StreamedModel)
+
+    async def resolve_links(batch):
+        pass
+
+    service._resolve_links = resolve_links
+    stream = service.stream(batch_size=4)
+    assert await stream.__anext__() == 0
+    await stream.aclose()
+
+    assert StreamedModel.last.cursor.closed
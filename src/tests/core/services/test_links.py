@@ -0,0 +1,117 @@
+from contextlib import ExitStack
+from typing import List, Optional
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from beanie import Link, PydanticObjectId
+from pydantic import BaseModel
+
+from src.core.services.base import BaseService
+from src.core.services.links import LinkField, link_plan
+from src.modules.categories.models import Category
+from src.modules.orders.models import Order, OrderItem
+from src.modules.products.models import Product
+from src.modules.users.models import User
+
+
+class Address(BaseModel):
+    street: str
+
+
+class Holder(BaseModel):
+    owner: Optional[Link[User]] = None
+    watchers: List[Link[User]] = []
+    address: Address
+    count: int = 0
+
+
+def test_plan_lists_link_and_embedded_model_fields():
+    assert link_plan(Order) == (
+        LinkField("user", many=False),
+        LinkField("items", many=True),
+    )
+    assert link_plan(OrderItem) == (LinkField("product", many=False),)
+
+
+def test_plan_skips_fields_without_links():
+    assert link_plan(Holder) == (
+        LinkField("owner", many=False),
+        LinkField("watchers", many=True),
+    )
+    assert link_plan(Address) == ()
+
+
+def link(document):
+    return Link(document.to_ref(), type(document))
+
+
+def stored(*documents):
+    """
+    Patches for `find` on the models of the documents, serving them
+    and recording each query.
+    """
+    queries = []
+    by_model = {}
+    for document in documents:
+        by_model.setdefault(type(document), []).append(document)
+
+    def find_for(model):
+        def find(query, **kwargs):
+            queries.append((model, dict(query)))
+            ids = set(dict(query)["_id"]["$in"])
+            cursor = MagicMock()
+            cursor.to_list = AsyncMock(return_value=[
+                document.model_copy(deep=True)
+                for document in by_model[model] if document.id in ids])
+            return cursor
+        return find
+
+    patches = [
+        patch.object(model, "find", side_effect=find_for(model))
+        for model in by_model
+    ]
+    return queries, patches
+
+
+async def test_resolves_each_level_with_one_query_per_model(test_db):
+    categories = [
+        Category(id=PydanticObjectId(), name="Books", slug="books"),
+        Category(id=PydanticObjectId(), name="Games", slug="games"),
+    ]
+    products = [
+        Product(
+            id=PydanticObjectId(), name=f"P{n}", description=None,
+            price=1.0, category=link(categories[n % 2]))
+        for n in range(4)
+    ]
+    users = [
+        User(id=PydanticObjectId(), email=f"u{n}@example.com", password="x")
+        for n in range(2)
+    ]
+    orders = [
+        Order(
+            user=link(users[n % 2]),
+            items=[
+                OrderItem(product=link(product), quantity=1, subtotal=1.0)
+                for product in products[n:n + 2]
+            ],
+            total_price=2.0,
+        )
+        for n in range(3)
+    ]
+    queries, patches = stored(*categories, *products, *users)
+
+    with ExitStack() as stack:
+        stack.enter_context(patch.dict(
+            "src.core.services.base._document_caches", clear=True))
+        for active in patches:
+            stack.enter_context(active)
+        await BaseService(Order)._resolve_links(orders)
+
+    assert sorted(
+        (model.__name__, len(query["_id"]["$in"]))
+        for model, query in queries
+    ) == [("Category", 2), ("Product", 4), ("User", 2)]
+    # Categories are only known once the products are loaded.
+    assert queries[-1][0] is Category
+    assert orders[2].items[1].product.category.name == "Games"
+    assert orders[1].user.email == "u1@example.com"
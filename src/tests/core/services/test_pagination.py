@@ -0,0 +1,71 @@
+import base64
+from datetime import datetime, timezone
+from beanie import PydanticObjectId
+from bson import json_util
+from fastapi import Response
+from pydantic import BaseModel, ValidationError
+import pytest
+
+from ....core.services.pagination import (
+    PageQuery, decode_cursor, encode_cursor, paginate
+)
+
+
+def test_cursor_round_trip():
+    document_id = PydanticObjectId()
+    created_at = datetime(2024, 5, 1, 12, 30, tzinfo=timezone.utc)
+
+    token = encode_cursor("created_at", created_at, document_id)
+    cursor = decode_cursor(token, "created_at")
+
+    assert "=" not in token
+    assert cursor["id"] == document_id
+    assert cursor["v"].replace(tzinfo=timezone.utc) == created_at
+
+
+def test_cursor_for_another_sort_key():
+    token = encode_cursor("_id", None, PydanticObjectId())
+
+    with pytest.raises(ValueError):
+        decode_cursor(token, "created_at")
+
+
+@pytest.mark.parametrize("token", ["broken", "", "e30", "%%%"])
+def test_malformed_cursor(token):
+    with pytest.raises(ValueError):
+        decode_cursor(token, "_id")
+
+
+def _token(payload):
+    return base64.urlsafe_b64encode(
+        json_util.dumps(payload).encode()).decode()
+
+
+@pytest.mark.parametrize("payload", [
+    {"k": "name", "v": {"$ne": None}, "id": PydanticObjectId()},
+    {"k": "name", "v": ["a"], "id": PydanticObjectId()},
+    {"k": "name", "v": "a", "id": {"$gt": ""}},
+    {"k": "name", "v": "a", "id": [PydanticObjectId()]},
+    {"k": "name", "v": "a", "id": "not-an-object-id"},
+    {"k": "name", "id": PydanticObjectId()},
+])
+def test_cursor_with_operator_values(payload):
+    with pytest.raises(ValueError):
+        decode_cursor(_token(payload), "name")
+
+
+class Item(BaseModel):
+    name: str
+
+
+class FailingService:
+    async def find_page(self, **kwargs):
+        return Item.model_validate({"name": None})
+
+
+async def test_paginate_lets_item_errors_propagate():
+    page_query = PageQuery(
+        after=encode_cursor("_id", None, PydanticObjectId()), limit=10)
+
+    with pytest.raises(ValidationError):
+        await paginate(FailingService(), page_query, Response())
@@ -0,0 +1,26 @@
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from src.core.services.projection import projection_model
+
+
+class Item(BaseModel):
+    id: Optional[str] = None
+    name: str = ""
+    price: float = 0.0
+    stock: int = 0
+
+
+def test_field_order_shares_one_model():
+    model = projection_model(Item, ("stock", "name"))
+
+    assert projection_model(Item, ["name", "stock"]) is model
+    assert projection_model(Item, ("name", "stock", "name")) is model
+    assert set(model.model_fields) == {"id", "name", "stock"}
+
+
+def test_unknown_field_raises_value_error():
+    with pytest.raises(ValueError, match="Unknown fields: password"):
+        projection_model(Item, ("name", "password"))
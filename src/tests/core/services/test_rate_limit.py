@@ -0,0 +1,69 @@
+import asyncio
+
+import pytest
+
+from src.core.services.concurrency import gather_limited
+from src.core.services.rate_limit import RateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+async def test_lets_bursts_through_then_paces_calls():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        await limiter.acquire()
+
+    assert clock.sleeps == [pytest.approx(0.1), pytest.approx(0.1)]
+    assert limiter.waited == pytest.approx(0.2)
+
+
+async def test_refills_while_idle():
+    clock = FakeClock()
+    limiter = RateLimiter(rate=10, burst=2, clock=clock, sleep=clock.sleep)
+    for _ in range(2):
+        await limiter.acquire()
+
+    clock.now += 1.0
+    for _ in range(2):
+        await limiter.acquire()
+
+    assert clock.sleeps == []
+
+
+def test_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0)
+
+
+async def test_gather_limited_bounds_concurrency():
+    running = 0
+    peak = 0
+
+    async def call(value):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0)
+        running -= 1
+        if value == 3:
+            raise RuntimeError("failed")
+        return value
+
+    results = await gather_limited([call(i) for i in range(6)], limit=2)
+
+    assert peak == 2
+    assert results[:3] == [0, 1, 2]
+    assert isinstance(results[3], RuntimeError)
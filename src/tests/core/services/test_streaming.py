@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+
+from src.core.services.streaming import ndjson_response
+
+
+class Row(BaseModel):
+    name: str
+
+
+async def test_disconnect_closes_the_documents():
+    closed = []
+
+    async def documents():
+        try:
+            for name in ("a", "b", "c"):
+                yield Row(name=name)
+        finally:
+            closed.append(True)
+
+    response = ndjson_response(documents(), Row)
+    lines = response.body_iterator
+    assert await lines.__anext__() == '{"name":"a"}\n'
+    # What the server does with the body once the client is gone.
+    await lines.aclose()
+
+    assert closed == [True]
@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from fastapi import Response
+
+from src.core.services.pagination import NEXT_CURSOR_HEADER
+from src.core.services.trusted import trusted_response, trusted_schema
+from src.modules.orders.schemas import OrderResponse
+from src.modules.products.schemas import ProductResponse
+
+
+def category_row():
+    return {
+        "_id": ObjectId(),
+        "name": "Phones",
+        "slug": "phones",
+        "created_at": datetime(2024, 1, 1),
+        "updated_at": datetime(2024, 1, 2),
+    }
+
+
+def product_row():
+    return {
+        "_id": ObjectId(),
+        "revision_id": None,
+        "name": "iPhone 16",
+        "description": None,
+        "price": 1299.99,
+        "stock": 50,
+        "is_active": True,
+        "category": category_row(),
+        "created_at": datetime(2024, 1, 1),
+        "updated_at": datetime(2024, 1, 2),
+    }
+
+
+def test_raw_rows_serialize_like_the_response_schema():
+    row = product_row()
+    expected = ProductResponse.model_validate(
+        {**row, "category": {**row["category"],
+                             "id": row["category"]["_id"]}}
+    ).model_dump(mode="json", by_alias=True)
+
+    response = trusted_response([row], ProductResponse)
+
+    assert json.loads(response.body) == [expected]
+
+
+def test_nested_schemas_are_relaxed():
+    user_id = ObjectId()
+    row = {
+        "_id": ObjectId(),
+        "user": {
+            "_id": user_id,
+            "email": "not checked again",
+            "password": "hash",
+            "full_name": None,
+            "is_active": True,
+            "role": "user",
+        },
+        "items": [
+            {"quantity": 2, "subtotal": 2599.98, "product": product_row()}
+        ],
+        "total_price": 2599.98,
+        "status": "pending",
+    }
+
+    data = json.loads(trusted_response(row, OrderResponse).body)
+
+    assert data["user"] == {
+        "id": str(user_id),
+        "email": "not checked again",
+        "full_name": None,
+        "is_active": True,
+        "role": "user",
+    }
+    assert data["items"][0]["product"]["name"] == "iPhone 16"
+    assert trusted_schema(OrderResponse) is trusted_schema(OrderResponse)
+
+
+def test_keeps_next_cursor_header():
+    endpoint = Response(headers={NEXT_CURSOR_HEADER: "next-token"})
+
+    response = trusted_response([], ProductResponse, endpoint)
+
+    assert response.headers[NEXT_CURSOR_HEADER] == "next-token"
+    assert json.loads(response.body) == []
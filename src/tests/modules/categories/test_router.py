@@ -3,6 +3,9 @@ from unittest.mock import AsyncMock, patch
 import pytest
 
 from ....modules.categories.schemas import CategoryResponse
+from ....modules.categories.service import category_service
+from ....modules.products.service import product_service
+from ....core.services.pagination import Page, encode_cursor
 from beanie import PydanticObjectId
 
 category_id = PydanticObjectId()
@@ -62,7 +65,8 @@ async def test_get_categories(
         patch("src.modules.categories.router.category_service")
         as mock_category_service
     ):
-        mock_category_service.find_all = AsyncMock(return_value=mocked_data)
+        mock_category_service.find_page = AsyncMock(
+            return_value=Page(items=mocked_data))
 
         response = await test_client.get("/categories/")
 
@@ -82,7 +86,7 @@ async def test_get_categories_empty(
         patch("src.modules.categories.router.category_service")
         as mock_category_service
     ):
-        mock_category_service.find_all = AsyncMock(return_value=[])
+        mock_category_service.find_page = AsyncMock(return_value=Page())
 
         response = await test_client.get("/categories/")
 
@@ -91,6 +95,47 @@ async def test_get_categories_empty(
         assert data == []
 
 
+@pytest.mark.asyncio
+async def test_get_categories_next_cursor(
+    test_client,
+    test_db,
+    mock_category_data
+):
+    with (
+        patch("src.modules.categories.router.category_service")
+        as mock_category_service
+    ):
+        mock_category_service.find_page = AsyncMock(return_value=Page(
+            items=[mock_category_data], next_cursor="next-token"))
+
+        after = encode_cursor("_id", None, category_id)
+        response = await test_client.get(
+            "/categories/", params={"limit": 1, "after": after})
+
+        assert response.status_code == 200
+        assert response.headers["X-Next-Cursor"] == "next-token"
+        mock_category_service.find_page.assert_awaited_once_with(
+            after=after, limit=1, fields=None)
+
+
+@pytest.mark.asyncio
+async def test_get_categories_invalid_cursor(
+    test_client,
+    test_db
+):
+    with (
+        patch("src.modules.categories.router.category_service")
+        as mock_category_service
+    ):
+        mock_category_service.find_page = AsyncMock(return_value=Page())
+
+        response = await test_client.get("/categories/?after=broken")
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Invalid cursor"
+        mock_category_service.find_page.assert_not_awaited()
+
+
 async def test_get_category(
     test_client,
     test_db,
@@ -221,3 +266,39 @@ async def test_delete_category_not_found(
 
         assert response.status_code == 404
         assert response.json()["detail"] == "Category not found"
+
+
+@pytest.mark.asyncio
+async def test_rename_category_refreshes_product_summaries(
+    test_client,
+    test_db
+):
+    category = await category_service.create(
+        {"name": "Phones", "slug": "phones"})
+    product = await product_service.create({
+        "name": "Phone", "description": None, "price": 100.0, "stock": 1,
+        "category": category,
+    })
+    # The page holding only this product.
+    after = encode_cursor(
+        "_id", None, PydanticObjectId(f"{int(str(product.id), 16) - 1:024x}"))
+
+    try:
+        response = await test_client.put(
+            f"/categories/{category.id}",
+            json={"name": "Smartphones", "slug": "smartphones"})
+        assert response.status_code == 200
+
+        response = await test_client.get(
+            "/products/", params={"summary": True, "after": after, "limit": 1})
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data[0]["_id"] == str(product.id)
+        assert data[0]["category_snapshot"] == {
+            "id": str(category.id), "name": "Smartphones",
+            "slug": "smartphones",
+        }
+    finally:
+        await product_service.delete(product.id)
+        await category_service.delete(category.id)
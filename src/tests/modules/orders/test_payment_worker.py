@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from beanie import PydanticObjectId
+
+from ....core.services.circuit_breaker import CircuitOpenError
+from ....modules.orders.payment_worker import PaymentWorker
+
+
+@pytest.fixture
+def worker():
+    worker = PaymentWorker(max_attempts=3)
+    worker._finish = AsyncMock()
+    worker._retry = AsyncMock()
+    return worker
+
+
+def job(attempts=1):
+    return SimpleNamespace(
+        id=PydanticObjectId(), order_id=PydanticObjectId(), attempts=attempts)
+
+
+def pending_order():
+    return SimpleNamespace(
+        id=PydanticObjectId(), status="pending", ref_order_id=None)
+
+
+async def test_submits_pending_order(worker):
+    order = pending_order()
+    payment_job = job()
+    with patch(
+        "src.modules.orders.payment_worker.order_service"
+    ) as mock_order_service:
+        mock_order_service.find_one = AsyncMock(return_value=order)
+        mock_order_service.submit_payment = AsyncMock()
+
+        await worker._process(payment_job)
+
+        mock_order_service.submit_payment.assert_awaited_once_with(order)
+        worker._finish.assert_awaited_once_with(payment_job, "done")
+
+
+async def test_skips_order_already_submitted(worker):
+    order = pending_order()
+    order.ref_order_id = "PAYPAL-1"
+    with patch(
+        "src.modules.orders.payment_worker.order_service"
+    ) as mock_order_service:
+        mock_order_service.find_one = AsyncMock(return_value=order)
+        mock_order_service.submit_payment = AsyncMock()
+
+        await worker._process(job())
+
+        mock_order_service.submit_payment.assert_not_awaited()
+
+
+async def test_retries_failed_submission(worker):
+    payment_job = job(attempts=1)
+    with patch(
+        "src.modules.orders.payment_worker.order_service"
+    ) as mock_order_service:
+        mock_order_service.find_one = AsyncMock(return_value=pending_order())
+        mock_order_service.submit_payment = AsyncMock(
+            side_effect=RuntimeError("PayPal is down"))
+        mock_order_service.cancel = AsyncMock()
+
+        await worker._process(payment_job)
+
+        worker._retry.assert_awaited_once_with(
+            payment_job, error="PayPal is down")
+        mock_order_service.cancel.assert_not_awaited()
+
+
+async def test_cancels_order_after_last_attempt(worker):
+    order = pending_order()
+    payment_job = job(attempts=3)
+    with patch(
+        "src.modules.orders.payment_worker.order_service"
+    ) as mock_order_service:
+        mock_order_service.find_one = AsyncMock(return_value=order)
+        mock_order_service.submit_payment = AsyncMock(
+            side_effect=RuntimeError("PayPal is down"))
+        mock_order_service.cancel = AsyncMock()
+
+        await worker._process(payment_job)
+
+        mock_order_service.cancel.assert_awaited_once_with(order)
+        worker._finish.assert_awaited_once_with(
+            payment_job, "failed", error="PayPal is down")
+
+
+async def test_open_circuit_does_not_use_an_attempt(worker):
+    order = pending_order()
+    payment_job = job(attempts=3)
+    with patch(
+        "src.modules.orders.payment_worker.order_service"
+    ) as mock_order_service:
+        mock_order_service.find_one = AsyncMock(return_value=order)
+        mock_order_service.submit_payment = AsyncMock(
+            side_effect=CircuitOpenError("PayPal circuit is open"))
+        mock_order_service.cancel = AsyncMock()
+
+        await worker._process(payment_job)
+
+        mock_order_service.cancel.assert_not_awaited()
+        worker._retry.assert_awaited_once()
+        assert worker._retry.await_args.kwargs["count_attempt"] is False
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import pytest
+from beanie import PydanticObjectId
+
+from ....core.services.circuit_breaker import CircuitOpenError
+from ....core.services.rate_limit import RateLimiter
+from ....modules.orders.models import (
+    Order, PaymentJob, ReconcileCheckpoint, ReconcileStats
+)
+from ....modules.orders.reconcile import OrderReconciler
+from ....modules.orders.service import PaidOrder
+
+
+NOW = datetime(2024, 1, 1, 12, 0)
+
+
+@pytest.fixture
+def paypal():
+    with patch(
+        "src.modules.orders.reconcile.paypal_service"
+    ) as mock_paypal_service:
+        mock_paypal_service.capture_order = AsyncMock(
+            return_value={"status": "COMPLETED"})
+        mock_paypal_service.breaker.retry_after.return_value = 0
+        yield mock_paypal_service
+
+
+@pytest.fixture
+def orders():
+    with patch(
+        "src.modules.orders.reconcile.order_service"
+    ) as mock_order_service:
+        mock_order_service.mark_paid_many = AsyncMock(
+            side_effect=lambda payments: list(payments))
+        mock_order_service.cancel_many = AsyncMock(
+            side_effect=lambda ids: list(ids))
+        yield mock_order_service
+
+
+def checkpoint():
+    return ReconcileCheckpoint.model_construct(
+        name="orders",
+        cutoff=NOW - timedelta(minutes=30),
+        expire_before=NOW - timedelta(hours=3),
+        stats=ReconcileStats(),
+    )
+
+
+def row(ref_order_id, minutes_old=60):
+    return {
+        "_id": PydanticObjectId(),
+        "ref_order_id": ref_order_id,
+        "created_at": NOW - timedelta(minutes=minutes_old),
+    }
+
+
+def not_found():
+    return httpx.HTTPStatusError(
+        "Not Found", request=httpx.Request("GET", "http://paypal"),
+        response=httpx.Response(404))
+
+
+async def reconcile(batch, run_checkpoint):
+    reconciler = OrderReconciler(concurrency=2)
+    await reconciler._reconcile(
+        batch, run_checkpoint, RateLimiter(rate=1000, burst=10))
+
+
+async def test_applies_provider_statuses_in_bulk(paypal, orders):
+    completed, approved, waiting, expired, voided, gone = batch = [
+        row("COMPLETED-1"),
+        row("APPROVED-1"),
+        row("WAITING-1"),
+        row("EXPIRED-1", minutes_old=400),
+        row("VOIDED-1"),
+        row("GONE-1"),
+    ]
+    statuses = {
+        "COMPLETED-1": {"status": "COMPLETED", "payer": {"payer_id": "P1"}},
+        "APPROVED-1": {"status": "APPROVED"},
+        "WAITING-1": {"status": "PAYER_ACTION_REQUIRED"},
+        "EXPIRED-1": {"status": "PAYER_ACTION_REQUIRED"},
+        "VOIDED-1": {"status": "VOIDED"},
+    }
+
+    async def detail(ref_order_id):
+        if ref_order_id not in statuses:
+            raise not_found()
+        return statuses[ref_order_id]
+
+    paypal.get_order_detail = AsyncMock(side_effect=detail)
+    run_checkpoint = checkpoint()
+
+    await reconcile(batch, run_checkpoint)
+
+    paypal.capture_order.assert_awaited_once_with("APPROVED-1")
+    orders.mark_paid_many.assert_awaited_once_with([
+        PaidOrder("COMPLETED-1", "P1", "reconcile-COMPLETED-1"),
+        PaidOrder("APPROVED-1", None, "reconcile-APPROVED-1"),
+    ])
+    orders.cancel_many.assert_awaited_once_with(
+        [expired["_id"], voided["_id"], gone["_id"]])
+    assert run_checkpoint.stats.model_dump() == {
+        "scanned": 6, "paid": 2, "cancelled": 3, "unchanged": 1, "failed": 0,
+        "unsent": 0, "stale_reservations": 0,
+    }
+
+
+async def test_failed_lookups_leave_orders_pending(paypal, orders):
+    paypal.get_order_detail = AsyncMock(
+        side_effect=RuntimeError("PayPal is down"))
+    run_checkpoint = checkpoint()
+
+    await reconcile([row("REF-1", minutes_old=400)], run_checkpoint)
+
+    orders.cancel_many.assert_awaited_once_with([])
+    assert run_checkpoint.stats.failed == 1
+    assert run_checkpoint.stats.unchanged == 0
+
+
+async def test_waits_for_open_circuit(paypal, orders):
+    paypal.get_order_detail = AsyncMock(side_effect=[
+        CircuitOpenError("PayPal circuit is open"),
+        {"status": "COMPLETED"},
+    ])
+    paypal.breaker.retry_after.return_value = 0.01
+    run_checkpoint = checkpoint()
+
+    await reconcile([row("REF-1")], run_checkpoint)
+
+    assert paypal.get_order_detail.await_count == 2
+    assert run_checkpoint.stats.paid == 1
+    assert run_checkpoint.stats.failed == 0
+
+
+def test_batches_resume_after_checkpoint():
+    after = PydanticObjectId()
+
+    first = OrderReconciler._batch_filter(NOW)
+    resumed = OrderReconciler._batch_filter(NOW, NOW, after)
+
+    assert "$or" not in first
+    assert resumed["$or"] == [
+        {"created_at": {"$gt": NOW}},
+        {"created_at": NOW, "_id": {"$gt": after}},
+    ]
+
+
+def test_unsent_orders_have_no_paypal_order():
+    filter = OrderReconciler._batch_filter(NOW, sent=False)
+
+    assert filter["ref_order_id"] is None
+    assert filter["status"] == "pending"
+    assert filter["created_at"] == {"$lte": NOW}
+
+
+def collection(*pages):
+    """Collection whose successive finds return the given rows."""
+    mock_collection = MagicMock()
+    mock_collection.find.return_value.to_list = AsyncMock(
+        side_effect=list(pages))
+    return mock_collection
+
+
+async def test_cancels_unsent_orders_without_live_job(orders):
+    abandoned, submitting = batch = [row(None), row(None)]
+    order_collection = collection(batch, [])
+    job_collection = collection([{"order_id": submitting["_id"]}])
+    run_checkpoint = checkpoint()
+
+    with (
+        patch.object(
+            Order, "get_pymongo_collection", return_value=order_collection),
+        patch.object(
+            PaymentJob, "get_pymongo_collection",
+            return_value=job_collection),
+    ):
+        await OrderReconciler(batch_size=2)._cancel_unsent(run_checkpoint)
+
+    orders.cancel_many.assert_awaited_once_with([abandoned["_id"]])
+    assert run_checkpoint.stats.unsent == 1
+    resumed = order_collection.find.call_args_list[1].args[0]
+    assert resumed["$or"][1] == {
+        "created_at": submitting["created_at"],
+        "_id": {"$gt": submitting["_id"]},
+    }
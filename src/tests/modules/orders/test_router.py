@@ -1,12 +1,19 @@
 import pytest
 
-from datetime import datetime
-from unittest.mock import AsyncMock, patch
-from beanie import PydanticObjectId
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+from beanie import Link, PydanticObjectId
+from ....modules.categories.models import Category
+from ....modules.orders.models import Order, OrderItem
+from ....modules.products.models import Product
 from ....modules.products.schemas import ProductResponse
+from ....modules.users.models import User
 
 from ....modules.users.schemas import UserResponse
 from ....modules.orders.schemas import OrderItemResponse, OrderResponse
+from ....core.services.cache import LRUCache
+from ....core.services.idempotency import IdempotencyStore
+from ....core.services.pagination import Page
 
 
 order_id = PydanticObjectId()
@@ -67,31 +74,17 @@ async def test_create_order(
       patch("src.modules.orders.router.order_service")
       as mock_order_service,
       patch("src.modules.orders.router.product_service")
-      as mock_product_service,  
-      patch("src.modules.orders.router.paypal_service")
-      as mock_paypal_service
+      as mock_product_service,
     ):
         mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
-        mock_product_service.find_one = AsyncMock(
-          return_value=mocked_data.items[0].product
+        mock_product_service.find_many = AsyncMock(
+          return_value=[mocked_data.items[0].product]
         )
-        mock_product_service.increase = AsyncMock(return_value=None)
+        mock_product_service.reserve_stock = AsyncMock(return_value=True)
+        mock_product_service.settle_reservation = AsyncMock()
         mock_order_service.create = AsyncMock(return_value=mocked_data)
-        mock_order_service.update = AsyncMock(return_value=mocked_data)
-        
-        mock_paypal_service.create_order = AsyncMock(return_value={
-            "id": "PAYPAL_ORDER_123",
-            "links": [
-                {"href": "https://example.com/cancel", "rel": "cancel"},
-                {"href": "https://example.com/approve", "rel": "approve"},
-            ]
-        })
-        mock_paypal_service.confirm_payment_source = AsyncMock(
-          return_value=None
-        )
-        mock_paypal_service.get_order_detail = AsyncMock(
-          return_value={"status": "COMPLETED"}
-        )
+        mock_order_service.submit_payment = AsyncMock(
+          return_value=mocked_data)
         
         order_payload = {
             "user_id": str(user_id),
@@ -117,6 +110,132 @@ async def test_create_order(
         assert response.status_code == 200
 
 
+def stored_order(category):
+    """
+    An order as `order_service` returns it, its product linking to the
+    category, resolved or not.
+    """
+    user = User(
+        id=user_id, email="user@example.com", password="x",
+        full_name="John Doe")
+    product = Product(
+        id=product_id, name="Sample Product", description=None,
+        price=9.99, stock=100, category=category)
+    return Order(
+        id=order_id, user=user,
+        items=[OrderItem(product=product, quantity=2, subtotal=19.98)],
+        total_price=19.98)
+
+
+@pytest.mark.asyncio
+async def test_create_order_respond_async(
+    test_client,
+    test_db,
+):
+    category = Category(
+        id=category_id, name="Sample Category", slug="sample-category")
+    # The products of a new order are loaded without their category.
+    created = stored_order(Link(category.to_ref(), Category))
+
+    with (
+      patch("src.modules.orders.router.user_service")
+      as mock_user_service,
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+      patch("src.modules.orders.router.product_service")
+      as mock_product_service,
+      patch("src.modules.orders.router.payment_worker")
+      as mock_payment_worker,
+    ):
+        mock_user_service.find_one = AsyncMock(return_value=created.user)
+        mock_product_service.find_many = AsyncMock(
+          return_value=[created.items[0].product]
+        )
+        mock_product_service.reserve_stock = AsyncMock(return_value=True)
+        mock_product_service.settle_reservation = AsyncMock()
+        mock_order_service.create = AsyncMock(return_value=created)
+        mock_order_service.find_one = AsyncMock(
+          return_value=stored_order(category))
+        mock_order_service.submit_payment = AsyncMock()
+        mock_payment_worker.enqueue = AsyncMock()
+
+        order_payload = {
+            "user_id": str(user_id),
+            "items": [{"product_id": str(product_id), "quantity": 2}]
+        }
+
+        response = await test_client.post(
+            "/orders/", json=order_payload,
+            headers={"Prefer": "respond-async"})
+
+        data = response.json()
+        assert response.status_code == 202
+        assert response.headers["Location"] == f"/orders/{order_id}"
+        assert data["id"] == str(order_id)
+        assert data["items"][0]["product"]["category"]["name"] == (
+            "Sample Category")
+        mock_payment_worker.enqueue.assert_awaited_once_with(order_id)
+        mock_order_service.find_one.assert_awaited_once_with(order_id)
+        mock_order_service.submit_payment.assert_not_awaited()
+        mock_product_service.release_stock.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_create_order_replays_idempotent_retries(
+    test_client,
+    test_db,
+    order_data
+):
+    mocked_data = order_data
+    records = MagicMock()
+    records.get_pymongo_collection.return_value = AsyncMock()
+
+    with (
+      patch("src.modules.orders.router.user_service")
+      as mock_user_service,
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+      patch("src.modules.orders.router.product_service")
+      as mock_product_service,
+      patch(
+        "src.modules.orders.router.order_idempotency",
+        IdempotencyStore(records, cache=LRUCache()),
+      ),
+    ):
+        mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
+        mock_product_service.find_many = AsyncMock(
+          return_value=[mocked_data.items[0].product]
+        )
+        mock_product_service.reserve_stock = AsyncMock(return_value=True)
+        mock_product_service.settle_reservation = AsyncMock()
+        mock_order_service.create = AsyncMock(return_value=mocked_data)
+        mock_order_service.submit_payment = AsyncMock(
+          return_value=mocked_data)
+
+        order_payload = {
+            "user_id": str(user_id),
+            "items": [{"product_id": str(product_id), "quantity": 2}]
+        }
+        headers = {"Idempotency-Key": "retry-1"}
+
+        first = await test_client.post(
+            "/orders/", json=order_payload, headers=headers)
+        retry = await test_client.post(
+            "/orders/", json=order_payload, headers=headers)
+        reused = await test_client.post(
+            "/orders/",
+            json={**order_payload, "items": []},
+            headers=headers,
+        )
+
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json()
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        assert reused.status_code == 422
+        mock_product_service.reserve_stock.assert_awaited_once()
+        mock_order_service.submit_payment.assert_awaited_once()
+
+
 @pytest.mark.asyncio
 async def test_create_not_found_user_of_order(
     test_client,
@@ -132,8 +251,8 @@ async def test_create_not_found_user_of_order(
       as mock_product_service,  
     ):
         mock_user_service.find_one = AsyncMock(return_value=None)
-        mock_product_service.find_one = AsyncMock(
-          return_value=mocked_data.items[0].product
+        mock_product_service.find_many = AsyncMock(
+          return_value=[mocked_data.items[0].product]
         )
         
         order_payload = {
@@ -169,9 +288,7 @@ async def test_create_not_found_product_of_order(
       as mock_product_service,  
     ):
         mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
-        mock_product_service.find_one = AsyncMock(
-          return_value=None
-        )
+        mock_product_service.find_many = AsyncMock(return_value=[])
         
         order_payload = {
             "user_id": str(user_id),
@@ -208,8 +325,8 @@ async def test_create_out_of_stock_product_of_order(
         mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
         out_of_stock_product = mocked_data.items[0].product
         out_of_stock_product.stock = 1  # less than order quantity
-        mock_product_service.find_one = AsyncMock(
-          return_value=out_of_stock_product
+        mock_product_service.find_many = AsyncMock(
+          return_value=[out_of_stock_product]
         )
         
         order_payload = {
@@ -232,6 +349,126 @@ async def test_create_out_of_stock_product_of_order(
         )
 
 
+@pytest.mark.asyncio
+async def test_create_order_merges_duplicate_products(
+    test_client,
+    test_db,
+    order_data
+):
+    mocked_data = order_data
+
+    with (
+      patch("src.modules.orders.router.user_service")
+      as mock_user_service,
+      patch("src.modules.orders.router.product_service")
+      as mock_product_service,
+    ):
+        mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
+        product = mocked_data.items[0].product
+        product.stock = 3
+        mock_product_service.find_many = AsyncMock(return_value=[product])
+
+        order_payload = {
+            "user_id": str(user_id),
+            "items": [
+                {"product_id": str(product_id), "quantity": 2},
+                {"product_id": str(product_id), "quantity": 2},
+            ]
+        }
+
+        response = await test_client.post(
+            "/orders/", json=order_payload)
+
+        assert response.status_code == 404
+        assert response.json()["detail"] == (
+            f"The quantity of item {product_id}is out of stock"
+        )
+        mock_product_service.find_many.assert_awaited_once_with(
+            [product_id], fetch_links=False)
+
+
+@pytest.mark.asyncio
+async def test_create_order_when_stock_runs_out(
+    test_client,
+    test_db,
+    order_data
+):
+    mocked_data = order_data
+
+    with (
+      patch("src.modules.orders.router.user_service")
+      as mock_user_service,
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+      patch("src.modules.orders.router.product_service")
+      as mock_product_service,
+    ):
+        mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
+        mock_product_service.find_many = AsyncMock(
+          return_value=[mocked_data.items[0].product]
+        )
+        mock_product_service.reserve_stock = AsyncMock(return_value=False)
+        mock_order_service.create = AsyncMock()
+
+        order_payload = {
+            "user_id": str(user_id),
+            "items": [{"product_id": str(product_id), "quantity": 2}]
+        }
+
+        response = await test_client.post(
+            "/orders/", json=order_payload)
+
+        assert response.status_code == 409
+        mock_product_service.reserve_stock.assert_awaited_once()
+        assert mock_product_service.reserve_stock.await_args.args == (
+            {product_id: 2},)
+        mock_order_service.create.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_create_order_keeps_reservation_pending_until_saved(
+    test_client,
+    test_db,
+    order_data
+):
+    mocked_data = order_data
+
+    with (
+      patch("src.modules.orders.router.user_service")
+      as mock_user_service,
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+      patch("src.modules.orders.router.product_service")
+      as mock_product_service,
+    ):
+        mock_user_service.find_one = AsyncMock(return_value=mocked_data.user)
+        mock_product_service.find_many = AsyncMock(
+          return_value=[mocked_data.items[0].product]
+        )
+        mock_product_service.reserve_stock = AsyncMock(return_value=True)
+        mock_product_service.settle_reservation = AsyncMock()
+        mock_product_service.release_reservation = AsyncMock()
+        mock_product_service.release_stock = AsyncMock()
+        mock_order_service.create = AsyncMock(
+          side_effect=RuntimeError("insert failed"))
+
+        order_payload = {
+            "user_id": str(user_id),
+            "items": [{"product_id": str(product_id), "quantity": 2}]
+        }
+
+        with pytest.raises(RuntimeError):
+            await test_client.post("/orders/", json=order_payload)
+
+        token = mock_product_service.reserve_stock.await_args.kwargs["token"]
+        data = mock_order_service.create.await_args.args[0]
+        assert data["reservation_token"] == token
+        mock_product_service.settle_reservation.assert_not_awaited()
+        mock_product_service.release_reservation.assert_awaited_once_with(
+            {product_id: 2}, token)
+        mock_product_service.release_stock.assert_not_awaited()
+
+
 @pytest.mark.asyncio
 async def test_get_all_orders(
     test_client,
@@ -244,7 +481,9 @@ async def test_get_all_orders(
       patch("src.modules.orders.router.order_service")
       as mock_order_service,
     ):
-        mock_order_service.find_all = AsyncMock(return_value=mocked_data)
+        mock_order_service.find_page = AsyncMock(
+          return_value=Page(items=mocked_data)
+        )
 
         response = await test_client.get("/orders/")
 
@@ -262,6 +501,89 @@ async def test_get_all_orders(
         assert data[0]["checkout_url"] == mocked_data[0].checkout_url
 
 
+@pytest.mark.asyncio
+async def test_search_orders_returns_summaries(test_client, test_db):
+    row = {
+        "_id": order_id,
+        "user_snapshot": {
+            "id": user_id, "email": "user@example.com", "full_name": None},
+        "items": [{"quantity": 2, "subtotal": 19.98}],
+        "total_price": 19.98,
+        "status": "paid",
+        "created_at": datetime(2024, 1, 5, 12),
+    }
+
+    with (
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+    ):
+        mock_order_service.find_page = AsyncMock(
+          return_value=Page(items=[row], next_cursor="next")
+        )
+
+        response = await test_client.get(
+            "/orders/",
+            params={
+                "status": "paid",
+                "user": str(user_id),
+                "from": "2024-01-01",
+                "to": "2024-01-31T00:00:00Z",
+                "summary": "true",
+            },
+        )
+
+        assert response.status_code == 200
+        assert response.headers["X-Next-Cursor"] == "next"
+        data = response.json()
+        assert data == [{
+            "id": str(order_id),
+            "user_snapshot": {
+                "id": str(user_id),
+                "email": "user@example.com",
+                "full_name": None,
+            },
+            "items": [{
+                "quantity": 2, "subtotal": 19.98, "product_snapshot": None}],
+            "total_price": 19.98,
+            "status": "paid",
+            "ref_order_id": None,
+            "created_at": "2024-01-05T12:00:00",
+            "paid_at": None,
+        }]
+
+        kwargs = mock_order_service.find_page.await_args.kwargs
+        assert kwargs["filter"] == {
+            "user.$id": user_id,
+            "status": "paid",
+            "created_at": {
+                "$gte": datetime(2024, 1, 1, tzinfo=timezone.utc),
+                "$lte": datetime(2024, 1, 31, tzinfo=timezone.utc),
+            },
+        }
+        assert kwargs["sort_key"] == "created_at"
+        assert kwargs["descending"] is True
+        assert "items.product_snapshot" in kwargs["include"]
+
+
+async def test_get_all_orders_schema_lists_both_shapes(test_client):
+    response = await test_client.get("/openapi.json")
+
+    schema = response.json()["paths"]["/orders/"]["get"]["responses"][
+        "200"]["content"]["application/json"]["schema"]
+    assert {
+        option["items"]["$ref"].rsplit("/", 1)[-1]
+        for option in schema["anyOf"]
+    } == {"OrderResponse", "OrderSummaryResponse"}
+
+
+@pytest.mark.asyncio
+async def test_search_orders_rejects_an_inverted_period(test_client, test_db):
+    response = await test_client.get(
+        "/orders/", params={"from": "2024-02-01", "to": "2024-01-01"})
+
+    assert response.status_code == 400
+
+
 @pytest.mark.asyncio
 async def test_get_order(
     test_client,
@@ -289,6 +611,48 @@ async def test_get_order(
         assert response.status_code == 200
         
 
+@pytest.mark.asyncio
+async def test_get_order_provider_revalidates_with_etag(
+    test_client,
+    test_db,
+    order_data
+):
+    with (
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+    ):
+        mock_order_service.find_one = AsyncMock(return_value=order_data)
+        mock_order_service.get_provider_order = AsyncMock(
+            return_value={"id": "ORDER12345", "status": "APPROVED"})
+
+        response = await test_client.get(f"/orders/{order_id}/provider")
+
+        assert response.status_code == 200
+        assert response.json()["ref_order"]["status"] == "APPROVED"
+        etag = response.headers["ETag"]
+        mock_order_service.get_provider_order.assert_awaited_once_with(
+            "ORDER12345")
+
+        response = await test_client.get(
+            f"/orders/{order_id}/provider",
+            headers={"If-None-Match": etag},
+        )
+
+        assert response.status_code == 304
+        assert response.content == b""
+        assert response.headers["ETag"] == etag
+
+        mock_order_service.get_provider_order.return_value = {
+            "id": "ORDER12345", "status": "COMPLETED"}
+        response = await test_client.get(
+            f"/orders/{order_id}/provider",
+            headers={"If-None-Match": etag},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+
 @pytest.mark.asyncio
 async def test_get_order_not_found(
     test_client,
@@ -328,6 +692,7 @@ async def test_capture_order(
           return_value=mocked_data
         )
         mock_order_service.update = AsyncMock(return_value=mocked_data)
+        mock_order_service.mark_paid = AsyncMock(return_value=mocked_data)
         mock_paypal_service.get_order_detail = AsyncMock(
           return_value={"status": "COMPLETED"}
         )
@@ -348,6 +713,42 @@ async def test_capture_order(
         assert data["ref_payment_source"] == mocked_data.ref_payment_source
         assert data["checkout_url"] == mocked_data.checkout_url
         assert response.status_code == 200
+        mock_order_service.mark_paid.assert_awaited_once_with(
+          order_id, "PAYER123")
+        mock_order_service.update.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_capture_order_already_paid(
+    test_client,
+    test_db,
+    order_data
+):
+    mocked_data = order_data
+
+    with (
+      patch("src.modules.orders.router.order_service")
+      as mock_order_service,
+      patch("src.modules.orders.router.paypal_service")
+      as mock_paypal_service
+    ):
+        mock_order_service.find_by_ref_order_id = AsyncMock(
+          return_value=mocked_data
+        )
+        mock_order_service.mark_paid = AsyncMock(return_value=None)
+        mock_order_service.update = AsyncMock(return_value=mocked_data)
+        mock_paypal_service.capture_order = AsyncMock(
+          return_value={"status": "COMPLETED"}
+        )
+
+        response = await test_client.get(
+            "/orders/capture?token=ORDER12345&PayerID=PAYER123"
+        )
+
+        assert response.status_code == 200
+        assert response.json()["id"] == str(order_id)
+        mock_order_service.update.assert_awaited_once_with(
+          order_id, {"payer_id": "PAYER123"})
 
 
 @pytest.mark.asyncio
@@ -0,0 +1,53 @@
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from beanie import PydanticObjectId
+
+from ....modules.orders.models import Order
+from ....modules.orders.service import PaidOrder, order_service
+
+
+@pytest.fixture
+def collection():
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock()
+    collection.find.return_value.to_list = AsyncMock(return_value=[])
+    with (
+        patch.object(Order, "get_pymongo_collection", return_value=collection),
+        patch.object(order_service, "_invalidate"),
+        patch("src.modules.orders.service.product_service") as products,
+    ):
+        products.release_stock = AsyncMock()
+        yield collection
+
+
+def batch_ids(collection, path):
+    """The batch id each call stamped, and the one it read back by."""
+    stamped = [
+        call.args[0][0]._doc["$set"][path]
+        for call in collection.bulk_write.await_args_list
+    ]
+    read = [call.args[0][path] for call in collection.find.call_args_list]
+    return stamped, read
+
+
+async def test_concurrent_cancels_read_back_their_own_orders(collection):
+    ids = [PydanticObjectId(), PydanticObjectId()]
+
+    await order_service.cancel_many(ids)
+    await order_service.cancel_many(ids)
+
+    stamped, read = batch_ids(collection, "cancel_batch_id")
+    assert read == stamped
+    assert stamped[0] != stamped[1]
+
+
+async def test_concurrent_payments_read_back_their_own_orders(collection):
+    payments = [PaidOrder("REF-1", None, "WH-1")]
+
+    await order_service.mark_paid_many(payments)
+    await order_service.mark_paid_many(payments)
+
+    stamped, read = batch_ids(collection, "paid_batch_id")
+    assert read == stamped
+    assert stamped[0] != stamped[1]
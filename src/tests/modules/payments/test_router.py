@@ -0,0 +1,47 @@
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+
+EVENT = {
+    "id": "WH-1",
+    "event_type": "CHECKOUT.ORDER.APPROVED",
+    "resource": {"id": "PAYPAL-1"},
+}
+
+
+@pytest.mark.asyncio
+async def test_paypal_webhook_is_queued(test_client, test_db):
+    with patch(
+        "src.modules.payments.router.webhook_worker"
+    ) as mock_webhook_worker:
+        mock_webhook_worker.enqueue = AsyncMock(side_effect=[True, False])
+
+        first = await test_client.post(
+            "/payments/webhooks/paypal", json=EVENT,
+            headers={"PayPal-Transmission-Id": "T-1"})
+        again = await test_client.post(
+            "/payments/webhooks/paypal", json=EVENT)
+
+        assert first.status_code == again.status_code == 200
+        assert first.json() == {"id": "WH-1", "status": "queued"}
+        assert again.json() == {"id": "WH-1", "status": "duplicate"}
+        event, headers = mock_webhook_worker.enqueue.await_args_list[0].args
+        assert event == EVENT
+        assert headers["paypal-transmission-id"] == "T-1"
+
+
+@pytest.mark.asyncio
+async def test_paypal_webhook_without_event_id(test_client, test_db):
+    with patch(
+        "src.modules.payments.router.webhook_worker"
+    ) as mock_webhook_worker:
+        mock_webhook_worker.enqueue = AsyncMock()
+
+        missing_id = await test_client.post(
+            "/payments/webhooks/paypal", json={"event_type": "X"})
+        not_json = await test_client.post(
+            "/payments/webhooks/paypal", content=b"not json")
+
+        assert missing_id.status_code == not_json.status_code == 400
+        mock_webhook_worker.enqueue.assert_not_awaited()
@@ -0,0 +1,160 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import httpx
+import pytest
+from beanie import PydanticObjectId
+
+from ....core.services.circuit_breaker import CircuitOpenError
+from ....modules.orders.service import PaidOrder
+from ....modules.payments.webhook_worker import WebhookWorker
+
+
+@pytest.fixture
+def worker():
+    worker = WebhookWorker(max_attempts=3)
+    worker._finish = AsyncMock()
+    worker._retry = AsyncMock()
+    return worker
+
+
+@pytest.fixture
+def paypal():
+    with patch(
+        "src.modules.payments.webhook_worker.paypal_service"
+    ) as mock_paypal_service:
+        mock_paypal_service.verify_webhook_signature = AsyncMock(
+            return_value=True)
+        mock_paypal_service.capture_order = AsyncMock(
+            return_value={"status": "COMPLETED"})
+        yield mock_paypal_service
+
+
+@pytest.fixture
+def orders():
+    with patch(
+        "src.modules.payments.webhook_worker.order_service"
+    ) as mock_order_service:
+        mock_order_service.ref_order_statuses = AsyncMock(
+            return_value={"PAYPAL-1": "pending"})
+        mock_order_service.mark_paid_many = AsyncMock(return_value=[])
+        yield mock_order_service
+
+
+def approved(event_id="WH-1", attempts=1):
+    return event(event_id, "CHECKOUT.ORDER.APPROVED", {
+        "id": "PAYPAL-1", "payer": {"payer_id": "PAYER-1"}}, attempts)
+
+
+def capture_completed(event_id="WH-2"):
+    return event(event_id, "PAYMENT.CAPTURE.COMPLETED", {
+        "id": "CAPTURE-1",
+        "supplementary_data": {"related_ids": {"order_id": "PAYPAL-1"}},
+    })
+
+
+def event(event_id, event_type, resource, attempts=1):
+    return SimpleNamespace(
+        id=PydanticObjectId(),
+        event_id=event_id,
+        event_type=event_type,
+        event={"id": event_id, "event_type": event_type,
+               "resource": resource},
+        headers={},
+        attempts=attempts,
+    )
+
+
+def finished(worker):
+    return {
+        call.args[1]: [event.event_id for event in call.args[0]]
+        for call in worker._finish.await_args_list
+    }
+
+
+async def test_captures_approved_order(worker, paypal, orders):
+    await worker._process([approved()])
+
+    paypal.capture_order.assert_awaited_once_with("PAYPAL-1")
+    orders.mark_paid_many.assert_awaited_once_with(
+        [PaidOrder("PAYPAL-1", "PAYER-1", "WH-1")])
+    assert finished(worker) == {"done": ["WH-1"]}
+
+
+async def test_batches_paid_orders_once_per_order(worker, paypal, orders):
+    await worker._process([capture_completed("WH-2"), approved("WH-3")])
+
+    paypal.capture_order.assert_not_awaited()
+    orders.mark_paid_many.assert_awaited_once_with(
+        [PaidOrder("PAYPAL-1", None, "WH-2")])
+    assert finished(worker) == {"done": ["WH-2", "WH-3"]}
+
+
+async def test_skips_orders_already_paid(worker, paypal, orders):
+    orders.ref_order_statuses.return_value = {"PAYPAL-1": "paid"}
+
+    await worker._process([approved()])
+
+    paypal.capture_order.assert_not_awaited()
+    orders.mark_paid_many.assert_awaited_once_with([])
+    assert finished(worker) == {"done": ["WH-1"]}
+
+
+async def test_rejects_invalid_signature(worker, paypal, orders):
+    paypal.verify_webhook_signature.return_value = False
+
+    await worker._process([approved()])
+
+    paypal.capture_order.assert_not_awaited()
+    assert finished(worker) == {"rejected": ["WH-1"]}
+
+
+async def test_ignores_other_events(worker, paypal, orders):
+    await worker._process([
+        event("WH-4", "CUSTOMER.DISPUTE.CREATED", {"id": "PP-D-1"})])
+
+    assert finished(worker) == {"ignored": ["WH-4"]}
+
+
+async def test_already_captured_order_is_done(worker, paypal, orders):
+    paypal.capture_order.side_effect = httpx.HTTPStatusError(
+        "Unprocessable", request=httpx.Request("POST", "http://paypal"),
+        response=httpx.Response(422))
+
+    await worker._process([approved()])
+
+    orders.mark_paid_many.assert_awaited_once_with([])
+    assert finished(worker) == {"done": ["WH-1"]}
+
+
+async def test_retries_failed_capture(worker, paypal, orders):
+    paypal.capture_order.side_effect = RuntimeError("PayPal is down")
+
+    await worker._process([approved(attempts=1)])
+
+    retry = worker._retry.await_args.args[0]
+    assert retry.event.event_id == "WH-1"
+    assert retry.error == "PayPal is down"
+    assert finished(worker) == {}
+
+
+async def test_fails_after_last_attempt(worker, paypal, orders):
+    paypal.capture_order.side_effect = RuntimeError("PayPal is down")
+
+    await worker._process([approved(attempts=3)])
+
+    worker._retry.assert_not_awaited()
+    assert finished(worker) == {"failed": ["WH-1"]}
+
+
+async def test_open_circuit_does_not_use_an_attempt(worker, paypal, orders):
+    paypal.verify_webhook_signature.side_effect = CircuitOpenError(
+        "PayPal circuit is open")
+    paypal.breaker.retry_after.return_value = 12.0
+
+    await worker._process([approved(attempts=3)])
+
+    retry = worker._retry.await_args.args[0]
+    assert retry.count_attempt is False
+    assert retry.delay == 12.0
+    assert finished(worker) == {}
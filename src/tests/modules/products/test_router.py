@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 from unittest.mock import AsyncMock, patch
 from beanie import PydanticObjectId
@@ -5,6 +6,9 @@ import pytest
 
 from ....modules.categories.schemas import CategoryResponse
 from ....modules.products.schemas import ProductResponse
+from ....modules.products.service import PRODUCT_SUMMARY_PATHS
+from ....core.services.bulk import NOT_APPLIED, BulkResult, BulkRowError
+from ....core.services.pagination import Page
 
 product_id = PydanticObjectId()
 category_id = PydanticObjectId()
@@ -112,7 +116,8 @@ async def test_get_products(
         patch("src.modules.products.router.product_service")
         as mock_product_service
     ):
-        mock_product_service.find_all = AsyncMock(return_value=mocked_data)
+        mock_product_service.find_page = AsyncMock(
+            return_value=Page(items=mocked_data))
 
         response = await test_client.get("/products/")
 
@@ -124,6 +129,43 @@ async def test_get_products(
         assert data[0]["price"] == mocked_data[0].price
         assert data[0]["stock"] == mocked_data[0].stock
         assert data[0]["is_active"] == mocked_data[0].is_active
+        assert data[0]["category"]["id"] == str(category_id)
+        assert mock_product_service.find_page.await_args.kwargs[
+            "include"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_products_summary(
+    test_client,
+    test_db,
+    mock_product_data
+):
+    with (
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_product_service.find_page = AsyncMock(
+            return_value=Page(items=[mock_product_data]))
+
+        response = await test_client.get("/products/?summary=true")
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data[0]["name"] == mock_product_data.name
+        assert "category" not in data[0]
+        assert mock_product_service.find_page.await_args.kwargs[
+            "include"] == PRODUCT_SUMMARY_PATHS
+
+
+async def test_get_products_schema_lists_both_shapes(test_client):
+    response = await test_client.get("/openapi.json")
+
+    schema = response.json()["paths"]["/products/"]["get"]["responses"][
+        "200"]["content"]["application/json"]["schema"]
+    assert {
+        option["items"]["$ref"].rsplit("/", 1)[-1]
+        for option in schema["anyOf"]
+    } == {"ProductResponse", "ProductSummaryResponse"}
 
 
 @pytest.mark.asyncio
@@ -135,7 +177,7 @@ async def test_get_products_empty(
         patch("src.modules.products.router.product_service")
         as mock_product_service
     ):
-        mock_product_service.find_all = AsyncMock(return_value=[])
+        mock_product_service.find_page = AsyncMock(return_value=Page())
 
         response = await test_client.get("/products/")
 
@@ -144,6 +186,90 @@ async def test_get_products_empty(
         assert data == []
 
 
+@pytest.mark.asyncio
+async def test_get_products_sparse_fields(
+    test_client,
+    test_db,
+    mock_product_data
+):
+    with (
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_product_service.find_page = AsyncMock(return_value=Page(
+            items=[mock_product_data], next_cursor="next-token"))
+
+        response = await test_client.get(
+            "/products/?fields=name,price,stock")
+
+        data = response.json()
+        assert response.status_code == 200
+        assert response.headers["X-Next-Cursor"] == "next-token"
+        assert set(data[0]) == {"_id", "name", "price", "stock"}
+        assert data[0]["price"] == mock_product_data.price
+        assert mock_product_service.find_page.await_args.kwargs[
+            "fields"] == ("name", "price", "stock")
+
+
+@pytest.mark.asyncio
+async def test_get_products_unknown_field(
+    test_client,
+    test_db
+):
+    response = await test_client.get("/products/?fields=name,password")
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown fields: password"
+
+
+@pytest.mark.asyncio
+async def test_get_product_field_missing_from_document(
+    test_client,
+    test_db
+):
+    with (
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_product_service.find_one = AsyncMock(
+            side_effect=ValueError("Unknown fields: category_snapshot"))
+
+        response = await test_client.get(
+            f"/products/{product_id}?fields=name,category_snapshot")
+
+        assert response.status_code == 400
+        assert response.json()["detail"] == (
+            "Unknown fields: category_snapshot")
+
+
+@pytest.mark.asyncio
+async def test_export_products(
+    test_client,
+    test_db,
+    mock_product_data
+):
+    async def stream():
+        for product in [mock_product_data, mock_product_data]:
+            yield product
+
+    with (
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_product_service.stream = stream
+
+        response = await test_client.get("/products/export")
+
+        lines = response.text.splitlines()
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        assert len(lines) == 2
+        assert json.loads(lines[0])["name"] == mock_product_data.name
+        assert json.loads(lines[0])["category"]["slug"] == (
+            mock_product_data.category.slug
+        )
+
+
 async def test_get_product(
     test_client,
     test_db,
@@ -304,3 +430,162 @@ async def test_delete_product_not_found(
 
         assert response.status_code == 404
         assert response.json()["detail"] == "Product not found"
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_products(
+    test_client,
+    test_db,
+    mock_product_data
+):
+    missing_category_id = PydanticObjectId()
+
+    with (
+        patch("src.modules.products.router.category_service")
+        as mock_category_service,
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_category_service.find_many = AsyncMock(
+            return_value=[mock_product_data.category])
+        mock_product_service.bulk_create = AsyncMock(return_value=BulkResult(
+            count=1,
+            ids=[product_id],
+            errors=[BulkRowError(index=1, detail="E11000 duplicate key")],
+        ))
+
+        product_data = {
+            "name": "Sample Product",
+            "description": "A product for testing",
+            "price": 49.99,
+            "stock": 100,
+        }
+        response = await test_client.post("/products/bulk", json={
+            "items": [
+                {**product_data, "category_id": str(category_id)},
+                {**product_data, "category_id": str(missing_category_id)},
+                {**product_data, "category_id": None},
+            ],
+        })
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["count"] == 1
+        assert data["ids"] == [str(product_id)]
+        assert data["errors"] == [
+            {"index": 1, "id": None, "detail": "Category not found"},
+            {"index": 2, "id": None, "detail": "E11000 duplicate key"},
+        ]
+
+        rows = mock_product_service.bulk_create.await_args.args[0]
+        assert len(rows) == 2
+        assert rows[1]["category"] is None
+        mock_category_service.find_many.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_products_ordered_stops_at_missing_category(
+    test_client,
+    test_db,
+    mock_product_data
+):
+    with (
+        patch("src.modules.products.router.category_service")
+        as mock_category_service,
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_category_service.find_many = AsyncMock(
+            return_value=[mock_product_data.category])
+        mock_product_service.bulk_create = AsyncMock(
+            return_value=BulkResult(count=1, ids=[product_id]))
+
+        product_data = {
+            "name": "Sample Product",
+            "description": "A product for testing",
+            "price": 49.99,
+            "stock": 100,
+        }
+        response = await test_client.post("/products/bulk", json={
+            "items": [
+                {**product_data, "category_id": str(category_id)},
+                {**product_data, "category_id": str(PydanticObjectId())},
+                {**product_data, "category_id": None},
+                {**product_data, "category_id": str(category_id)},
+            ],
+            "ordered": True,
+        })
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["count"] == 1
+        assert data["errors"] == [
+            {"index": 1, "id": None, "detail": "Category not found"},
+            {"index": 2, "id": None, "detail": NOT_APPLIED},
+            {"index": 3, "id": None, "detail": NOT_APPLIED},
+        ]
+
+        rows = mock_product_service.bulk_create.await_args.args[0]
+        assert len(rows) == 1
+        assert mock_product_service.bulk_create.await_args.kwargs == {
+            "ordered": True}
+
+
+@pytest.mark.asyncio
+async def test_bulk_update_products_ordered_stops_at_missing_category(
+    test_client,
+    test_db
+):
+    ids = [PydanticObjectId() for _ in range(3)]
+
+    with (
+        patch("src.modules.products.router.category_service")
+        as mock_category_service,
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_category_service.find_many = AsyncMock(return_value=[])
+        mock_product_service.bulk_update = AsyncMock(
+            return_value=BulkResult(count=1, ids=[ids[0]]))
+
+        response = await test_client.put("/products/bulk", json={
+            "items": [
+                {"id": str(ids[0]), "price": 10},
+                {"id": str(ids[1]), "category_id": str(category_id)},
+                {"id": str(ids[2]), "price": 12},
+            ],
+            "ordered": True,
+        })
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data["ids"] == [str(ids[0])]
+        assert data["errors"] == [
+            {"index": 1, "id": str(ids[1]), "detail": "Category not found"},
+            {"index": 2, "id": str(ids[2]), "detail": NOT_APPLIED},
+        ]
+
+        rows = mock_product_service.bulk_update.await_args.args[0]
+        assert rows == [(ids[0], {"price": 10})]
+
+
+@pytest.mark.asyncio
+async def test_bulk_delete_products(
+    test_client,
+    test_db
+):
+    with (
+        patch("src.modules.products.router.product_service")
+        as mock_product_service
+    ):
+        mock_product_service.bulk_delete = AsyncMock(
+            return_value=BulkResult(count=1, ids=[product_id]))
+
+        response = await test_client.request(
+            "DELETE", "/products/bulk",
+            json={"ids": [str(product_id)], "ordered": True})
+
+        assert response.status_code == 200
+        assert response.json()["count"] == 1
+        mock_product_service.bulk_delete.assert_awaited_once_with(
+            [product_id], ordered=True)
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from beanie import PydanticObjectId
+from bson import ObjectId
+
+from ....modules.products.models import Product
+from ....modules.products.service import product_service
+
+
+NOW = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def token(minutes_old):
+    return ObjectId.from_datetime(NOW - timedelta(minutes=minutes_old))
+
+
+async def test_releases_stale_reservations_once():
+    product_id = PydanticObjectId()
+    stale, fresh = token(60), token(1)
+    collection = MagicMock()
+    collection.find.return_value.to_list = AsyncMock(return_value=[{
+        "_id": product_id,
+        "pending_reservations": [
+            {"token": stale, "quantity": 2},
+            {"token": fresh, "quantity": 5},
+        ],
+    }])
+    collection.bulk_write = AsyncMock(
+        return_value=MagicMock(modified_count=1))
+
+    with (
+        patch.object(
+            Product, "get_pymongo_collection", return_value=collection),
+        patch.object(product_service, "_invalidate") as invalidate,
+    ):
+        released = await product_service.release_stale_reservations(
+            NOW - timedelta(minutes=30))
+
+    assert released == 1
+    invalidate.assert_called_once_with(product_id)
+    (operation,), = collection.bulk_write.await_args.args
+    assert operation._filter == {
+        "_id": product_id, "pending_reservations.token": stale}
+    assert operation._doc == {
+        "$inc": {"stock": 2},
+        "$pull": {"pending_reservations": {"token": stale}},
+    }
+
+
+async def test_nothing_stale_writes_nothing():
+    collection = MagicMock()
+    collection.find.return_value.to_list = AsyncMock(return_value=[])
+    collection.bulk_write = AsyncMock()
+
+    with patch.object(
+        Product, "get_pymongo_collection", return_value=collection
+    ):
+        assert await product_service.release_stale_reservations(NOW) == 0
+
+    collection.bulk_write.assert_not_awaited()
+
+
+async def test_stale_reservations_held_by_an_order_are_only_settled():
+    product_id = PydanticObjectId()
+    held, lost = token(60), token(50)
+    collection = MagicMock()
+    collection.find.return_value.to_list = AsyncMock(return_value=[{
+        "_id": product_id,
+        "pending_reservations": [
+            {"token": held, "quantity": 2},
+            {"token": lost, "quantity": 3},
+        ],
+    }])
+    collection.bulk_write = AsyncMock(
+        return_value=MagicMock(modified_count=2))
+    holders = AsyncMock(return_value={held})
+
+    with (
+        patch.object(
+            Product, "get_pymongo_collection", return_value=collection),
+        patch.object(product_service, "_invalidate"),
+    ):
+        await product_service.release_stale_reservations(
+            NOW - timedelta(minutes=30), holders)
+
+    holders.assert_awaited_once_with({held, lost})
+    settled, released = collection.bulk_write.await_args.args[0]
+    assert settled._doc == {
+        "$pull": {"pending_reservations": {"token": held}}}
+    assert released._doc == {
+        "$pull": {"pending_reservations": {"token": lost}},
+        "$inc": {"stock": 3},
+    }
@@ -0,0 +1,85 @@
+import pytest
+
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+from beanie import PydanticObjectId
+
+
+product_id = PydanticObjectId()
+category_id = PydanticObjectId()
+
+
+@pytest.mark.asyncio
+async def test_get_daily_sales(test_client, test_db):
+    with patch("src.modules.reports.router.sales_service") as mock_service:
+        mock_service.daily = AsyncMock(return_value=[
+            {
+                "day": datetime(2024, 5, 1),
+                "revenue": 59.97,
+                "units": 3,
+                "orders": 2,
+            },
+        ])
+
+        response = await test_client.get(
+            "/reports/sales/daily?from=2024-05-01&to=2024-05-31")
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {"day": "2024-05-01", "revenue": 59.97, "units": 3, "orders": 2}
+        ]
+        start, end = mock_service.daily.await_args.args
+        assert (start.isoformat(), end.isoformat()) == (
+            "2024-05-01", "2024-05-31")
+
+
+@pytest.mark.asyncio
+async def test_get_daily_sales_with_reversed_period(test_client, test_db):
+    with patch("src.modules.reports.router.sales_service") as mock_service:
+        mock_service.daily = AsyncMock()
+
+        response = await test_client.get(
+            "/reports/sales/daily?from=2024-06-01&to=2024-05-01")
+
+        assert response.status_code == 400
+        mock_service.daily.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_get_product_sales(test_client, test_db):
+    with patch("src.modules.reports.router.sales_service") as mock_service:
+        mock_service.by_product = AsyncMock(return_value=[
+            {
+                "product_id": product_id,
+                "revenue": 19.98,
+                "units": 2,
+                "orders": 1,
+            },
+        ])
+
+        response = await test_client.get("/reports/sales/products?limit=5")
+
+        assert response.status_code == 200
+        assert response.json()[0]["product_id"] == str(product_id)
+        mock_service.by_product.assert_awaited_once_with(None, None, 5)
+
+
+@pytest.mark.asyncio
+async def test_get_category_sales(test_client, test_db):
+    with patch("src.modules.reports.router.sales_service") as mock_service:
+        mock_service.by_category = AsyncMock(return_value=[
+            {
+                "category_id": category_id,
+                "revenue": 19.98,
+                "units": 2,
+                "orders": 1,
+            },
+            {"category_id": None, "revenue": 1.5, "units": 1, "orders": 1},
+        ])
+
+        response = await test_client.get("/reports/sales/categories")
+
+        data = response.json()
+        assert response.status_code == 200
+        assert data[0]["category_id"] == str(category_id)
+        assert data[1]["category_id"] is None
@@ -0,0 +1,48 @@
+import pytest
+
+from unittest.mock import AsyncMock, patch
+from beanie import PydanticObjectId
+
+from ....core.services.pagination import Page
+
+
+user_id = PydanticObjectId()
+
+
+@pytest.mark.asyncio
+async def test_get_user_orders(test_client, test_db):
+    with (
+      patch("src.modules.users.router.order_service")
+      as mock_order_service,
+    ):
+        mock_order_service.find_page = AsyncMock(
+          return_value=Page(items=[])
+        )
+
+        response = await test_client.get(
+            f"/users/{user_id}/orders", params={"status": "pending"})
+
+        assert response.status_code == 200
+        assert response.json() == []
+        kwargs = mock_order_service.find_page.await_args.kwargs
+        assert kwargs["filter"] == {"user.$id": user_id, "status": "pending"}
+        assert kwargs["sort_key"] == "created_at"
+        assert kwargs["include"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_user_orders_summary(test_client, test_db):
+    with (
+      patch("src.modules.users.router.order_service")
+      as mock_order_service,
+    ):
+        mock_order_service.find_page = AsyncMock(
+          return_value=Page(items=[])
+        )
+
+        response = await test_client.get(
+            f"/users/{user_id}/orders", params={"summary": "true"})
+
+        assert response.status_code == 200
+        kwargs = mock_order_service.find_page.await_args.kwargs
+        assert "user_snapshot" in kwargs["include"]